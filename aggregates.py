@@ -0,0 +1,162 @@
+# aggregates.py
+import sqlite3
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from db import get_db
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# 자주 묻는 집계(타입별 평균 공격력, 트레이너별 팀 평균 total, 타입별 가장 빠른 포켓몬 ...)를
+# 매번 GROUP BY 하지 않도록 미리 계산해 둔 요약 테이블.
+#   - type_stat_summary / generation_stat_summary : pokemon 테이블이 바뀔 때(build_db)만 다시 계산
+#   - user_team_summary                           : UserPokemon 에 쓸 때 해당 유저 한 줄만 다시 계산
+STAT_COLUMNS = ["hp", "attack", "defense", "sp_atk", "sp_def", "speed", "total"]
+PERCENTILES = {"p25": 25, "median": 50, "p75": 75, "p90": 90}
+
+_STAT_SUMMARY_COLUMNS = (
+    "stat TEXT NOT NULL, pokemon_count INTEGER NOT NULL, "
+    "mean REAL, min REAL, max REAL, p25 REAL, median REAL, p75 REAL, p90 REAL, "
+    "max_dexnum INTEGER, max_name TEXT, min_dexnum INTEGER, min_name TEXT"
+)
+
+SUMMARY_TABLES = {
+    "type_stat_summary": (
+        f"CREATE TABLE IF NOT EXISTS type_stat_summary (type TEXT NOT NULL, {_STAT_SUMMARY_COLUMNS}, "
+        "PRIMARY KEY (type, stat)) WITHOUT ROWID"
+    ),
+    "generation_stat_summary": (
+        f"CREATE TABLE IF NOT EXISTS generation_stat_summary (generation INTEGER NOT NULL, {_STAT_SUMMARY_COLUMNS}, "
+        "PRIMARY KEY (generation, stat)) WITHOUT ROWID"
+    ),
+    "user_team_summary": (
+        "CREATE TABLE IF NOT EXISTS user_team_summary ("
+        "user_id INTEGER PRIMARY KEY, username TEXT, team_size INTEGER NOT NULL, "
+        + ", ".join(f"avg_{s} REAL" for s in STAT_COLUMNS)
+        + ", max_total INTEGER, strongest_dexnum INTEGER, strongest_name TEXT)"
+    ),
+}
+
+
+# ------------------------------------------------
+# 1. 타입별 / 세대별 스탯 요약 (pokemon 테이블 기준)
+# ------------------------------------------------
+def _stat_rows(key, group: pd.DataFrame) -> List[tuple]:
+    """한 그룹(타입 하나, 세대 하나)의 스탯별 요약 행"""
+    rows = []
+    dexnums = group["dexnum"].to_numpy()
+    names = group["name"].to_numpy()
+    for stat in STAT_COLUMNS:
+        values = group[stat].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        if not valid.any():
+            rows.append((key, stat, len(group)) + (None,) * 11)
+            continue
+        v = values[valid]
+        pct = np.percentile(v, list(PERCENTILES.values()))
+        # 같은 값이면 도감번호가 작은 포켓몬 (group 은 dexnum 순)
+        hi = int(np.flatnonzero(valid)[np.argmax(v)])
+        lo = int(np.flatnonzero(valid)[np.argmin(v)])
+        rows.append((
+            key, stat, len(group),
+            float(v.mean()), float(v.min()), float(v.max()),
+            *(round(float(p), 4) for p in pct),
+            int(dexnums[hi]), names[hi], int(dexnums[lo]), names[lo],
+        ))
+    return rows
+
+
+def refresh_stat_summaries(conn: sqlite3.Connection) -> Dict[str, int]:
+    """type_stat_summary / generation_stat_summary 전체 재계산 (pokemon 이 바뀌었을 때)"""
+    pokemon = pd.read_sql_query(
+        f"SELECT dexnum, name, generation, type1, type2, {', '.join(STAT_COLUMNS)} FROM pokemon ORDER BY dexnum",
+        conn,
+    )
+    type_rows = []
+    for ptype in sorted(set(pokemon["type1"].dropna()) | set(pokemon["type2"].dropna())):
+        # rule_sql 의 타입 조건과 같이 type1 또는 type2 가 해당 타입이면 포함
+        members = pokemon[(pokemon["type1"] == ptype) | (pokemon["type2"] == ptype)]
+        type_rows.extend(_stat_rows(ptype, members))
+
+    gen_rows = []
+    for gen, members in pokemon.dropna(subset=["generation"]).groupby("generation"):
+        gen_rows.extend(_stat_rows(int(gen), members))
+
+    placeholders = ", ".join("?" * 14)
+    for table, rows in (("type_stat_summary", type_rows), ("generation_stat_summary", gen_rows)):
+        conn.execute(SUMMARY_TABLES[table])
+        conn.execute(f"DELETE FROM {table}")
+        conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+    return {"type_stat_summary": len(type_rows), "generation_stat_summary": len(gen_rows)}
+
+
+# ------------------------------------------------
+# 2. 유저별 팀 요약 (UserPokemon 기준, 증분 갱신)
+# ------------------------------------------------
+_USER_TEAM_SELECT = f"""
+    SELECT u.User_id, u.Username, COUNT(p.dexnum),
+           {", ".join(f"ROUND(AVG(p.{s}), 2)" for s in STAT_COLUMNS)},
+           MAX(p.total),
+           (SELECT p2.dexnum FROM UserPokemon up2 JOIN pokemon p2 ON p2.dexnum = up2.pokemon_id
+             WHERE up2.user_id = u.User_id ORDER BY p2.total DESC, up2.slot_no LIMIT 1),
+           (SELECT p2.name FROM UserPokemon up2 JOIN pokemon p2 ON p2.dexnum = up2.pokemon_id
+             WHERE up2.user_id = u.User_id ORDER BY p2.total DESC, up2.slot_no LIMIT 1)
+    FROM UserData u
+    LEFT JOIN UserPokemon up ON up.user_id = u.User_id
+    LEFT JOIN pokemon p ON p.dexnum = up.pokemon_id
+"""
+
+
+def refresh_user_team_summary(conn: sqlite3.Connection, user_id: Optional[int] = None) -> None:
+    """
+    user_team_summary 갱신. user_id 를 주면 그 유저 한 줄만 (add_pokemon_to_user 와 같은 트랜잭션에서),
+    None 이면 전체 (UserPokemon 을 통째로 되돌렸을 때)
+    """
+    conn.execute(SUMMARY_TABLES["user_team_summary"])
+    if user_id is None:
+        conn.execute("DELETE FROM user_team_summary")
+        conn.execute(f"INSERT INTO user_team_summary {_USER_TEAM_SELECT} GROUP BY u.User_id")
+    else:
+        conn.execute(
+            f"INSERT OR REPLACE INTO user_team_summary {_USER_TEAM_SELECT} WHERE u.User_id = ? GROUP BY u.User_id",
+            (user_id,),
+        )
+
+
+# ------------------------------------------------
+# 3. 초기화
+# ------------------------------------------------
+def refresh_all(conn: sqlite3.Connection) -> None:
+    counts = refresh_stat_summaries(conn)
+    refresh_user_team_summary(conn)
+    print(
+        f"✅ 요약 테이블 갱신: type_stat_summary {counts['type_stat_summary']}행, "
+        f"generation_stat_summary {counts['generation_stat_summary']}행, user_team_summary"
+    )
+
+
+_summaries_ready = False
+
+
+def ensure_summary_tables() -> None:
+    """요약 테이블이 하나라도 없으면 전부 만든다 (프로세스당 한 번만 확인)"""
+    global _summaries_ready
+    if _summaries_ready:
+        return
+    existing = {
+        name for (name,) in get_db().reader().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?, ?)", tuple(SUMMARY_TABLES)
+        )
+    }
+    if existing != set(SUMMARY_TABLES):
+        with get_db().writer() as conn:
+            refresh_all(conn)
+    _summaries_ready = True
+
+
+if __name__ == "__main__":
+    with get_db().writer() as conn:
+        refresh_all(conn)
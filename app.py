@@ -8,9 +8,21 @@ import textwrap
 import os
 import random  
 import base64
+import time
+from functools import lru_cache
 
 # 필요한 모든 유틸리티 함수 임포트
 from utils import nl_to_sql, DB_PATH, create_chart_base64, generate_final_report, get_pokemon_image_html_from_dexnum
+from utils import generate_final_report_stream, ensure_type_effectiveness
+from pipeline import run_turn, TurnTimings, analysis_summary
+from session_store import AnalysisStore, assistant_message, render_message
+from report_sections import prefetch_section
+import metrics
+from db import get_db
+from pokedex import get_pokedex
+from aggregates import ensure_summary_tables, refresh_user_team_summary
+from query_audit import start_index_advisor
+from assets import encode_asset, asset_url
 
 # 포켓몬 타입 리스트 (리포트 필터용)
 POKEMON_TYPES = [
@@ -19,20 +31,30 @@ POKEMON_TYPES = [
     "Psychic", "Ice", "Dragon", "Dark", "Fairy"
 ]
 
+# 차트 출력 방식: png / svg (base64 이미지) 또는 native (st.bar_chart, 이미지 인코딩 없음)
+CHART_MODE = os.environ.get("POKELIFE_CHART_MODE", "png")
+
+# 스트리밍 리포트를 다시 그리는 최소 간격 (청크마다 전체 HTML을 다시 보내지 않도록)
+REPORT_REDRAW_INTERVAL_S = 0.1
+
+# POKELIFE_METRICS_PORT 가 설정돼 있으면 /metrics 엔드포인트를 한 번만 띄움
+metrics.start_prometheus_server()
+# POKELIFE_INDEX_ADVISOR_INTERVAL 이 설정돼 있으면 쿼리 감사 로그로 인덱스 추천기를 주기적으로 돌림
+start_index_advisor()
+
+# 상성 테이블(type_effectiveness / dual_type_effectiveness)이 없으면 한 번 만들어 둠
+ensure_type_effectiveness()
+# 집계 요약 테이블(type_stat_summary 등)이 없으면 한 번 만들어 둠
+ensure_summary_tables()
+# 규칙 기반 질문에 쓰는 메모리 Pokédex 스냅샷을 미리 올려 둠
+get_pokedex()
+
 # ------------------------------------------------
 # 0. 기본 유틸리티
 # ------------------------------------------------
 def get_image_base64(path: str) -> str:
-    """파일 경로에서 Base64 문자열을 인코딩하여 반환"""
-    try:
-        with open(path, "rb") as f:
-            return base64.b64encode(f.read()).decode()
-    except FileNotFoundError:
-        print(f"⚠️ Warning: File not found at {path}.")
-        return ""
-    except Exception as e:
-        print(f"❌ Error encoding {path}: {e}")
-        return ""
+    """파일 경로에서 Base64 문자열을 인코딩하여 반환 (프로세스당 한 번만 인코딩)"""
+    return encode_asset(path)
 
 
 # ------------------------------------------------
@@ -50,17 +72,17 @@ st.set_page_config(
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "analysis_results" not in st.session_state:
-    st.session_state.analysis_results = []
+    # 결과 DataFrame은 압축 바이트로 보관 (session_store.AnalysisStore)
+    st.session_state.analysis_results = AnalysisStore()
 if "first_greeting_done" not in st.session_state:
     st.session_state.first_greeting_done = False
 
 # ✅ UserPokemon 원본 스냅샷 저장 (처음 한 번만)
 if "original_userpokemon" not in st.session_state:
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            st.session_state.original_userpokemon = pd.read_sql_query(
-                "SELECT * FROM UserPokemon", conn
-            )
+        st.session_state.original_userpokemon = get_db().read_df(
+            "SELECT * FROM UserPokemon"
+        )
     except Exception as e:
         # 테이블이 아직 없거나 에러가 나도 앱이 죽지 않도록
         st.session_state.original_userpokemon = None
@@ -68,38 +90,38 @@ if "original_userpokemon" not in st.session_state:
 
 
 
+@metrics.timed("set_background")
 def set_background(image_file: str, bottom_img: str):
     """배경 이미지 및 커스텀 CSS 스타일을 설정"""
-    
-    def encode(path: str) -> str:
-        try:
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-        except FileNotFoundError:
-            print(f"⚠️ Warning: File not found at {path}. Using fallback CSS.")
-            return ""
-        except Exception as e:
-            print(f"❌ Error encoding {path}: {e}")
-            return ""
-
-    bg = encode(image_file)
-    bottom = encode(bottom_img)
-    
-    # 폰트 파일 Base64 인코딩 추가
-    font_woff2 = encode("font/neodgm.woff2")
-    font_woff = encode("font/neodgm.woff")
+    # 이미지/폰트 인코딩은 assets 캐시가, CSS 문자열 조립은 lru_cache가 담당 → rerun마다 디스크 I/O 없음
+    bg = asset_url(image_file, "image/jpeg")
+    bottom = asset_url(bottom_img, "image/jpeg")
+    font_woff2 = asset_url("font/neodgm.woff2", "font/woff2")
+    font_woff = asset_url("font/neodgm.woff", "font/woff")
 
-    st.markdown(
-        f"""
+    st.markdown(_background_css(bg, bottom, font_woff2, font_woff), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=4)
+def _background_css(bg: str, bottom: str, font_woff2: str, font_woff: str) -> str:
+    """배경/폰트 URL로 전체 커스텀 CSS 생성. 같은 이미지는 CSS 변수로 한 번만 싣는다."""
+    bottom_var = "var(--pokelife-bg)" if bottom == bg else f'url("{bottom}")'
+
+    return f"""
         <style>
 
+        :root {{
+            --pokelife-bg: url("{bg}");
+            --pokelife-bottom: {bottom_var};
+        }}
+
         /* ===============================
            0. 폰트 로딩 및 기본 스타일링 (기존 코드 유지)
            ================================*/
         @font-face {{
             font-family: 'NeoDGM';
-            src: url(data:font/woff2;charset=utf-8;base64,{font_woff2}) format('woff2'),
-                 url(data:font/woff;charset=utf-8;base64,{font_woff}) format('woff');
+            src: url("{font_woff2}") format('woff2'),
+                 url("{font_woff}") format('woff');
             font-weight: normal;
             font-style: normal;
         }}
@@ -151,7 +173,7 @@ def set_background(image_file: str, bottom_img: str):
         
         /* 1) 전체 페이지 배경 유지 */
         html, body, .stApp, [data-testid="stAppViewContainer"], [data-testid="stHeader"] {{
-            background-image: url("data:image/jpg;base64,{bg}") !important;
+            background-image: var(--pokelife-bg) !important;
             background-repeat: repeat !important;
             background-size: auto !important;
         }}
@@ -191,7 +213,7 @@ def set_background(image_file: str, bottom_img: str):
            4) 하단 입력바 (스크롤, 정렬, 윤곽선 완벽 일치)
            ================================*/
         [data-testid="stBottomBlockContainer"] {{
-            background-image: url("data:image/jpg;base64,{bottom}");
+            background-image: var(--pokelife-bottom);
             background-size: cover;
             background-repeat: no-repeat;
         }}
@@ -315,9 +337,7 @@ def set_background(image_file: str, bottom_img: str):
         }}
 
         </style>
-        """,
-        unsafe_allow_html=True,
-    )
+        """
 
 def normalize_report_markdown(md: str) -> str:
     """
@@ -344,20 +364,6 @@ set_background("data/background.jpg", "data/background.jpg")
 # ------------------------------------------------
 # 2. 유틸리티 함수 (중복 제거 및 통합)
 # ------------------------------------------------
-def pick_chart_columns(df: pd.DataFrame):
-    """범주형(문자) 1개 + 숫자 1개 컬럼 자동 선택"""
-    if df is None or df.empty:
-        return None, None
-
-    numeric_cols = df.select_dtypes(include="number").columns.tolist()
-    cat_cols = df.select_dtypes(exclude="number").columns.tolist()
-
-    if not numeric_cols or not cat_cols:
-        return None, None
-
-    # x축: 첫 번째 범주형 컬럼, y축: 첫 번째 숫자 컬럼
-    return cat_cols[0], numeric_cols[0]
-
 def get_user_history(max_turns: int = 3):
     """세션에서 최근 사용자 질문 max_turns개만 리스트로 반환"""
     user_messages = [
@@ -368,108 +374,48 @@ def get_user_history(max_turns: int = 3):
     return user_messages[-max_turns:]
 
 
-def execute_query_and_format_response(question: str) -> str:
+def execute_query_and_format_response(question: str, on_explanation=None) -> dict:
     """
     자연어 질문을 받아 SQL로 변환, 실행 및 결과를 Markdown 형식으로 반환
     (✅ 누적 저장 로직 포함)
+    - 실제 처리는 pipeline.run_turn 이 담당 (SQL 실행 후 차트/이미지/표를 병렬로 생성)
+    - on_explanation(지금까지의 설명) 콜백으로 설명을 생성되는 대로 화면에 보여줄 수 있음
+    반환: {"content": 마크다운, "parts": 세션 저장용 참조, "chart_data": native 차트용 DataFrame 또는 None,
+           "timings": 단계별 소요 시간}
     """
     question = question.strip()
     if not question:
-        return "질문을 입력해 주세요! 🙂"
+        text = "질문을 입력해 주세요! 🙂"
+        return {"content": text, "parts": {"text": text}, "chart_data": None}
 
-    # 1. 자연어 → SQL  (이전 질문들도 함께 전달)
+    # 이전 질문들도 함께 전달
     history_questions = get_user_history(max_turns=3)
-    data = nl_to_sql(question, chat_history=history_questions)
-    sql = data.get("sql")
-    explanation = data.get("explanation_ko", "설명을 생성하지 못했습니다.")
-
-    if not sql:
-        return (
-            "⚠️ SQL을 생성하지 못했어요.\n\n"
-            f"**설명:** {explanation}"
-        )
-
-    # 2. SQL 실행
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            df = pd.read_sql_query(sql, conn)
-    except Exception as e:
-        return (
-            "❌ SQL 실행 중 오류가 발생했어요.\n\n"
-            f"**오류 메시지:** `{e}`\n\n"
-            "아래 SQL을 참고해서 다시 질문을 바꿔보면 좋아요.\n\n"
-            f"```sql\n{sql}\n```"
-        )
-
-    # 3. 분석 결과 누적 (최종 리포트용)
-    st.session_state.analysis_results.append({
-        "question": question,
-        "df": df.copy()
-    })
-
-    # 4. 결과 테이블
-    if df.empty:
-        result_table = "조회된 결과가 없습니다.\n"
-    else:
-        table_md = df.head(10).to_markdown(index=False, tablefmt="pipe")
-        result_table = (
-            "### 🧪 오박사의 연구 기록\n"
-            f"{table_md}\n\n"
-        )
-
-    # 5. 시각화 자동 생성
-    chart_html = ""
-    wants_chart = any(
-        kw in question
-        for kw in ["그래프", "막대그래프", "시각화", "그래프로", "그려줘"]
-    )
-
-    if wants_chart and not df.empty:
-        x_col, y_col = pick_chart_columns(df)
-        if x_col and y_col:
-            title = f" "
-            img_tag = create_chart_base64(
-                df.head(10),
-                x_col=x_col,
-                y_col=y_col,
-                title=title,
-            )
-            if img_tag:
-                chart_html = "### 📈 시각화 결과\n" + img_tag + "\n\n"
-
-        # ✅ 6. 생성된 SQL 출력 섹션 (여기가 핵심!)
-    sql_section = (
-        "### 🔍 생성된 SQL (자동 타입 변환 적용)\n"
-        f"```sql\n{sql}\n```\n\n"
-    )
-
-    # ✅ 7. 포켓몬 이미지 섹션 (dexnum → 이미지 매핑)
-    image_html = ""
-    # df가 비어있지 않고, dexnum 컬럼이 있으면 시도
-    if not df.empty and "dexnum" in df.columns:
-        # 중복 제거한 도감번호들
-        unique_dex = df["dexnum"].dropna().unique()
-
-        # 👉 결과에 포켓몬이 한 마리만 있을 때만 이미지 표시
-        # (여러 마리일 때는 나중에 그리드로 예쁘게 확장할 수 있음)
-        if len(unique_dex) == 1:
-            dex = int(unique_dex[0])
-            img_tag = get_pokemon_image_html_from_dexnum(dex)
-            if img_tag:
-                image_html = "### 📷 포켓몬 이미지\n" + img_tag + "\n\n"
-
-    # ✅ 8. 섹션 최종 조합
-    full_text = (
-        f"호오~ 자네의 질문을 들으니 꽤 흥미롭구먼!\n\n"
-        f"### 🧓 오박사의 답변\n"
-        f"{explanation}\n\n"
-        + sql_section
-        + chart_html
-        + image_html      # ← 여기서 이미지 붙이기!
-        + result_table
+    result = run_turn(
+        question,
+        chat_history=history_questions,
+        chart_mode=CHART_MODE,
+        on_explanation=on_explanation,
     )
+    print(f"⏱️ 턴 처리 시간: {TurnTimings.format(result['timings'])}")
+
+    # 분석 결과 누적 (최종 리포트용)
+    if result["df"] is not None:
+        st.session_state.analysis_results.append(analysis_summary(question, result))
+
+        # 지금 사이드바 필터 기준으로 질문별 리포트 섹션을 미리 만들어 둔다 (리포트 버튼에서 재사용)
+        gen_filter = st.session_state.get("report_gen_filter", "전체")
+        prefetch_section(
+            st.session_state.analysis_results.last(),
+            gen_filter=None if gen_filter == "전체" else gen_filter,
+            type_filter=st.session_state.get("report_type_filter", []),
+        )
 
-    return full_text
+    return {
+        "content": result["content"],
+        "parts": result["parts"],
+        "chart_data": result["chart_data"],
+        "timings": result["timings"],
+    }
 
 
 
@@ -477,7 +423,7 @@ def execute_query_and_format_response(question: str) -> str:
 # ------------------------------------------------
 # 3. Streamlit UI 렌더링
 # ------------------------------------------------
-logo_base64 = get_image_base64("data/research.png")
+logo_url = asset_url("data/research.png", "image/png")
 
 st.markdown(
     f"""
@@ -495,7 +441,7 @@ st.markdown(
     </style>
 
     <div class="title-container">
-        <img src="data:image/png;base64,{logo_base64}">
+        <img src="{logo_url}">
         <h1>오박사의 포켓몬 연구소</h1>
     </div>
     """,
@@ -514,7 +460,7 @@ def add_pokemon_to_user(user_id: int, pokemon_name: str):
     if not pokemon_name:
         return False, "포켓몬 이름을 입력해주게나."
 
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_db().writer() as conn:
         cur = conn.cursor()
 
         # 1) 다음 slot_no 계산
@@ -544,11 +490,19 @@ def add_pokemon_to_user(user_id: int, pokemon_name: str):
             """,
             (user_id, dexnum, name, next_slot)
         )
-        conn.commit()
+
+        # 4) 팀 요약 테이블은 이 유저 한 줄만 다시 계산
+        refresh_user_team_summary(conn, user_id)
 
     return True, f"✅ {name} 를(을) 새로운 포켓몬으로 등록했네!"
 
 
+@st.cache_data(ttl=300)
+def load_trainers() -> pd.DataFrame:
+    """트레이너 목록 (UserData는 앱에서 수정하지 않으므로 rerun마다 조회하지 않고 캐시)"""
+    return get_db().read_df("SELECT User_id, Username FROM UserData")
+
+
 # ------------------------------------------------
 # 5. 사이드바 (예시 질의 + 리포트 + 포켓몬 획득 + 리셋)
 # ------------------------------------------------
@@ -602,13 +556,12 @@ with st.sidebar:
         if not st.session_state.analysis_results:
             st.warning("먼저 여러 번 질의를 실행해서 분석 결과를 쌓아주세요!")
         else:
-            with st.spinner("리포트를 작성 중이에요..."):
-                final_report_html = generate_final_report(
-                    st.session_state.analysis_results,
-                    gen_filter=None if gen_filter == "전체" else gen_filter,
-                    type_filter=type_filter,
-                )
-                st.session_state.final_report_html = final_report_html
+            # 실제 생성은 본문 영역(8. 최종 리포트 출력)에서 스트리밍으로 그린다
+            st.session_state.pending_report = {
+                "gen_filter": None if gen_filter == "전체" else gen_filter,
+                "type_filter": list(type_filter),
+            }
+            st.session_state.pop("final_report_html", None)
 
     st.markdown("""
     <hr style="border:1px solid rgba(255,255,255,0.4)">
@@ -617,10 +570,7 @@ with st.sidebar:
     # 🔥 포켓몬 획득 섹션
     st.subheader("🎮 포켓몬 획득")
 
-    with sqlite3.connect(DB_PATH) as conn:
-        user_df = pd.read_sql_query(
-            "SELECT User_id, Username FROM UserData", conn
-        )
+    user_df = load_trainers()
 
     if user_df.empty:
         st.info("등록된 트레이너가 없네. UserData 테이블을 먼저 채워주게나.")
@@ -658,26 +608,33 @@ with st.sidebar:
     if st.button("대화 및 포켓몬 초기화", key="btn_reset_all"):
         # 1) 채팅/리포트 세션 상태 초기화
         st.session_state.messages = []
-        st.session_state.analysis_results = []
+        st.session_state.analysis_results = AnalysisStore()
         st.session_state.first_greeting_done = False
         if "final_report_html" in st.session_state:
             del st.session_state.final_report_html
 
         # 2)  UserPokemon 테이블을 원래 상태로 되돌리기
         if st.session_state.get("original_userpokemon") is not None:
-            with sqlite3.connect(DB_PATH) as conn:
+            snapshot = st.session_state.original_userpokemon
+            columns = ", ".join(snapshot.columns)
+            placeholders = ", ".join("?" for _ in snapshot.columns)
+            rows = [
+                tuple(None if pd.isna(v) else v for v in row)
+                for row in snapshot.itertuples(index=False, name=None)
+            ]
+            # 삭제 + 재삽입을 하나의 쓰기 트랜잭션으로 처리
+            with get_db().writer() as conn:
                 cur = conn.cursor()
                 # 기존 UserPokemon 모두 삭제
                 cur.execute("DELETE FROM UserPokemon")
-                conn.commit()
 
                 # 스냅샷에 있던 원본 데이터 다시 INSERT
-                st.session_state.original_userpokemon.to_sql(
-                    "UserPokemon",
-                    conn,
-                    if_exists="append",
-                    index=False,
+                cur.executemany(
+                    f"INSERT INTO UserPokemon ({columns}) VALUES ({placeholders})",
+                    rows,
                 )
+                # 팀 요약 테이블도 통째로 다시 계산
+                refresh_user_team_summary(conn)
         else:
             # 스냅샷이 없으면 그냥 경고만 출력 (DB는 건드리지 않음)
             st.warning("초기 UserPokemon 스냅샷이 없어 포켓몬 데이터는 유지되었네.")
@@ -685,6 +642,52 @@ with st.sidebar:
         # 3) 화면 새로고침
         st.rerun()
 
+    # 📊 관리자용 성능 지표 (POKELIFE_METRICS=1 일 때만)
+    if metrics.ENABLED:
+        st.markdown("""
+        <hr style="border:1px solid rgba(255,255,255,0.4)">
+        """, unsafe_allow_html=True)
+
+        with st.expander("📊 성능 지표 (관리자)"):
+            if st.session_state.get("last_turn_timings"):
+                st.caption("마지막 질문 처리 시간")
+                st.code(TurnTimings.format(st.session_state.last_turn_timings))
+
+            st.caption(
+                f"이 세션의 분석 결과 저장량: {st.session_state.analysis_results.nbytes() / 1024:.1f} KiB "
+                f"({len(st.session_state.analysis_results)}건)"
+            )
+
+            snapshot = metrics.registry.snapshot()
+            latency = snapshot["histograms"].get("pokelife_stage_seconds", {})
+            if latency:
+                st.caption("단계별 지연시간 (초)")
+                st.dataframe(
+                    pd.DataFrame.from_dict(latency, orient="index").round(4),
+                    width="stretch",
+                )
+
+            hit_rates = metrics.cache_hit_rates()
+            if hit_rates:
+                st.caption("캐시 적중률")
+                st.dataframe(
+                    pd.Series(hit_rates, name="hit_rate").round(3),
+                    width="stretch",
+                )
+
+            tokens = snapshot["counters"].get("pokelife_llm_tokens_total", {})
+            if tokens:
+                st.caption("LLM 토큰 사용량")
+                st.dataframe(pd.Series(tokens, name="tokens"), width="stretch")
+
+            st.download_button(
+                "Prometheus 텍스트 다운로드",
+                metrics.registry.to_prometheus(),
+                file_name="pokelife_metrics.prom",
+                mime="text/plain",
+                key="download_metrics",
+            )
+
 
 
 
@@ -696,7 +699,10 @@ for message in st.session_state.messages:
     avatar = "data/professor.png" if role == "assistant" else "data/user.png"
 
     with st.chat_message(role, avatar=avatar):
-        st.markdown(message["content"], unsafe_allow_html=True)
+        # assistant 메시지는 참조(parts)만 저장돼 있어서 캐시에서 다시 그린다
+        st.markdown(render_message(message), unsafe_allow_html=True)
+        if message.get("chart_data") is not None:
+            st.bar_chart(message["chart_data"])
 
 
 
@@ -791,37 +797,80 @@ if prompt:
 
     # ✅ 4. assistant 응답 출력
     with st.chat_message("assistant", avatar="data/professor.png"):
+        live = st.empty()
+
+        def show_explanation(text: str):
+            # 설명이 생성되는 대로 먼저 보여준다 (최종 응답으로 덮어씀)
+            live.markdown(f"### 🧓 오박사의 답변\n{text}▌")
+
         with st.spinner("오박사가 연구중이에요...🔍"):
 
-            bot_response = execute_query_and_format_response(prompt) + easter_egg
+            result = execute_query_and_format_response(prompt, on_explanation=show_explanation)
+            chart_data = result["chart_data"]
+            st.session_state.last_turn_timings = result.get("timings")
 
             # ✅ 첫 질문일 때만 자기소개
+            intro = ""
             if not st.session_state.first_greeting_done:
                 intro = "내 이름은 오박사. 포켓몬 연구소의 연구 책임자라네!\n\n"
-                bot_response = intro + bot_response
                 st.session_state.first_greeting_done = True
 
-            st.markdown(bot_response, unsafe_allow_html=True)
+            assistant_msg = assistant_message(result, prefix=intro, suffix=easter_egg)
+            bot_response = intro + result["content"] + easter_egg
+
+            live.markdown(bot_response, unsafe_allow_html=True)
+            if chart_data is not None:
+                st.bar_chart(chart_data)
 
     # ✅ 5. 대화 기록 저장
-    st.session_state.messages.append({"role": "assistant", "content": bot_response})
+    st.session_state.messages.append(assistant_msg)
 
 
 
 # ------------------------------------------------
 # 8. 최종 리포트 출력
 # ------------------------------------------------
-if "final_report_html" in st.session_state:
-    st.markdown("---")
-    st.markdown("## 📘 오박사의 최종 연구 리포트")
-
-    st.markdown(
+def render_report(target, report_html: str):
+    target.markdown(
         f"""
         <div class="report-container">
-            {st.session_state.final_report_html}
+            {report_html}
         </div>
         """,
         unsafe_allow_html=True,
     )
 
 
+if "pending_report" in st.session_state:
+    # 리포트 HTML을 받는 대로 그려서 첫 내용이 바로 보이게 한다
+    options = st.session_state.pop("pending_report")
+    st.markdown("---")
+    st.markdown("## 📘 오박사의 최종 연구 리포트")
+
+    report_box = st.empty()
+    report_parts = []
+    last_drawn = 0.0
+    with st.spinner("리포트를 작성 중이에요..."):
+        for chunk in generate_final_report_stream(
+            st.session_state.analysis_results,
+            gen_filter=options["gen_filter"],
+            type_filter=options["type_filter"],
+        ):
+            report_parts.append(chunk)
+            # 청크마다 다시 그리면 렌더링/전송량이 리포트 길이의 제곱으로 늘어나서 일정 간격으로만 그린다
+            now = time.monotonic()
+            if now - last_drawn >= REPORT_REDRAW_INTERVAL_S:
+                render_report(report_box, "".join(report_parts))
+                last_drawn = now
+
+    # 마지막 조각까지 포함해서 한 번 더 그린다
+    st.session_state.final_report_html = "".join(report_parts).strip()
+    render_report(report_box, st.session_state.final_report_html)
+
+elif "final_report_html" in st.session_state:
+    st.markdown("---")
+    st.markdown("## 📘 오박사의 최종 연구 리포트")
+
+    render_report(st, st.session_state.final_report_html)
+
+
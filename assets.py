@@ -0,0 +1,485 @@
+# assets.py
+import base64
+import hashlib
+import html
+import json
+import mimetypes
+import mmap
+import os
+import struct
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import record_cache
+
+# ------------------------------------------------
+# 0. 경로 / 설정
+# ------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Streamlit 정적 파일 서빙 폴더 (.streamlit/config.toml 의 enableStaticServing 필요)
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL_PREFIX = "app/static"
+
+# POKELIFE_STATIC_ASSETS=1 이면 base64 인라인 대신 정적 URL로 내보낸다
+SERVE_STATIC = os.environ.get("POKELIFE_STATIC_ASSETS", "0") == "1"
+
+_MIME_OVERRIDES = {
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/ttf",
+    ".webp": "image/webp",
+}
+
+
+# ------------------------------------------------
+# 1. 내용 기반(content-addressed) 인코딩 캐시
+# ------------------------------------------------
+# (절대경로, mtime, 크기) → 내용 해시 → base64 문자열
+# 같은 내용의 파일은 경로가 달라도 base64 문자열 하나만 메모리에 둔다.
+# base64 는 총량 상한이 있는 LRU (썸네일이 없을 때 스프라이트 원본까지 여기로 들어오므로)
+ASSET_CACHE_MAX_BYTES = int(float(os.environ.get("POKELIFE_ASSET_CACHE_MB", 8)) * 1024 * 1024)
+
+_lock = threading.Lock()
+_digest_by_stat: Dict[Tuple[str, int, int], str] = {}
+_b64_by_digest: "OrderedDict[str, str]" = OrderedDict()
+_b64_bytes = 0
+_static_name_by_digest: Dict[str, str] = {}
+
+
+def resolve_path(path: str) -> str:
+    """상대 경로는 실행 위치가 아니라 프로젝트 폴더 기준으로 해석"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(BASE_DIR, path)
+
+
+def guess_mime(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in _MIME_OVERRIDES:
+        return _MIME_OVERRIDES[ext]
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def _remember(digest: str, b64: str) -> None:
+    """base64 를 LRU 에 넣고 상한을 넘으면 오래된 것부터 버린다 (_lock 안에서 호출)"""
+    global _b64_bytes
+    if digest in _b64_by_digest:
+        _b64_by_digest.move_to_end(digest)
+        return
+    _b64_by_digest[digest] = b64
+    _b64_bytes += len(b64)
+    while _b64_bytes > ASSET_CACHE_MAX_BYTES and len(_b64_by_digest) > 1:
+        _, old = _b64_by_digest.popitem(last=False)
+        _b64_bytes -= len(old)
+
+
+def _load(path: str) -> Optional[Tuple[str, str]]:
+    """(내용 해시, base64) 반환 (처음 보거나, 수정됐거나, LRU 에서 밀려난 파일만 실제로 읽는다)"""
+    full = resolve_path(path)
+    try:
+        st = os.stat(full)
+    except FileNotFoundError:
+        print(f"⚠️ Warning: File not found at {path}.")
+        return None
+
+    key = (full, st.st_mtime_ns, st.st_size)
+    with _lock:
+        digest = _digest_by_stat.get(key)
+        b64 = _b64_by_digest.get(digest) if digest is not None else None
+        if b64 is not None:
+            _b64_by_digest.move_to_end(digest)
+    record_cache("asset", b64 is not None)
+    if b64 is not None:
+        return digest, b64
+
+    try:
+        with open(full, "rb") as f:
+            data = f.read()
+    except Exception as e:
+        print(f"❌ Error encoding {path}: {e}")
+        return None
+
+    digest = hashlib.sha256(data).hexdigest()
+    b64 = base64.b64encode(data).decode()
+    with _lock:
+        # 같은 경로의 이전 버전 항목은 정리
+        for old in [k for k in _digest_by_stat if k[0] == full and k != key]:
+            del _digest_by_stat[old]
+        _digest_by_stat[key] = digest
+        _remember(digest, b64)
+    return digest, b64
+
+
+def encode_asset(path: str) -> str:
+    """파일을 base64 문자열로 (파일 내용별로 인코딩 결과를 LRU 에 보관)"""
+    loaded = _load(path)
+    if loaded is None:
+        return ""
+    return loaded[1]
+
+
+def _publish_static(path: str, digest: str) -> str:
+    """static/ 폴더에 '내용해시.확장자' 로 복사하고 파일명을 반환"""
+    with _lock:
+        name = _static_name_by_digest.get(digest)
+    if name:
+        return name
+
+    ext = os.path.splitext(path)[1].lower()
+    name = f"{digest[:16]}{ext}"
+    target = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(target):
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        shutil.copyfile(resolve_path(path), target)
+
+    with _lock:
+        _static_name_by_digest[digest] = name
+    return name
+
+
+def asset_url(path: str, mime: Optional[str] = None) -> str:
+    """
+    CSS/HTML에 넣을 URL.
+    - 기본: data URI (base64 인라인, 인코딩은 캐시됨)
+    - SERVE_STATIC: Streamlit 정적 서빙 URL (브라우저가 한 번 받아서 캐시)
+    파일이 없으면 빈 문자열
+    """
+    loaded = _load(path)
+    if loaded is None:
+        return ""
+    digest, b64 = loaded
+
+    if SERVE_STATIC:
+        try:
+            return f"{STATIC_URL_PREFIX}/{_publish_static(path, digest)}"
+        except OSError as e:
+            print(f"⚠️ 정적 파일 배포 실패, 인라인으로 대체합니다: {e}")
+
+    mime = mime or guess_mime(path)
+    return f"data:{mime};base64,{b64}"
+
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            "files": len(_digest_by_stat),
+            "unique_contents": len(_b64_by_digest),
+            "encoded_bytes": _b64_bytes,
+        }
+
+
+# ------------------------------------------------
+# 2. 포켓몬 스프라이트 (썸네일 + dexnum 인덱스 + HTML LRU)
+# ------------------------------------------------
+POKEMON_IMG_DIR = os.path.join(BASE_DIR, "data", "pokemon_jpg")
+SPRITE_DIR = os.path.join(BASE_DIR, "data", "sprites")
+
+# 화면에서 실제로 쓰는 너비들 (그리드 96px, 단일 이미지 200px)
+SPRITE_WIDTHS = (96, 200)
+SPRITE_QUALITY = 80
+_SPRITE_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
+def _thumbnail_format() -> Tuple[str, str, str]:
+    """(PIL 포맷, 확장자, MIME) — WebP 인코더가 없으면 JPEG"""
+    try:
+        from PIL import features
+        if features.check("webp"):
+            return "WEBP", ".webp", "image/webp"
+    except Exception:
+        pass
+    return "JPEG", ".jpg", "image/jpeg"
+
+
+def thumbnail_path(dexnum: int, width: int) -> str:
+    _, ext, _ = _thumbnail_format()
+    return os.path.join(SPRITE_DIR, f"w{width}", f"{dexnum}{ext}")
+
+
+def build_thumbnails(widths=SPRITE_WIDTHS, force: bool = False) -> int:
+    """
+    data/pokemon_jpg 의 원본을 렌더링 너비에 맞게 줄이고 재압축해서 data/sprites/w{너비}/ 에 저장.
+    원본보다 새 썸네일이 이미 있으면 건너뛴다. 만든 파일 수를 반환.
+    """
+    from PIL import Image
+
+    fmt, ext, _ = _thumbnail_format()
+    if not os.path.isdir(POKEMON_IMG_DIR):
+        print(f"❌ 이미지 폴더 없음: {POKEMON_IMG_DIR}")
+        return 0
+
+    made = 0
+    for filename in os.listdir(POKEMON_IMG_DIR):
+        base, src_ext = os.path.splitext(filename)
+        if not base.isdigit() or src_ext.lower() not in _SPRITE_EXTS:
+            continue
+        src = os.path.join(POKEMON_IMG_DIR, filename)
+        src_mtime = os.stat(src).st_mtime
+
+        for width in widths:
+            dst = os.path.join(SPRITE_DIR, f"w{width}", f"{int(base)}{ext}")
+            if not force and os.path.exists(dst) and os.stat(dst).st_mtime >= src_mtime:
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            with Image.open(src) as im:
+                im = im.convert("RGBA" if fmt == "WEBP" and im.mode in ("RGBA", "LA", "P") else "RGB")
+                if im.width > width:
+                    height = round(im.height * width / im.width)
+                    im = im.resize((width, height), Image.LANCZOS)
+                if fmt == "WEBP":
+                    im.save(dst, fmt, quality=SPRITE_QUALITY, method=6)
+                else:
+                    im.save(dst, fmt, quality=SPRITE_QUALITY, optimize=True)
+            made += 1
+
+    print(f"✅ 스프라이트 썸네일 {made}개 생성 ({fmt}, 너비 {list(widths)})")
+    return made
+
+
+_sprite_index_lock = threading.Lock()
+_sprite_index: Optional[Dict[int, str]] = None
+
+
+def sprite_index() -> Dict[int, str]:
+    """
+    dexnum → 원본 이미지 경로. build_db가 만든 POKEMON_IMAGES 매핑을 프로세스당 한 번 읽는다.
+    (테이블이 없으면 이미지 폴더를 한 번 스캔)
+    """
+    global _sprite_index
+    if _sprite_index is not None:
+        return _sprite_index
+
+    with _sprite_index_lock:
+        if _sprite_index is None:
+            index: Dict[int, str] = {}
+            try:
+                from db import get_db
+                rows = get_db().reader().execute(
+                    "SELECT pokemon_id, file_name FROM POKEMON_IMAGES ORDER BY file_name"
+                ).fetchall()
+                for dexnum, file_name in rows:
+                    index.setdefault(int(dexnum), os.path.join(POKEMON_IMG_DIR, file_name))
+            except Exception as e:
+                print(f"⚠️ POKEMON_IMAGES 매핑을 읽지 못해 폴더를 스캔합니다: {e}")
+                if os.path.isdir(POKEMON_IMG_DIR):
+                    for filename in sorted(os.listdir(POKEMON_IMG_DIR)):
+                        base, ext = os.path.splitext(filename)
+                        if base.isdigit() and ext.lower() in _SPRITE_EXTS:
+                            index.setdefault(int(base), os.path.join(POKEMON_IMG_DIR, filename))
+            _sprite_index = index
+    return _sprite_index
+
+
+def _thumbnail_width(width: int) -> Optional[int]:
+    """렌더링 너비 이상인 가장 작은 썸네일 너비"""
+    for w in sorted(SPRITE_WIDTHS):
+        if w >= width:
+            return w
+    return None
+
+
+def sprite_source(dexnum: int, width: int) -> Optional[str]:
+    """렌더링 너비 이상인 가장 작은 썸네일, 없으면 원본 경로"""
+    w = _thumbnail_width(width)
+    if w is not None:
+        path = thumbnail_path(dexnum, w)
+        if os.path.exists(path):
+            return path
+    return sprite_index().get(int(dexnum))
+
+
+@lru_cache(maxsize=256)
+def sprite_html(dexnum: int, width: int = 200) -> Optional[str]:
+    """도감번호의 <img> 태그 (인코딩된 HTML 조각을 LRU로 보관). 이미지가 없으면 None"""
+    # 1) 스프라이트 아틀라스(mmap)에 있으면 파일을 열지 않고 바로 잘라서 인코딩
+    atlas = get_sprite_atlas()
+    w = _thumbnail_width(width)
+    if atlas is not None and w is not None and not SERVE_STATIC:
+        view = atlas.get(dexnum, w)
+        if view is not None:
+            b64 = base64.b64encode(view).decode()
+            return f"<img src='data:{atlas.mime};base64,{b64}' alt='포켓몬 이미지' width='{width}'>"
+
+    # 2) 썸네일/원본 파일
+    path = sprite_source(dexnum, width)
+    if not path:
+        return None
+    url = asset_url(path)
+    if not url:
+        return None
+    return f"<img src='{url}' alt='포켓몬 이미지' width='{width}'>"
+
+
+# ------------------------------------------------
+# 2-1. 스프라이트 아틀라스 (썸네일 전체를 파일 하나로 묶어 mmap)
+# ------------------------------------------------
+# 파일 구조: MAGIC(8) | 헤더 길이(uint32, LE) | 헤더 JSON | 이미지 바이트들...
+# 헤더: {"mime": ..., "entries": {"<너비>": {"<dexnum>": [오프셋, 길이]}}}
+ATLAS_PATH = os.path.join(SPRITE_DIR, "atlas.bin")
+ATLAS_MAGIC = b"PKATLAS1"
+
+
+def build_sprite_atlas(widths=SPRITE_WIDTHS, path: str = ATLAS_PATH) -> int:
+    """data/sprites/w{너비}/ 의 썸네일을 하나의 아틀라스 파일로 묶는다. 묶은 이미지 수 반환"""
+    _, ext, mime = _thumbnail_format()
+    blobs: List[bytes] = []
+    entries: Dict[str, Dict[str, List[int]]] = {}
+    offset = 0
+
+    for width in widths:
+        folder = os.path.join(SPRITE_DIR, f"w{width}")
+        if not os.path.isdir(folder):
+            continue
+        table = entries.setdefault(str(width), {})
+        for filename in sorted(os.listdir(folder)):
+            base, file_ext = os.path.splitext(filename)
+            if not base.isdigit() or file_ext != ext:
+                continue
+            with open(os.path.join(folder, filename), "rb") as f:
+                data = f.read()
+            table[str(int(base))] = [offset, len(data)]
+            blobs.append(data)
+            offset += len(data)
+
+    count = sum(len(t) for t in entries.values())
+    if not count:
+        print("⚠️ 썸네일이 없어 스프라이트 아틀라스를 만들지 않았습니다.")
+        return 0
+
+    header = json.dumps({"mime": mime, "entries": entries}, separators=(",", ":")).encode("utf-8")
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(ATLAS_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for data in blobs:
+            f.write(data)
+    # 다 쓴 뒤에 교체 (읽는 중인 프로세스는 기존 파일을 계속 본다)
+    os.replace(tmp, path)
+
+    print(f"✅ 스프라이트 아틀라스 생성: 이미지 {count}개, {offset / 1024 / 1024:.1f}MB → {path}")
+    return count
+
+
+class SpriteAtlas:
+    """아틀라스 파일을 mmap 한 번으로 열고, 이미지는 복사 없이 memoryview로 잘라서 준다"""
+
+    def __init__(self, path: str = ATLAS_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        if bytes(self._view[:8]) != ATLAS_MAGIC:
+            raise ValueError(f"스프라이트 아틀라스 형식이 아닙니다: {path}")
+        (header_len,) = struct.unpack_from("<I", self._mmap, 8)
+        data_start = 12 + header_len
+        header = json.loads(bytes(self._view[12:data_start]).decode("utf-8"))
+
+        self.mime = header["mime"]
+        self._index: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (int(dexnum), int(width)): (data_start + off, length)
+            for width, table in header["entries"].items()
+            for dexnum, (off, length) in table.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, dexnum: int, width: int) -> Optional[memoryview]:
+        loc = self._index.get((int(dexnum), int(width)))
+        if loc is None:
+            return None
+        start, length = loc
+        return self._view[start:start + length]
+
+
+_atlas_lock = threading.Lock()
+_atlas: Optional[SpriteAtlas] = None
+_atlas_loaded = False
+
+
+def get_sprite_atlas() -> Optional[SpriteAtlas]:
+    """프로세스 전체에서 한 번만 여는 아틀라스. 파일이 없거나 깨졌으면 None (파일 경로 방식으로 동작)"""
+    global _atlas, _atlas_loaded
+    if _atlas_loaded:
+        return _atlas
+    with _atlas_lock:
+        if not _atlas_loaded:
+            if os.path.exists(ATLAS_PATH):
+                try:
+                    _atlas = SpriteAtlas(ATLAS_PATH)
+                except Exception as e:
+                    print(f"⚠️ 스프라이트 아틀라스 로드 실패: {e}")
+            _atlas_loaded = True
+    return _atlas
+
+
+# ------------------------------------------------
+# 3. 여러 마리 스프라이트 그리드
+# ------------------------------------------------
+SPRITE_GRID_WIDTH = 96
+SPRITE_GRID_MAX_ITEMS = 10
+SPRITE_GRID_MAX_BYTES = 400 * 1024   # 메시지 하나에 인라인으로 넣을 이미지 총량 상한
+
+# 캐시에 없는 스프라이트를 한 번에 병렬로 읽어오기 위한 공용 풀
+_sprite_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sprite")
+
+
+def sprite_grid_html(
+    items: Sequence[Tuple[int, Optional[str]]],
+    width: int = SPRITE_GRID_WIDTH,
+    max_items: int = SPRITE_GRID_MAX_ITEMS,
+    max_bytes: int = SPRITE_GRID_MAX_BYTES,
+    total: Optional[int] = None,
+) -> str:
+    """
+    [(dexnum, 캡션)] 목록을 스프라이트 그리드 HTML로.
+    - 같은 dexnum은 한 번만, 최대 max_items 마리
+    - 스프라이트는 한 번에 모아서 병렬 로딩 (이미 캐시된 건 즉시 반환)
+    - 인라인 이미지 총량이 max_bytes 를 넘으면 거기서 자른다
+    - total: 결과 전체의 서로 다른 dexnum 수 (items 가 앞부분만일 때). "외 N마리" 는 total - 실제로 그린 수
+    """
+    seen = set()
+    picked: List[Tuple[int, Optional[str]]] = []
+    for dexnum, caption in items:
+        dexnum = int(dexnum)
+        if dexnum in seen:
+            continue
+        seen.add(dexnum)
+        if len(picked) < max_items:
+            picked.append((dexnum, caption))
+    if not picked:
+        return ""
+
+    tags = list(_sprite_pool.map(lambda d: sprite_html(d, width), [d for d, _ in picked]))
+
+    cells = []
+    used = 0
+    for (dexnum, caption), tag in zip(picked, tags):
+        if not tag:
+            continue
+        if used + len(tag) > max_bytes:
+            break
+        used += len(tag)
+        label = html.escape(caption) if caption else f"No.{dexnum}"
+        cells.append(
+            "<div style='text-align:center;width:{w}px'>{tag}"
+            "<div style='font-size:12px'>{label}</div></div>".format(w=width + 8, tag=tag, label=label)
+        )
+
+    if not cells:
+        return ""
+
+    more = max(total or 0, len(seen)) - len(cells)
+    footer = f"<div style='align-self:center'>외 {more}마리</div>" if more > 0 else ""
+    return (
+        "<div style='display:flex;flex-wrap:wrap;gap:8px;align-items:flex-start'>"
+        + "".join(cells) + footer + "</div>"
+    )
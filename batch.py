@@ -0,0 +1,239 @@
+# batch.py
+"""
+질문 여러 개를 한 번에 답하는 배치 모드.
+질문 파일(txt / json / csv)이나 템플릿(예: "{type} 타입 포켓몬의 평균 공격력")을 받아
+nl_to_sql → SQL 실행을 작업자 풀에서 병렬로 돌리고, 질문별 SQL / 설명 / 결과 표를 CSV 또는 Parquet 으로 저장한다.
+원하면 결과를 analysis_results(AnalysisStore)에 모아 최종 리포트 하나로 만든다.
+
+예)  python batch.py questions.txt -o answers.parquet --workers 8 --llm-rps 5
+     python batch.py --template "{type} 타입 포켓몬의 평균 공격력은?" -o avg_attack.csv --report report.html
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from llm_client import LLM_RPS, set_rate_limit
+from pipeline import analysis_summary, execute_query
+from session_store import AnalysisStore
+from utils import TYPE_MAP_KO_TO_EN, TYPES, generate_final_report, nl_to_sql
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+BATCH_WORKERS = int(os.environ.get("POKELIFE_BATCH_WORKERS", 4))
+
+# 결과 파일에 질문별 결과 표를 JSON 으로 넣을 최대 행 수
+RESULT_KEEP_ROWS = 200
+
+TYPE_EN_TO_KO = {en: ko for ko, en in TYPE_MAP_KO_TO_EN.items()}
+
+
+# ------------------------------------------------
+# 1. 질문 불러오기
+# ------------------------------------------------
+def load_questions(path: str) -> List[str]:
+    """
+    .txt  : 한 줄에 질문 하나 (빈 줄, # 주석 무시)
+    .json : 문자열 리스트 또는 {"question": ...} 리스트
+    .csv  : question 컬럼 (없으면 첫 번째 컬럼)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            items = json.load(f)
+        questions = [item["question"] if isinstance(item, dict) else item for item in items]
+    elif ext == ".csv":
+        df = pd.read_csv(path)
+        col = "question" if "question" in df.columns else df.columns[0]
+        questions = df[col].dropna().astype(str).tolist()
+    else:
+        with open(path, encoding="utf-8") as f:
+            questions = [line for line in f.read().splitlines() if not line.strip().startswith("#")]
+    return [q.strip() for q in questions if q and q.strip()]
+
+
+def expand_template(template: str) -> List[str]:
+    """{type}(한글 타입명) / {type_en}(영문 타입명)이 들어간 템플릿을 18개 타입으로 펼친다"""
+    return [template.format(type=TYPE_EN_TO_KO.get(t, t), type_en=t) for t in TYPES]
+
+
+# ------------------------------------------------
+# 2. 질문 하나 처리
+# ------------------------------------------------
+def answer_question(question: str) -> Dict[str, Any]:
+    """
+    질문 → SQL → 실행. 실패해도 예외 대신 error 가 채워진 결과를 돌려준다.
+    호출 속도 제한은 실제로 LLM 을 부를 때만 llm_client 의 공용 제한이 적용된다 (규칙/캐시 질문은 바로 처리).
+    SQL 실행은 pipeline.execute_query 를 그대로 쓴다
+    (규칙 기반 질문은 메모리 Pokédex, 나머지는 작업자 스레드별로 재사용되는 읽기 전용 연결).
+    """
+    started = time.perf_counter()
+    record = {
+        "question": question,
+        "source": None,
+        "sql": None,
+        "explanation": None,
+        "error": None,
+        "result": None,
+        "total_rows": None,
+        "truncated": False,
+    }
+    try:
+        data = nl_to_sql(question)
+        record["sql"] = data.get("sql")
+        record["explanation"] = data.get("explanation_ko")
+        record["source"] = "rule" if data.get("intent") else "llm"
+        if not record["sql"]:
+            record["error"] = record["explanation"] or "SQL을 만들지 못했습니다."
+        else:
+            bounded = execute_query(record["sql"], data.get("intent"))
+            record["result"] = bounded["df"]
+            record["total_rows"] = bounded["total_rows"]
+            record["truncated"] = bounded["truncated"]
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+# ------------------------------------------------
+# 3. 배치 실행
+# ------------------------------------------------
+def run_batch(
+    questions: List[str],
+    workers: int = BATCH_WORKERS,
+    on_done=None,
+) -> Dict[str, Any]:
+    """
+    질문들을 workers 개 스레드로 병렬 처리.
+    on_done(입력 순번, 결과)는 끝나는 순서대로 호출된다.
+    반환: {"records": 입력 순서대로의 결과, "seconds": 전체 소요 시간, "throughput": 초당 질문 수}
+    """
+    started = time.perf_counter()
+    records: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = {pool.submit(answer_question, q): i for i, q in enumerate(questions)}
+        for future in as_completed(futures):
+            i = futures[future]
+            records[i] = future.result()
+            if on_done:
+                on_done(i, records[i])
+    elapsed = time.perf_counter() - started
+    return {
+        "records": records,
+        "seconds": elapsed,
+        "throughput": len(questions) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def records_frame(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """결과 파일용 DataFrame (결과 표는 앞 RESULT_KEEP_ROWS 행을 JSON 문자열로)"""
+    rows = []
+    for i, r in enumerate(records, 1):
+        df = r["result"]
+        rows.append({
+            "no": i,
+            "question": r["question"],
+            "source": r["source"],
+            "sql": r["sql"],
+            "explanation": r["explanation"],
+            "error": r["error"],
+            "rows": None if df is None else len(df),
+            "total_rows": r["total_rows"],
+            "truncated": r["truncated"],
+            "seconds": round(r["seconds"], 4),
+            "result_json": None if df is None else df.head(RESULT_KEEP_ROWS).to_json(orient="records", force_ascii=False),
+        })
+    return pd.DataFrame(rows)
+
+
+def write_results(records: List[Dict[str, Any]], path: str) -> str:
+    """.parquet 이면 Parquet(pyarrow 필요, 없으면 .csv 로 대신 저장), 그 외에는 CSV. 실제로 쓴 경로 반환"""
+    df = records_frame(records)
+    if path.lower().endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+            return path
+        except ImportError:
+            path = os.path.splitext(path)[0] + ".csv"
+            print(f"⚠️ pyarrow 가 없어 CSV로 저장합니다: {path}")
+    df.to_csv(path, index=False, encoding="utf-8-sig")
+    return path
+
+
+def to_analysis_store(records: List[Dict[str, Any]]) -> AnalysisStore:
+    """성공한 결과를 analysis_results 와 같은 형태로 모은다 (최종 리포트 입력)"""
+    store = AnalysisStore()
+    for r in records:
+        if r["result"] is not None:
+            store.append(analysis_summary(r["question"], {
+                "sql": r["sql"],
+                "df": r["result"],
+                "total_rows": r["total_rows"],
+                "truncated": r["truncated"],
+            }))
+    return store
+
+
+# ------------------------------------------------
+# 4. CLI
+# ------------------------------------------------
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="질문 파일을 병렬로 답하고 결과를 CSV/Parquet 으로 저장")
+    parser.add_argument("questions", nargs="?", help="질문 파일 (.txt / .json / .csv)")
+    parser.add_argument("--template", help='타입별로 펼칠 질문 템플릿 (예: "{type} 타입 포켓몬의 평균 공격력은?")')
+    parser.add_argument("-o", "--out", default="batch_results.csv", help="결과 파일 (.csv 또는 .parquet)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="동시에 처리할 질문 수")
+    parser.add_argument(
+        "--llm-rps", type=float,
+        help="초당 LLM 호출 수 (기본: POKELIFE_LLM_RPS, 0 = 제한 없음. 규칙/캐시로 답하는 질문에는 적용 안 됨)",
+    )
+    parser.add_argument("--report", help="결과를 모아 만든 최종 리포트 HTML 경로")
+    parser.add_argument("--gen", type=int, help="리포트 세대 필터")
+    parser.add_argument("--types", nargs="*", help="리포트 타입 필터 (영문, 예: Fire Water)")
+    args = parser.parse_args(argv)
+
+    questions = load_questions(args.questions) if args.questions else []
+    if args.template:
+        questions += expand_template(args.template)
+    if not questions:
+        parser.error("질문 파일 또는 --template 이 필요합니다.")
+
+    llm_rps = LLM_RPS if args.llm_rps is None else args.llm_rps
+    if args.llm_rps is not None:
+        set_rate_limit(args.llm_rps)
+    print(f"🚀 질문 {len(questions)}개 처리 시작 (workers={args.workers}, LLM {llm_rps or '제한 없음'}회/초)")
+
+    def progress(i: int, record: Dict[str, Any]) -> None:
+        mark = "❌" if record["error"] else "✅"
+        print(f"  {mark} [{i + 1}/{len(questions)}] {record['question']} ({record['seconds']:.2f}s)")
+
+    batch = run_batch(questions, workers=args.workers, on_done=progress)
+    records = batch["records"]
+    failed = sum(1 for r in records if r["error"])
+    out = write_results(records, args.out)
+    print(f"💾 결과 저장: {out}")
+    print(
+        f"📈 {len(records)}개 / {batch['seconds']:.2f}s → {batch['throughput']:.2f} 질문/초 "
+        f"(성공 {len(records) - failed}, 실패 {failed})"
+    )
+
+    if args.report:
+        store = to_analysis_store(records)
+        if not len(store):
+            print("⚠️ 리포트에 넣을 결과가 없습니다.")
+        else:
+            html = generate_final_report(store, args.gen, args.types or None)
+            with open(args.report, "w", encoding="utf-8") as f:
+                f.write(html)
+            print(f"📝 최종 리포트 저장: {args.report} (분석 {len(store)}건)")
+    return 1 if failed == len(records) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+# bench/run_bench.py
+"""
+오프라인 벤치마크: 로컬 스텁 OpenAI 서버 + MyPocket.sqlite 복사본으로
+채팅 턴(pipeline.run_turn, app.py 의 execute_query_and_format_response 본체)과
+generate_final_report 를 끝까지 실행하고 단계별 p50/p95/p99, 메모리 할당, 처리량을 보고한다.
+네트워크가 필요 없다.
+
+예)  python bench/run_bench.py --sessions 8 --turns 6 --latency-ms 200
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SOURCE_DB = os.path.join(ROOT_DIR, "MyPocket.sqlite")
+QUESTIONS_PATH = os.path.join(BENCH_DIR, "fixtures", "questions.json")
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+
+# ------------------------------------------------
+# 1. 환경 준비 (앱 모듈 import 전에 환경변수를 먼저 지정해야 함)
+# ------------------------------------------------
+def prepare_environment(workdir: str, base_url: str, cold_cache: bool) -> None:
+    fixture_db = os.path.join(workdir, "MyPocket.sqlite")
+    shutil.copyfile(SOURCE_DB, fixture_db)
+
+    os.environ["POKELIFE_DB_PATH"] = fixture_db
+    os.environ["POKELIFE_LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.sqlite")
+    os.environ["POKELIFE_QUERY_AUDIT"] = os.path.join(workdir, "query_audit.jsonl")
+    if cold_cache:
+        # 저장하자마자 LRU로 모두 지워서 매 턴 LLM(스텁)을 호출하게 만든다
+        os.environ["POKELIFE_LLM_CACHE_MAX"] = "0"
+    os.environ["POKELIFE_METRICS"] = "1"
+    os.environ["OPENAI_API_KEY"] = "bench-stub-key"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+# ------------------------------------------------
+# 2. 세션 시뮬레이션
+# ------------------------------------------------
+def run_session(session_id: int, questions: List[str], turns: int, samples: Dict[str, List[float]], lock: threading.Lock) -> int:
+    """한 사용자의 대화: 질문 turns개 → 최종 리포트 2회(두 번째는 캐시된 섹션 재사용). 완료한 턴 수 반환"""
+    from pipeline import run_turn, analysis_summary
+    from session_store import AnalysisStore
+    from report_sections import prefetch_section
+    from utils import generate_final_report
+
+    rng = random.Random(session_id)
+    history: List[str] = []
+    analysis_results = AnalysisStore()
+
+    for _ in range(turns):
+        question = rng.choice(questions)
+        history.append(question)
+        result = run_turn(question, chat_history=history[-3:], chart_mode="png")
+        if result["df"] is not None:
+            analysis_results.append(analysis_summary(question, result))
+            prefetch_section(analysis_results.last())
+        with lock:
+            for stage, seconds in result["timings"].items():
+                samples.setdefault(f"turn.{stage}", []).append(seconds)
+
+    start = time.perf_counter()
+    report = generate_final_report(analysis_results)
+    elapsed = time.perf_counter() - start
+    # 같은 결과로 한 번 더: 질문별 섹션은 캐시에서, 요약/결론만 다시 생성
+    start = time.perf_counter()
+    generate_final_report(analysis_results)
+    repeat_elapsed = time.perf_counter() - start
+    with lock:
+        samples.setdefault("final_report", []).append(elapsed)
+        samples.setdefault("final_report_repeat", []).append(repeat_elapsed)
+        if not report.startswith("<"):
+            samples.setdefault("final_report_errors", []).append(1.0)
+    return turns
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    from stub_openai import start_stub_server
+
+    stub = start_stub_server(latency_ms=args.latency_ms, chunk_delay_ms=args.chunk_delay_ms)
+    workdir = tempfile.mkdtemp(prefix="pokelife-bench-")
+    prepare_environment(workdir, stub.base_url, args.cold_cache)
+
+    import metrics
+
+    with open(args.questions, encoding="utf-8") as f:
+        questions = json.load(f)
+
+    samples: Dict[str, List[float]] = {}
+    lock = threading.Lock()
+
+    # 워밍업: 질문마다 한 번씩 실행해서 import, 폰트 로딩, 커넥션/캐시 준비 비용은 측정에서 뺀다
+    if args.warmup:
+        from pipeline import run_turn
+        for question in questions:
+            run_turn(question, chart_mode="png")
+        metrics.registry.reset()
+
+    if args.tracemalloc:
+        tracemalloc.start(10)
+        before = tracemalloc.take_snapshot()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as pool:
+        futures = [
+            pool.submit(run_session, i, questions, args.turns, samples, lock)
+            for i in range(args.sessions)
+        ]
+        total_turns = sum(f.result() for f in futures)
+    wall = time.perf_counter() - started
+
+    report: Dict[str, Any] = {
+        "config": {
+            "sessions": args.sessions,
+            "turns_per_session": args.turns,
+            "latency_ms": args.latency_ms,
+            "chunk_delay_ms": args.chunk_delay_ms,
+            "cold_cache": args.cold_cache,
+        },
+        "wall_seconds": round(wall, 3),
+        "turns": total_turns,
+        "throughput_turns_per_s": round(total_turns / wall, 2) if wall else 0.0,
+        "stub_requests": stub.requests,
+        "stages": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+            for name, values in sorted(samples.items())
+            if name != "final_report_errors"
+        },
+        "report_errors": len(samples.get("final_report_errors", [])),
+        "cache_hit_rates": {k: round(v, 3) for k, v in metrics.cache_hit_rates().items()},
+        "llm_tokens": metrics.registry.snapshot()["counters"].get("pokelife_llm_tokens_total", {}),
+    }
+
+    if args.tracemalloc:
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        diffs = after.compare_to(before, "lineno")
+        top = diffs[:5]
+        report["allocations"] = {
+            "current_kib": round(current / 1024, 1),
+            "peak_kib": round(peak / 1024, 1),
+            "per_turn_kib": round(sum(s.size_diff for s in diffs) / 1024 / max(total_turns, 1), 1),
+            "top_sites": [
+                {"site": str(s.traceback[0]), "size_diff_kib": round(s.size_diff / 1024, 1), "count_diff": s.count_diff}
+                for s in top
+            ],
+        }
+
+    stub.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+# ------------------------------------------------
+# 3. 출력
+# ------------------------------------------------
+def print_report(report: Dict[str, Any]) -> None:
+    cfg = report["config"]
+    print(
+        f"\n🏁 세션 {cfg['sessions']}개 × 턴 {cfg['turns_per_session']}개 "
+        f"(스텁 지연 {cfg['latency_ms']}ms, 청크 지연 {cfg['chunk_delay_ms']}ms, cold_cache={cfg['cold_cache']})"
+    )
+    print(
+        f"   총 {report['turns']}턴 / {report['wall_seconds']}s → {report['throughput_turns_per_s']} turns/s, "
+        f"스텁 요청 {report['stub_requests']}회"
+    )
+
+    print(f"\n{'stage':<28}{'count':>7}{'p50(ms)':>11}{'p95(ms)':>11}{'p99(ms)':>11}")
+    for name, s in report["stages"].items():
+        print(f"{name:<28}{s['count']:>7}{s['p50_ms']:>11}{s['p95_ms']:>11}{s['p99_ms']:>11}")
+
+    if report["cache_hit_rates"]:
+        print("\n캐시 적중률:", ", ".join(f"{k} {v:.0%}" for k, v in report["cache_hit_rates"].items()))
+    if report["report_errors"]:
+        print(f"⚠️ 리포트 생성 실패 {report['report_errors']}건")
+
+    alloc = report.get("allocations")
+    if alloc:
+        print(f"\n메모리: peak {alloc['peak_kib']} KiB, 측정 종료 시 {alloc['current_kib']} KiB, 턴당 순증가 ~{alloc['per_turn_kib']} KiB")
+        for site in alloc["top_sites"]:
+            print(f"   {site['size_diff_kib']:>9} KiB  {site['count_diff']:>7} blocks  {site['site']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PokeLife 오프라인 턴 지연 벤치마크")
+    parser.add_argument("--sessions", type=int, default=4, help="동시에 대화하는 가상 사용자 수")
+    parser.add_argument("--turns", type=int, default=5, help="세션당 질문 수 (끝나면 최종 리포트 1회)")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="질문별 워밍업 1회를 생략")
+    parser.add_argument("--latency-ms", type=float, default=150, help="스텁 서버 첫 응답 지연")
+    parser.add_argument("--chunk-delay-ms", type=float, default=2, help="스텁 스트리밍 청크 간 지연")
+    parser.add_argument("--cold-cache", action="store_true", help="NL→SQL 캐시를 끄고 매번 LLM 경로 사용")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="할당 추적 끄기 (추적 오버헤드 제거)")
+    parser.add_argument("--questions", default=QUESTIONS_PATH, help="질문 목록 JSON 파일")
+    parser.add_argument("--json", dest="json_out", help="결과를 JSON 파일로도 저장")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 결과 저장: {args.json_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# bench/stub_openai.py
+"""
+네트워크 없이 벤치마크를 돌리기 위한 OpenAI 호환 스텁 서버.
+POST /v1/chat/completions 만 흉내 낸다 (stream=True 이면 SSE 청크로 응답).
+
+- response_format=json_object 요청(nl_to_sql): 질문에 맞는 미리 준비된 SQL/설명 반환
+- 최종 리포트(요약/결론, 시스템 프롬프트에 섹션 표시가 있는 요청): 준비된 HTML 리포트 반환
+- 그 외(질문별 리포트 섹션): 질문을 넣은 짧은 HTML 섹션 반환
+- 첫 바이트 지연 / 청크 간 지연을 설정해서 실제 API 지연을 흉내 낼 수 있다
+
+단독 실행:  python bench/stub_openai.py --port 8765 --latency-ms 300
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESPONSES_PATH = os.path.join(BENCH_DIR, "fixtures", "stub_responses.json")
+
+# 최종 리포트 프롬프트에 들어 있는 질문별 섹션 자리 표시 (report_sections.SECTIONS_MARKER 와 같은 값)
+SECTIONS_MARKER = "<!--QUESTION_SECTIONS-->"
+
+# 스트리밍 응답을 이 글자 수 단위로 잘라서 보낸다 (실제 API의 토큰 단위 청크와 비슷하게)
+STREAM_CHUNK_CHARS = 8
+
+
+# ------------------------------------------------
+# 1. 미리 준비된 응답
+# ------------------------------------------------
+def load_responses(path: str = RESPONSES_PATH) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _current_question(messages: List[Dict[str, str]]) -> str:
+    """마지막 user 메시지에서 '[현재 질문]' 뒤쪽만 꺼낸다"""
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    return user.split("[현재 질문]", 1)[-1].strip()
+
+
+def pick_nl_sql(responses: Dict[str, Any], question: str) -> Dict[str, str]:
+    for item in responses["nl_to_sql"]:
+        if item["match"] in question:
+            return {"sql": item["sql"], "explanation_ko": item["explanation_ko"]}
+    return dict(responses["nl_to_sql_default"])
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+# ------------------------------------------------
+# 2. HTTP 핸들러
+# ------------------------------------------------
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 헤더와 본문을 따로 쓰므로 keep-alive 연결에서 Nagle + delayed ACK(~40ms)가 걸리지 않도록
+    disable_nagle_algorithm = True
+    server: "StubServer"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        messages = body.get("messages", [])
+
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps(pick_nl_sql(self.server.responses, _current_question(messages)), ensure_ascii=False)
+        elif SECTIONS_MARKER in system:
+            content = self.server.responses["final_report"]
+        else:
+            # 질문별 리포트 섹션
+            question = _current_question(messages).split("[질문]", 1)[-1].split("[분석 결과]", 1)[0].strip()
+            content = self.server.responses["report_section"].replace("{question}", question)
+
+        usage = {
+            "prompt_tokens": sum(_approx_tokens(m.get("content") or "") for m in messages),
+            "completion_tokens": _approx_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.server.count_request()
+
+        time.sleep(self.server.latency_s)
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self._send_stream(body.get("model", "stub"), content, usage if include_usage else None)
+        else:
+            self._send_json(body.get("model", "stub"), content, usage)
+
+    def _base(self, model: str, obj: str) -> Dict[str, Any]:
+        return {"id": "chatcmpl-stub", "object": obj, "created": int(time.time()), "model": model}
+
+    def _send_json(self, model: str, content: str, usage: Dict[str, int]) -> None:
+        payload = self._base(model, "chat.completion")
+        payload["choices"] = [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }]
+        payload["usage"] = usage
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, model: str, content: str, usage: Optional[Dict[str, int]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(payload: Any) -> None:
+            line = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            data = f"data: {line}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for i in range(0, len(content), STREAM_CHUNK_CHARS):
+            chunk = self._base(model, "chat.completion.chunk")
+            chunk["choices"] = [{
+                "index": 0,
+                "delta": {"content": content[i:i + STREAM_CHUNK_CHARS]},
+                "finish_reason": None,
+            }]
+            event(chunk)
+            if self.server.chunk_delay_s:
+                time.sleep(self.server.chunk_delay_s)
+
+        done = self._base(model, "chat.completion.chunk")
+        done["choices"] = [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        event(done)
+        if usage:
+            tail = self._base(model, "chat.completion.chunk")
+            tail["choices"] = []
+            tail["usage"] = usage
+            event(tail)
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency_ms: float, chunk_delay_ms: float, responses_path: str = RESPONSES_PATH):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.responses = load_responses(responses_path)
+        self.latency_s = latency_ms / 1000
+        self.chunk_delay_s = chunk_delay_ms / 1000
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+def start_stub_server(port: int = 0, latency_ms: float = 0, chunk_delay_ms: float = 0) -> StubServer:
+    """데몬 스레드로 스텁 서버를 띄우고 반환 (port=0 이면 빈 포트 자동 선택)"""
+    server = StubServer(port, latency_ms, chunk_delay_ms)
+    threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 호환 스텁 서버")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="응답 시작 전 지연")
+    parser.add_argument("--chunk-delay-ms", type=float, default=0, help="스트리밍 청크 사이 지연")
+    args = parser.parse_args()
+
+    stub = StubServer(args.port, args.latency_ms, args.chunk_delay_ms)
+    print(f"🧪 스텁 OpenAI 서버: {stub.base_url}  (OPENAI_BASE_URL 로 지정)")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
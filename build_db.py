@@ -1,25 +1,35 @@
 import sqlite3
 import pandas as pd
 import os
+import sys
+import time
+import hashlib
+import argparse
+import json
+
+from assets import build_thumbnails, build_sprite_atlas, ATLAS_PATH
+from aggregates import refresh_all as refresh_summaries
 
 # 기본 경로 설정
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DB_PATH = os.path.join(BASE_DIR, "MyPocket.sqlite")
 
-print("✅ DB 만들기 시작:", DB_PATH)
-print("📂 DATA_DIR:", DATA_DIR)
-print("📄 data 폴더 파일:", os.listdir(DATA_DIR))
-
 
-def read_csv_auto(path):
-    """여러 인코딩을 시도해서 CSV를 안전하게 읽기"""
+def read_csv_auto(path, preferred=None):
+    """
+    여러 인코딩을 시도해서 CSV를 안전하게 읽기.
+    (DataFrame, 성공한 인코딩) 반환. preferred 가 있으면 그 인코딩부터 시도한다.
+    """
     encodings = ["utf-8-sig", "cp949", "euc-kr"]
+    if preferred in encodings:
+        encodings.remove(preferred)
+        encodings.insert(0, preferred)
     last_err = None
     for enc in encodings:
         try:
             print(f"👉 {os.path.basename(path)} 를 {enc} 로 읽는 중...")
-            return pd.read_csv(path, encoding=enc)
+            return pd.read_csv(path, encoding=enc), enc
         except UnicodeDecodeError as e:
             print(f"   ⚠ {enc} 실패: {e}")
             last_err = e
@@ -34,31 +44,205 @@ def find_file(keyword):
     raise FileNotFoundError(f"'{keyword}' 를 포함한 파일을 data 폴더에서 찾지 못했습니다.")
 
 
-# SQLite 연결
-conn = sqlite3.connect(DB_PATH)
+# =======================================================
+# 0) 테이블 스키마 (컬럼명, SQLite 타입)
+# =======================================================
+# to_sql 자동 추론 대신 타입을 명시해서 total/weight 등이 TEXT로 들어가
+# ORDER BY가 사전순으로 정렬되던 문제를 막는다.
+POKEMON_COLUMNS = [
+    ("dexnum", "INTEGER PRIMARY KEY"),
+    ("name", "TEXT NOT NULL"),
+    ("generation", "INTEGER"),
+    ("type1", "TEXT"),
+    ("type2", "TEXT"),
+    ("species", "TEXT"),
+    ("height", "REAL"),
+    ("weight", "REAL"),
+    ("ability1", "TEXT"),
+    ("ability2", "TEXT"),
+    ("hidden_ability", "TEXT"),
+    ("hp", "INTEGER"),
+    ("attack", "INTEGER"),
+    ("defense", "INTEGER"),
+    ("sp_atk", "INTEGER"),
+    ("sp_def", "INTEGER"),
+    ("speed", "INTEGER"),
+    ("total", "INTEGER"),
+    ("ev_yield", "TEXT"),
+    ("catch_rate", "INTEGER"),
+    ("base_friendship", "INTEGER"),
+    ("base_exp", "INTEGER"),
+    ("growth_rate", "TEXT"),
+    ("egg_group1", "TEXT"),
+    ("egg_group2", "TEXT"),
+    ("percent_male", "REAL"),
+    ("percent_female", "REAL"),
+    ("egg_cycles", "INTEGER"),
+    ("special_group", "TEXT"),
+]
+
+USERDATA_COLUMNS = [
+    ("User_id", "INTEGER PRIMARY KEY"),
+    ("Username", "TEXT NOT NULL"),
+    ("Favorite_type", "TEXT"),
+]
+
+USERPOKEMON_COLUMNS = [
+    ("user_pokemon_id", "INTEGER PRIMARY KEY"),
+    ("user_id", "INTEGER NOT NULL REFERENCES UserData(User_id)"),
+    ("pokemon_id", "INTEGER NOT NULL REFERENCES pokemon(dexnum)"),
+    ("pokemon_name", "TEXT"),
+    ("slot_no", "INTEGER NOT NULL"),
+]
+
+POKEMON_IMAGES_COLUMNS = [
+    ("pokemon_id", "INTEGER NOT NULL"),
+    ("file_name", "TEXT NOT NULL"),
+    ("full_path", "TEXT"),
+]
+
+STAT_COLUMNS = ["hp", "attack", "defense", "sp_atk", "sp_def", "speed", "total"]
+
+# (인덱스 이름, 테이블, 컬럼들)
+INDEXES = [
+    ("idx_pokemon_name", "pokemon", ["name"]),
+    ("idx_pokemon_type1", "pokemon", ["type1"]),
+    ("idx_pokemon_type2", "pokemon", ["type2"]),
+    ("idx_pokemon_generation", "pokemon", ["generation"]),
+    *[(f"idx_pokemon_{col}", "pokemon", [col]) for col in STAT_COLUMNS],
+    ("idx_userpokemon_user_slot", "UserPokemon", ["user_id", "slot_no"]),
+    ("idx_userpokemon_pokemon", "UserPokemon", ["pokemon_id"]),
+]
+
+
+def create_table(conn, table, columns, extra=""):
+    """기존 테이블을 지우고 명시적인 타입으로 다시 생성"""
+    cols_sql = ",\n    ".join(f'"{name}" {decl}' for name, decl in columns)
+    if extra:
+        cols_sql += ",\n    " + extra
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" (\n    {cols_sql}\n)')
+
+
+def to_typed_rows(df, columns):
+    """
+    DataFrame을 스키마 타입에 맞는 파이썬 값 튜플 목록으로 변환.
+    숫자 컬럼에 섞인 잘못된 문자열은 NULL 처리하고, 키 컬럼이 비어 있는 행은 버린다.
+    """
+    df = df.copy()
+    for name, decl in columns:
+        if name not in df.columns:
+            df[name] = None
+        if decl.startswith(("INTEGER", "REAL")):
+            df[name] = pd.to_numeric(df[name], errors="coerce")
+
+    key = columns[0][0]
+    df = df[df[key].notna()]
+
+    rows = []
+    for record in df[[name for name, _ in columns]].itertuples(index=False, name=None):
+        row = []
+        for (name, decl), value in zip(columns, record):
+            if pd.isna(value):
+                row.append(None)
+            elif decl.startswith("INTEGER"):
+                row.append(int(value))
+            elif decl.startswith("REAL"):
+                row.append(float(value))
+            else:
+                row.append(str(value).strip())
+        rows.append(tuple(row))
+    return rows
+
+
+def table_columns(conn, table):
+    """현재 DB에 있는 테이블의 (컬럼명, 선언 타입) 목록. 테이블이 없으면 빈 리스트"""
+    return [(r[1], r[2]) for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def schema_matches(conn, table, columns):
+    """기존 테이블이 스키마 정의와 같은 컬럼/타입인지 (다르면 재생성 필요)"""
+    existing = table_columns(conn, table)
+    expected = [(name, decl.split()[0]) for name, decl in columns]
+    return existing == expected
 
-# 1) pokemon 테이블
-pokemon_csv = find_file("pokemon_data")
-df_pokemon = read_csv_auto(pokemon_csv)
-df_pokemon.to_sql("pokemon", conn, if_exists="replace", index=False)
-print("✅ pokemon 테이블 생성 완료")
 
-# 2) UserData 테이블
-userdata_csv = find_file("userdata")
-df_user = read_csv_auto(userdata_csv)
-df_user.to_sql("UserData", conn, if_exists="replace", index=False)
-print("✅ UserData 테이블 생성 완료")
+def upsert_table(conn, table, columns, df, key_cols, extra="", keep_runtime_rows=False):
+    """
+    테이블을 통째로 바꾸지 않고 키 기준으로 UPSERT 한 뒤,
+    원본에 없어진 행만 삭제한다. 스키마가 다르면 새로 만든다.
+    keep_runtime_rows=True 면 지난 빌드 때 원본에서 가져왔던 키만 삭제 대상으로 본다
+    (앱이 실행 중에 추가한 행은 원본 CSV에 없어도 남긴다).
+    """
+    if not schema_matches(conn, table, columns):
+        create_table(conn, table, columns, extra)
+
+    rows = to_typed_rows(df, columns)
+    names = [name for name, _ in columns]
+    col_sql = ", ".join(f'"{n}"' for n in names)
+    placeholders = ", ".join("?" for _ in names)
+    key_sql = ", ".join(f'"{k}"' for k in key_cols)
+    updates = [n for n in names if n not in key_cols]
+    if updates:
+        set_sql = ", ".join(f'"{n}" = excluded."{n}"' for n in updates)
+        conflict_sql = f"ON CONFLICT ({key_sql}) DO UPDATE SET {set_sql}"
+    else:
+        conflict_sql = f"ON CONFLICT ({key_sql}) DO NOTHING"
+
+    conn.executemany(
+        f'INSERT INTO "{table}" ({col_sql}) VALUES ({placeholders}) {conflict_sql}',
+        rows,
+    )
+
+    key_idx = [names.index(k) for k in key_cols]
+    if keep_runtime_rows:
+        keys = [tuple(row[i] for i in key_idx) for row in rows]
+        return len(rows), sync_imported_keys(conn, table, key_cols, keys)
+
+    # 원본에서 사라진 행 삭제 (임시 테이블에 키를 담아 비교)
+    conn.execute("DROP TABLE IF EXISTS temp._build_keys")
+    conn.execute(f"CREATE TEMP TABLE _build_keys ({key_sql})")
+    conn.executemany(
+        f"INSERT INTO temp._build_keys VALUES ({', '.join('?' for _ in key_cols)})",
+        [tuple(row[i] for i in key_idx) for row in rows],
+    )
+    deleted = conn.execute(
+        f'DELETE FROM "{table}" WHERE ({key_sql}) NOT IN (SELECT {key_sql} FROM temp._build_keys)'
+    ).rowcount
+    conn.execute("DROP TABLE temp._build_keys")
+    return len(rows), deleted
 
-# 3) UserPokemon 테이블
-userpokemon_csv = find_file("user_pokemon")
-df_user_pokemon = read_csv_auto(userpokemon_csv)
-df_user_pokemon.to_sql("UserPokemon", conn, if_exists="replace", index=False)
-print("✅ UserPokemon 테이블 생성 완료")
 
-conn.close()
-print("🎉 모든 작업 완료! →", DB_PATH)
+def sync_imported_keys(conn, table, key_cols, keys):
+    """
+    원본에서 가져온 키 목록을 IMPORTED_KEYS_TABLE 에 기록하고,
+    지난 빌드에는 있었지만 이번 원본에서 빠진 키의 행만 삭제한다. 삭제한 행 수 반환.
+    (기록이 없는 첫 빌드에서는 아무것도 지우지 않는다)
+    """
+    previous = {
+        tuple(json.loads(k))
+        for (k,) in conn.execute(f"SELECT key FROM {IMPORTED_KEYS_TABLE} WHERE source = ?", (table,))
+    }
+    gone = previous - set(keys)
+    where_sql = " AND ".join(f'"{k}" = ?' for k in key_cols)
+    deleted = 0
+    for key in gone:
+        deleted += conn.execute(f'DELETE FROM "{table}" WHERE {where_sql}', key).rowcount
+
+    conn.execute(f"DELETE FROM {IMPORTED_KEYS_TABLE} WHERE source = ?", (table,))
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {IMPORTED_KEYS_TABLE} (source, key) VALUES (?, ?)",
+        [(table, json.dumps(list(key), ensure_ascii=False)) for key in keys],
+    )
+    return deleted
+
+
+def create_indexes(conn):
+    for index_name, table, cols in INDEXES:
+        col_sql = ", ".join(f'"{c}"' for c in cols)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON "{table}" ({col_sql})')
+    print(f"✅ 인덱스 {len(INDEXES)}개 생성 완료")
 
-# build_db.py 파일의 1) pokemon 테이블, 2) user 테이블, 3) user_pokemon 테이블 생성 로직 다음에 추가
 
 # =======================================================
 # 4) POKEMON_IMAGES 테이블 생성 (사진 매핑) - 번호 또는 번호.확장자 지원
@@ -67,60 +251,282 @@ IMAGE_FOLDER_NAME = "pokemon_jpg"
 # data 폴더 아래의 pokemon_jpg 폴더 경로를 정확하게 지정합니다.
 IMAGE_FOLDER_PATH = os.path.join(DATA_DIR, IMAGE_FOLDER_NAME)
 
-image_data_list = []
 # 지원할 확장자 목록은 여전히 중요합니다. (파일이 번호만 있는 경우에도 시스템 파일 제외)
 SUPPORTED_EXTENSIONS = ('jpg', 'jpeg', 'png', 'webp', 'gif', '') # 💡 확장자가 없는 경우를 위해 '' 추가!
 
-print(f"\n====================================")
-print(f"🔎 4) POKEMON_IMAGES 테이블 생성 시작")
-print(f"   - 이미지 폴더 경로: {IMAGE_FOLDER_PATH}")
-print(f"====================================")
 
-if os.path.exists(IMAGE_FOLDER_PATH):
+def scan_pokemon_images():
+    """이미지 폴더에서 '도감번호.확장자' 형식의 파일을 찾아 매핑 DataFrame 반환"""
+    image_data_list = []
+
+    print(f"\n====================================")
+    print(f"🔎 4) POKEMON_IMAGES 테이블 생성 시작")
+    print(f"   - 이미지 폴더 경로: {IMAGE_FOLDER_PATH}")
+    print(f"====================================")
+
+    if not os.path.exists(IMAGE_FOLDER_PATH):
+        print(f"❌ 폴더 접근 실패: 경로가 잘못되었습니다. 경로: {IMAGE_FOLDER_PATH}")
+        return pd.DataFrame(image_data_list)
+
     file_list = os.listdir(IMAGE_FOLDER_PATH)
     print(f"✅ 폴더 접근 성공. 총 파일 수: {len(file_list)}개")
-    
+
     for filename in file_list:
         parts = filename.split('.')
-        
+
         # 1. 파일 이름이 '.'을 포함하지 않을 수도 있으므로, 파일 이름 자체를 첫 번째 부분으로 간주
         filename_base = parts[0]
-        
+
         # 2. 파일 이름의 첫 부분이 숫자인지 확인
-        if filename_base.isdigit():
-            
-            # 3. 확장자 검사: parts 리스트의 길이가 1이면 확장자가 없음. 2 이상이면 parts[-1]이 확장자.
-            # 확장자가 없는 경우 (len(parts) == 1): 확장자 부분은 빈 문자열('')이 되어 SUPPORTED_EXTENSIONS에 포함됨
-            # 확장자가 있는 경우 (len(parts) > 1): 확장자 부분(parts[-1])이 SUPPORTED_EXTENSIONS에 포함되어야 함
-            file_ext = parts[-1].lower() if len(parts) > 1 else ''
-            
-            if file_ext in SUPPORTED_EXTENSIONS:
-                
-                pokemon_id_str = filename_base.lstrip('0')
-                try:
-                    pokemon_id = int(pokemon_id_str)
-                    image_data_list.append({
-                        'pokemon_id': pokemon_id,
-                        'file_name': filename,
-                        'full_path': os.path.join(IMAGE_FOLDER_PATH, filename),
-                    })
-                except ValueError:
-                    continue
-            
+        if not filename_base.isdigit():
+            continue
+
+        # 3. 확장자 검사: parts 리스트의 길이가 1이면 확장자가 없음. 2 이상이면 parts[-1]이 확장자.
+        file_ext = parts[-1].lower() if len(parts) > 1 else ''
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            continue
+
+        pokemon_id_str = filename_base.lstrip('0')
+        try:
+            pokemon_id = int(pokemon_id_str)
+        except ValueError:
+            continue
+        image_data_list.append({
+            'pokemon_id': pokemon_id,
+            'file_name': filename,
+            'full_path': os.path.join(IMAGE_FOLDER_PATH, filename),
+        })
+
     df_images = pd.DataFrame(image_data_list)
-    
     print(f"🔎 매핑 성공한 이미지 수: {len(df_images)}개")
-    
-    if not df_images.empty:
-        df_images.to_sql("POKEMON_IMAGES", conn, if_exists="replace", index=False)
-        print(f"✅ POKEMON_IMAGES 테이블 생성 및 매핑 완료.")
+    return df_images
+
+
+# =======================================================
+# 5) 변경 감지 (원본 파일 해시/mtime 기록)
+# =======================================================
+META_TABLE = "_build_meta"
+# 원본에서 가져온 키 기록 (RUNTIME_TABLES 의 "원본에서 사라진 행" 판단용)
+IMPORTED_KEYS_TABLE = "_build_imported_keys"
+
+
+def ensure_meta_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+            source     TEXT PRIMARY KEY,
+            path       TEXT,
+            sha256     TEXT,
+            mtime      REAL,
+            size       INTEGER,
+            encoding   TEXT,
+            row_count  INTEGER,
+            built_at   REAL
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {IMPORTED_KEYS_TABLE} (
+            source  TEXT NOT NULL,
+            key     TEXT NOT NULL,
+            PRIMARY KEY (source, key)
+        )
+    """)
+
+
+def read_meta(conn):
+    try:
+        rows = conn.execute(
+            f"SELECT source, path, sha256, mtime, size, encoding FROM {META_TABLE}"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {
+        r[0]: {"path": r[1], "sha256": r[2], "mtime": r[3], "size": r[4], "encoding": r[5]}
+        for r in rows
+    }
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def dir_signature(path):
+    """
+    이미지 폴더의 (파일명, 내용 해시) 목록으로 만든 해시.
+    mtime 은 넣지 않는다 (git 체크아웃마다 바뀌어서 새로 받은 저장소에서 항상 '원본 변경'이 됨)
+    """
+    h = hashlib.sha256()
+    with os.scandir(path) as it:
+        for entry in sorted(it, key=lambda e: e.name):
+            digest = file_sha256(entry.path) if entry.is_file() else ""
+            h.update(f"{entry.name}\0{digest}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def source_fingerprint(path, previous):
+    """
+    원본의 현재 상태. mtime/size가 기록과 같으면 해시 계산을 건너뛴다.
+    (폴더는 폴더 mtime이 같으면 파일 목록 스캔을 건너뛴다)
+    """
+    st = os.stat(path)
+    # DB 파일을 다른 위치에 체크아웃해도 기록이 맞도록 BASE_DIR 기준 상대 경로로 저장
+    rel_path = os.path.relpath(path, BASE_DIR)
+    fp = {"path": rel_path, "mtime": st.st_mtime, "size": st.st_size, "sha256": None}
+    if (
+        previous
+        and previous.get("path") == rel_path
+        and previous.get("mtime") == st.st_mtime
+        and previous.get("size") == st.st_size
+    ):
+        fp["sha256"] = previous["sha256"]
+    elif os.path.isdir(path):
+        fp["sha256"] = dir_signature(path)
+    else:
+        fp["sha256"] = file_sha256(path)
+    return fp
+
+
+def write_meta(conn, source, fp, encoding, row_count):
+    conn.execute(
+        f"""
+        INSERT INTO {META_TABLE} (source, path, sha256, mtime, size, encoding, row_count, built_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (source) DO UPDATE SET
+            path = excluded.path, sha256 = excluded.sha256, mtime = excluded.mtime,
+            size = excluded.size, encoding = COALESCE(excluded.encoding, encoding),
+            row_count = COALESCE(excluded.row_count, row_count), built_at = excluded.built_at
+        """,
+        (source, fp["path"], fp["sha256"], fp["mtime"], fp["size"], encoding, row_count, time.time()),
+    )
+
+
+# 앱이 실행 중에도 행을 추가하는 테이블 (add_pokemon_to_user → UserPokemon).
+# 원본 CSV는 초기 데이터일 뿐이라, 다시 빌드해도 CSV에 없는 행을 지우지 않는다.
+# (CSV에서 빼낸 행은 지난 빌드 때 CSV에서 가져온 행일 때만 삭제)
+RUNTIME_TABLES = {"UserPokemon"}
+
+# (테이블, 원본 찾기, 컬럼 정의, 키 컬럼, 추가 제약)
+SOURCES = [
+    ("pokemon", lambda: find_file("pokemon_data"), POKEMON_COLUMNS, ["dexnum"], ""),
+    ("UserData", lambda: find_file("userdata"), USERDATA_COLUMNS, ["User_id"], ""),
+    ("UserPokemon", lambda: find_file("user_pokemon"), USERPOKEMON_COLUMNS, ["user_pokemon_id"], ""),
+    (
+        "POKEMON_IMAGES", lambda: IMAGE_FOLDER_PATH, POKEMON_IMAGES_COLUMNS,
+        ["pokemon_id", "file_name"], "PRIMARY KEY (pokemon_id, file_name)",
+    ),
+]
+
+
+def plan_build(conn, force=False):
+    """
+    다시 만들어야 하는 원본 목록 계산.
+    [(table, path, fp, previous_meta, reason)] — reason 이 None 이면 변경 없음
+    """
+    meta = read_meta(conn)
+    plan = []
+    for table, locate, columns, _, _ in SOURCES:
+        path = locate()
+        if not os.path.exists(path):
+            print(f"❌ 원본 없음: {path}")
+            continue
+        previous = meta.get(table)
+        fp = source_fingerprint(path, previous)
+        if force:
+            reason = "강제 재빌드"
+        elif not schema_matches(conn, table, columns):
+            reason = "테이블 없음/스키마 변경"
+        elif previous is None:
+            reason = "빌드 기록 없음"
+        elif previous["sha256"] != fp["sha256"]:
+            reason = "원본 변경"
+        else:
+            reason = None
+        plan.append((table, path, fp, previous, reason))
+    return plan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="data/ 의 CSV와 이미지로 MyPocket.sqlite 를 (증분) 빌드")
+    parser.add_argument("--check", action="store_true", help="빌드 없이 최신 여부만 확인 (변경이 있으면 종료코드 1)")
+    parser.add_argument("--force", action="store_true", help="변경 여부와 관계없이 모든 테이블 재빌드")
+    parser.add_argument("--no-thumbnails", action="store_true", help="스프라이트 썸네일/아틀라스 생성 건너뛰기")
+    args = parser.parse_args(argv)
+
+    print("✅ DB 빌드 확인:", DB_PATH)
+    print("📂 DATA_DIR:", DATA_DIR)
+
+    # SQLite 연결 (트랜잭션은 직접 관리)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        plan = plan_build(conn, force=args.force)
+        stale = [p for p in plan if p[4]]
+
+        for table, path, _, _, reason in plan:
+            status = f"🔄 {reason}" if reason else "✅ 최신"
+            print(f"   - {table:<15} {status}  ({os.path.basename(path)})")
+
+        if args.check:
+            return 1 if stale else 0
+
+        # 모든 변경을 하나의 트랜잭션으로 (중간에 실패하면 전체 롤백)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ensure_meta_table(conn)
+            for table, path, fp, previous, reason in plan:
+                if not reason:
+                    # 내용은 같고 mtime만 바뀐 경우 기록만 갱신
+                    if previous and previous["mtime"] != fp["mtime"]:
+                        write_meta(conn, table, fp, None, None)
+                    continue
+
+                _, _, columns, key_cols, extra = next(s for s in SOURCES if s[0] == table)
+                encoding = None
+                if table == "POKEMON_IMAGES":
+                    df = scan_pokemon_images()
+                    if df.empty:
+                        print("❌ 이미지 매핑 실패: 파일 이름 형식이 잘못되었거나 폴더에 이미지 파일이 없습니다.")
+                        continue
+                else:
+                    df, encoding = read_csv_auto(path, (previous or {}).get("encoding"))
+
+                n, deleted = upsert_table(
+                    conn, table, columns, df, key_cols, extra,
+                    keep_runtime_rows=table in RUNTIME_TABLES,
+                )
+                write_meta(conn, table, fp, encoding, n)
+                print(f"✅ {table} 테이블 반영 완료 ({n}행 upsert, {deleted}행 삭제)")
+
+            # 인덱스 + 요약 테이블 + 통계 (쿼리 플래너가 인덱스를 고르도록)
+            if stale:
+                create_indexes(conn)
+                refresh_summaries(conn)
+                conn.execute("ANALYZE")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            print("❌ 빌드 실패: 변경 사항을 모두 롤백했습니다.")
+            raise
+    finally:
+        conn.close()
+
+    # 6) 렌더링용 스프라이트 썸네일 + 아틀라스 (이미지 폴더가 바뀌었을 때만)
+    images_stale = any(table == "POKEMON_IMAGES" and reason for table, _, _, _, reason in plan)
+    if not args.no_thumbnails and (images_stale or args.force or not os.path.exists(ATLAS_PATH)):
+        try:
+            build_thumbnails(force=args.force)
+            build_sprite_atlas()
+        except ImportError:
+            print("⚠️ Pillow가 없어 썸네일 생성을 건너뜁니다. (원본 이미지로 표시)")
+
+    if stale:
+        print("🎉 모든 작업 완료! →", DB_PATH)
     else:
-        print("❌ 이미지 매핑 실패: 파일 이름 형식이 잘못되었거나 폴더에 이미지 파일이 없습니다.")
-else:
-    print(f"❌ 폴더 접근 실패: 경로가 잘못되었습니다. 경로: {IMAGE_FOLDER_PATH}")
+        print("✨ 변경된 원본이 없어 빌드를 건너뛰었습니다.")
+    return 0
 
 
-# [기존 build_db.py 코드]
-# conn.commit() # 변경사항 저장
-# conn.close() # DB 연결 종료
-# print("✅ DB 연결 종료 및 저장 완료.")
+if __name__ == "__main__":
+    sys.exit(main())
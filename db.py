@@ -0,0 +1,283 @@
+# db.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+
+from metrics import timer, record_rows
+
+# ------------------------------------------------
+# 0. 경로 설정
+# ------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# POKELIFE_DB_PATH 로 다른 DB 파일(벤치마크용 복사본 등)을 가리킬 수 있다
+DB_PATH = os.environ.get("POKELIFE_DB_PATH") or os.path.join(BASE_DIR, "MyPocket.sqlite")
+
+# 읽기 커넥션 튜닝 값
+READER_CACHE_KIB = 16 * 1024          # 커넥션당 페이지 캐시 16MB
+READER_MMAP_BYTES = 256 * 1024 * 1024  # DB 파일 mmap 최대 256MB
+BUSY_TIMEOUT_MS = 5000
+
+# LLM이 만든 SQL 실행 한도 (결과 행 수 / 시간)
+MAX_RESULT_ROWS = int(os.environ.get("POKELIFE_MAX_ROWS", 1000))
+QUERY_TIME_BUDGET_S = float(os.environ.get("POKELIFE_QUERY_BUDGET", 5.0))
+FETCH_CHUNK_ROWS = 256
+# progress handler 를 호출할 VM 명령 간격 (작을수록 빨리 끊기지만 오버헤드 증가)
+PROGRESS_OPCODES = 10_000
+
+_SELECT_RE = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# SQL 앞쪽의 공백 / -- 주석 / /* */ 주석 (SELECT 인지 판단할 때 건너뜀)
+_LEADING_COMMENTS_RE = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*", re.DOTALL)
+# 문장 끝(; 뒤)에 올 수 있는 것: 공백 / ; / -- 주석 / /* */ 주석
+_TRAILING_NOISE_RE = re.compile(r"(?:\s+|;|--[^\n]*(?:\n|$)|/\*.*?\*/)*", re.DOTALL)
+# 서브쿼리로 감싸면 SQLite 가 중복 컬럼명 뒤에 붙이는 ":1", ":2" ...
+_DEDUP_SUFFIX_RE = re.compile(r"^(.*):\d+$", re.DOTALL)
+
+
+def _restore_column_names(columns: List[str]) -> List[str]:
+    """SELECT * FROM (...) 로 감싸며 'name:1' 처럼 바뀐 중복 컬럼명을 원래 이름으로"""
+    restored = []
+    for col in columns:
+        m = _DEDUP_SUFFIX_RE.match(col)
+        restored.append(m.group(1) if m and m.group(1) in restored else col)
+    return restored
+
+
+def _split_statement(sql: str) -> Tuple[str, str]:
+    """
+    첫 번째 ; 앞(문장 본문)과 ; 뒤 나머지로 나눈다.
+    문자열 / 따옴표 식별자 / 주석 안의 ; 는 문장 끝으로 보지 않는다.
+    """
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c in "'\"`[":
+            end = sql.find("]" if c == "[" else c, i + 1)
+            i = n if end < 0 else end + 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+        elif c == ";":
+            return sql[:i], sql[i + 1:]
+        else:
+            i += 1
+    return sql, ""
+
+
+def unique_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    같은 이름 컬럼(조인 결과의 p.name, u.name 등)은 첫 번째만 남긴 뷰.
+    df[컬럼] 이 Series 여야 하는 차트 / 이미지 / 필터 계산용 (표에는 원래 df 를 그대로 쓴다)
+    """
+    if not df.columns.duplicated().any():
+        return df
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+class QueryBudgetExceeded(Exception):
+    """쿼리가 시간 예산을 넘어 중단됨"""
+
+
+class QueryCancelled(Exception):
+    """호출한 쪽이 결과가 필요 없어져서 쿼리를 중단함 (cancel 이벤트)"""
+
+
+# ------------------------------------------------
+# 1. 프로세스 공용 커넥션 관리자
+# ------------------------------------------------
+class ConnectionManager:
+    """
+    MyPocket.sqlite 커넥션을 프로세스 단위로 재사용한다.
+    - 읽기: 스레드마다 하나씩 mode=ro 커넥션 (query_only, mmap, 큰 페이지 캐시)
+    - 쓰기: 프로세스에 하나뿐인 writer 커넥션을 락으로 직렬화
+    WAL 모드라서 writer가 쓰는 동안에도 reader는 막히지 않는다.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writer_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._generation = 0
+        self._write_listeners: List[Callable[[], None]] = []
+
+        # writer를 먼저 열어 WAL 모드 전환 + -shm 파일 생성 (ro 커넥션이 WAL을 읽으려면 필요)
+        with self._writer_lock:
+            self._open_writer()
+
+    # ---------- 쓰기 ----------
+    def _open_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError as e:
+                print(f"⚠️ WAL 모드 전환 실패 (기본 저널 모드로 계속): {e}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._writer = conn
+        return self._writer
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """직렬화된 쓰기 트랜잭션. 블록이 정상 종료되면 commit, 예외면 rollback"""
+        with self._writer_lock:
+            conn = self._open_writer()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            self._notify_write()
+
+    def add_write_listener(self, callback: Callable[[], None]) -> None:
+        """쓰기 트랜잭션이 커밋될 때마다 호출할 함수 등록 (메모리 스냅샷 무효화 등)"""
+        self._write_listeners.append(callback)
+
+    def _notify_write(self) -> None:
+        for callback in list(self._write_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ 쓰기 리스너 실패: {e}")
+
+    # ---------- 읽기 ----------
+    def _open_reader(self) -> sqlite3.Connection:
+        uri = f"file:{quote(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute(f"PRAGMA cache_size=-{READER_CACHE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={READER_MMAP_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """현재 스레드 전용 읽기 전용 커넥션 (처음 한 번만 열고 계속 재사용)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "generation", -1) != self._generation:
+            if conn is not None:
+                conn.close()
+            conn = self._open_reader()
+            self._local.conn = conn
+            self._local.generation = self._generation
+        return conn
+
+    def read_df(self, sql: str, params: Optional[Sequence] = None) -> pd.DataFrame:
+        """읽기 커넥션으로 쿼리를 실행해 DataFrame으로 반환"""
+        with timer("sqlite"):
+            df = pd.read_sql_query(sql, self.reader(), params=params)
+        record_rows("sqlite", len(df))
+        return df
+
+    @contextmanager
+    def _time_budget(
+        self, conn: sqlite3.Connection, seconds: float, cancel: Optional[threading.Event] = None,
+    ) -> Iterator[None]:
+        """seconds 가 지나거나 cancel 이 set 되면 progress handler 로 실행 중인 쿼리를 중단시킨다"""
+        if (not seconds or seconds <= 0) and cancel is None:
+            yield
+            return
+        deadline = time.perf_counter() + seconds if seconds and seconds > 0 else None
+        conn.set_progress_handler(
+            lambda: 1 if (cancel is not None and cancel.is_set())
+            or (deadline is not None and time.perf_counter() > deadline) else 0,
+            PROGRESS_OPCODES,
+        )
+        try:
+            yield
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                if cancel is not None and cancel.is_set():
+                    raise QueryCancelled("결과가 필요 없어져 쿼리를 중단했습니다.") from e
+                raise QueryBudgetExceeded(f"쿼리가 {seconds:g}초 안에 끝나지 않아 중단했습니다.") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def read_bounded(
+        self,
+        sql: str,
+        max_rows: int = MAX_RESULT_ROWS,
+        time_budget_s: float = QUERY_TIME_BUDGET_S,
+        cancel: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """
+        LLM이 만든 SQL을 한도 안에서 실행.
+        - SELECT 는 LIMIT(max_rows + 1)로 감싸고 커서에서 청크 단위로 가져온다
+        - 한도를 넘으면 실제 행 수는 COUNT(*) 로 따로 구한다 (시간 예산 안에서만, 못 구하면 None)
+        - 시간 예산을 넘기면 QueryBudgetExceeded, SQL 문이 여러 개면 ValueError
+        - cancel 이벤트가 set 되면 실행 중이어도 QueryCancelled 로 중단
+        반환: {"df": 최대 max_rows 행, "total_rows": 실제 행 수 또는 None, "truncated": bool}
+        """
+        # 끝의 ; 와 그 뒤 주석은 떼어 낸다 (남겨 두면 서브쿼리로 감쌀 때 문법 오류)
+        body, rest = _split_statement(sql)
+        if not _TRAILING_NOISE_RE.fullmatch(rest):
+            raise ValueError("SQL 문은 한 번에 하나만 실행할 수 있습니다.")
+        body = body.strip()
+        is_select = bool(_SELECT_RE.match(_LEADING_COMMENTS_RE.sub("", body, count=1)))
+        # 주석(--)으로 끝나는 SQL도 감쌀 수 있도록 닫는 괄호는 줄을 바꿔서 붙인다
+        bounded = f"SELECT * FROM (\n{body}\n) LIMIT {int(max_rows) + 1}" if is_select else body
+
+        conn = self.reader()
+        started = time.perf_counter()
+        with timer("sqlite"), self._time_budget(conn, time_budget_s, cancel):
+            cur = conn.execute(bounded)
+            columns = [d[0] for d in cur.description or []]
+            if is_select:
+                columns = _restore_column_names(columns)
+            rows = []
+            while len(rows) <= max_rows:
+                chunk = cur.fetchmany(FETCH_CHUNK_ROWS)
+                if not chunk:
+                    break
+                rows.extend(chunk)
+            cur.close()
+
+        truncated = len(rows) > max_rows
+        rows = rows[:max_rows]
+        total_rows: Optional[int] = len(rows)
+
+        if truncated:
+            total_rows = None
+            remaining = time_budget_s - (time.perf_counter() - started) if time_budget_s else 0
+            if is_select and (not time_budget_s or remaining > 0):
+                try:
+                    with timer("sqlite_count"), self._time_budget(conn, remaining, cancel):
+                        total_rows = conn.execute(f"SELECT COUNT(*) FROM (\n{body}\n)").fetchone()[0]
+                except (QueryBudgetExceeded, QueryCancelled):
+                    pass
+
+        record_rows("sqlite", len(rows))
+        return {
+            "df": pd.DataFrame.from_records(rows, columns=columns),
+            "total_rows": total_rows,
+            "truncated": truncated,
+        }
+
+    def reset_readers(self) -> None:
+        """DB 파일이 통째로 교체됐을 때 각 스레드의 reader를 다음 사용 시 다시 열도록 표시"""
+        self._generation += 1
+
+
+_manager: Optional[ConnectionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_db() -> ConnectionManager:
+    """프로세스 전체에서 공유하는 ConnectionManager (Streamlit 세션 간 공유)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConnectionManager(DB_PATH)
+    return _manager
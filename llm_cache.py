@@ -0,0 +1,227 @@
+# llm_cache.py
+import sqlite3
+import json
+import hashlib
+import os
+import re
+import time
+import threading
+import unicodedata
+from typing import Dict, Any, List, Optional
+
+# ------------------------------------------------
+# 0. 경로 / 기본 설정
+# ------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DB_PATH = os.environ.get(
+    "POKELIFE_LLM_CACHE_PATH", os.path.join(BASE_DIR, "llm_cache.sqlite")
+)
+
+# 캐시 보관 기간(초) / 최대 항목 수 (LRU 기준으로 초과분 삭제)
+DEFAULT_TTL_SECONDS = int(os.environ.get("POKELIFE_LLM_CACHE_TTL", 7 * 24 * 3600))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("POKELIFE_LLM_CACHE_MAX", 2000))
+
+
+# ------------------------------------------------
+# 1. 질문 정규화 및 캐시 키
+# ------------------------------------------------
+_TRAILING_PUNCT = re.compile(r"[\s?？!！.。~…]+$")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    공백/대소문자/끝 문장부호 차이만 있는 질문을 같은 문자열로 정규화
+    예) '불꽃 타입 포켓몬의 평균 공격력은?' == '불꽃  타입 포켓몬의 평균 공격력은'
+    """
+    if not question:
+        return ""
+    q = unicodedata.normalize("NFKC", question).strip().lower()
+    q = _SPACES.sub(" ", q)
+    q = _TRAILING_PUNCT.sub("", q)
+    return q
+
+
+def history_window(question: str, chat_history: Optional[List[str]]) -> List[str]:
+    """
+    캐시 키에 들어갈 이전 질문 목록.
+    app.py는 현재 질문까지 포함해서 넘기므로 현재 질문과 같은 항목은 제외한다.
+    """
+    if not chat_history:
+        return []
+    current = normalize_question(question)
+    window = [normalize_question(q) for q in chat_history]
+    return [q for q in window if q and q != current]
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """시스템 프롬프트(스키마 설명 포함)와 모델명으로 만든 지문. 바뀌면 캐시가 자동 무효화된다."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update((p or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def make_cache_key(question: str, chat_history: Optional[List[str]], fingerprint: str) -> str:
+    payload = json.dumps(
+        {
+            "q": normalize_question(question),
+            "history": history_window(question, chat_history),
+            "fp": fingerprint,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------
+# 2. SQLite 기반 NL→SQL 캐시
+# ------------------------------------------------
+class NLSQLCache:
+    """nl_to_sql 결과({"sql", "explanation_ko"})를 저장하는 영속 캐시 (TTL + LRU)"""
+
+    def __init__(
+        self,
+        path: str = CACHE_DB_PATH,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nl_sql_cache (
+                cache_key      TEXT PRIMARY KEY,
+                fingerprint    TEXT NOT NULL,
+                question       TEXT NOT NULL,
+                sql            TEXT NOT NULL,
+                explanation_ko TEXT,
+                created_at     REAL NOT NULL,
+                last_access    REAL NOT NULL,
+                hit_count      INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_nl_sql_cache_last_access ON nl_sql_cache (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql, explanation_ko, created_at FROM nl_sql_cache WHERE cache_key = ?",
+                (key,),
+            ).fetchone()
+
+            if row is None or now - row[2] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM nl_sql_cache WHERE cache_key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE nl_sql_cache SET last_access = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        return {"sql": row[0], "explanation_ko": row[1]}
+
+    def put(self, key: str, fingerprint: str, question: str, data: Dict[str, Any]) -> None:
+        """SQL이 생성된 결과만 저장 (오류 응답은 캐시하지 않음)"""
+        if not data.get("sql"):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO nl_sql_cache
+                    (cache_key, fingerprint, question, sql, explanation_ko, created_at, last_access, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                (key, fingerprint, question, data["sql"], data.get("explanation_ko"), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        # 1) TTL 만료분 삭제
+        self._conn.execute(
+            "DELETE FROM nl_sql_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        # 2) 최대 개수 초과분은 가장 오래 안 쓰인 순서(LRU)로 삭제
+        self._conn.execute(
+            """
+            DELETE FROM nl_sql_cache WHERE cache_key IN (
+                SELECT cache_key FROM nl_sql_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def purge_stale(self, fingerprint: str) -> int:
+        """프롬프트/스키마가 바뀌어 지문이 달라진 항목을 삭제"""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM nl_sql_cache WHERE fingerprint != ?", (fingerprint,)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM nl_sql_cache")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM nl_sql_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+_cache: Optional[NLSQLCache] = None
+_cache_lock = threading.Lock()
+_purged_fingerprints = set()
+
+
+def get_nl_sql_cache(fingerprint: Optional[str] = None) -> Optional[NLSQLCache]:
+    """
+    프로세스 전체에서 공유하는 캐시 객체를 반환.
+    fingerprint가 처음 보는 값이면 다른 지문의 오래된 항목을 한 번 정리한다.
+    캐시 DB를 열 수 없으면 None (캐시 없이 동작)
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = NLSQLCache()
+            except Exception as e:
+                print(f"⚠️ NL→SQL 캐시를 열지 못했습니다: {e}")
+                return None
+        if fingerprint and fingerprint not in _purged_fingerprints:
+            removed = _cache.purge_stale(fingerprint)
+            _purged_fingerprints.add(fingerprint)
+            if removed:
+                print(f"🧹 프롬프트/스키마 변경으로 NL→SQL 캐시 {removed}건 무효화")
+    return _cache
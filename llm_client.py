@@ -0,0 +1,313 @@
+# llm_client.py
+"""
+프로세스 전체(모든 Streamlit 세션)가 같이 쓰는 OpenAI 클라이언트.
+- OpenAI 객체를 API 키별로 하나만 만들어 HTTP keep-alive 연결 풀을 재사용 (매 호출 TLS 핸드셰이크 없음)
+- 토큰 버킷으로 초당 호출 수 제한 (세션 간 공유)
+- 429 / 5xx / 연결 오류는 지수 백오프 + jitter 로 재시도 (Retry-After 가 있으면 그만큼 대기)
+- 호출마다 타임아웃
+- 완전히 같은 요청이 동시에 들어오면 한 번만 호출하고 결과를 나눠 받음 (스트리밍 포함)
+
+호출하는 쪽은 기존처럼 client.chat.completions.create(...) 를 쓰면 된다.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import openai
+from openai import OpenAI
+
+from metrics import record_llm_call
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# 초당 LLM 호출 수 / 순간 허용량 (0 이면 제한 없음)
+LLM_RPS = float(os.environ.get("POKELIFE_LLM_RPS", 8))
+LLM_BURST = int(os.environ.get("POKELIFE_LLM_BURST", 16))
+# 재시도 횟수 (첫 시도 제외)와 백오프 (초)
+LLM_MAX_RETRIES = int(os.environ.get("POKELIFE_LLM_MAX_RETRIES", 3))
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 8.0
+# 호출 하나의 타임아웃 (스트리밍이면 청크 사이 대기 시간 기준)
+LLM_TIMEOUT_S = float(os.environ.get("POKELIFE_LLM_TIMEOUT", 60))
+
+RETRY_STATUS = {408, 409, 429}
+
+
+# ------------------------------------------------
+# 1. 호출 속도 제한 (토큰 버킷)
+# ------------------------------------------------
+class RateLimiter:
+    """초당 rate 번, 순간적으로는 burst 번까지 허용. 여러 스레드가 같이 쓴다"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, rate: float, burst: Optional[int] = None) -> None:
+        """제한 값 변경 (쌓여 있던 토큰은 새 순간 허용량까지만 남김)"""
+        with self._lock:
+            self.rate = rate
+            self.capacity = float(burst or max(1, int(rate)))
+            self._tokens = min(self._tokens, self.capacity)
+
+    def acquire(self) -> float:
+        """토큰 하나를 쓸 수 있을 때까지 기다린다. 기다린 시간(초) 반환"""
+        if self.rate <= 0:
+            return 0.0
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - started
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ------------------------------------------------
+# 2. 재시도 판단 / 백오프
+# ------------------------------------------------
+def is_retryable(error: Exception) -> bool:
+    """일시적인 오류인지 (연결/타임아웃, 429, 408/409, 5xx)"""
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS or error.status_code >= 500
+    return False
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """attempt 번째 재시도 전 대기 시간. Retry-After 가 있으면 그 값, 없으면 full jitter 지수 백오프"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX_S, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """동시 요청 합치기용 키 (모델 + 메시지 + 옵션이 모두 같아야 같은 키)"""
+    payload = json.dumps(kwargs, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------
+# 3. 스트림 나눠 받기
+# ------------------------------------------------
+class _SharedStream:
+    """
+    원본 스트림 청크를 모아 두고, 여러 소비자가 처음부터 같은 순서로 읽는다.
+    소비자가 모두 읽기를 그만두면(Streamlit 재실행 등) 원본 스트림을 닫아 연결과 스레드를 돌려준다.
+    """
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[Exception] = None
+        self._consumers = 0
+        self._cond = threading.Condition()
+
+    def feed(self, stream) -> None:
+        try:
+            for chunk in stream:
+                with self._cond:
+                    if self.cancelled:
+                        break
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.finish(e)
+        else:
+            self.finish()
+        finally:
+            close = getattr(stream, "close", None)
+            if self.cancelled and close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def finish(self, error: Optional[Exception] = None) -> None:
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def subscribe(self) -> Optional["_StreamConsumer"]:
+        """새 소비자용 이터레이터. 이미 취소된 스트림이면 None (새로 호출해야 함)"""
+        with self._cond:
+            if self.cancelled:
+                return None
+            self._consumers += 1
+        return _StreamConsumer(self)
+
+    def release(self) -> None:
+        """소비자 하나가 읽기를 그만둠. 마지막 소비자가 끝까지 읽기 전에 떠나면 원본 스트림 취소"""
+        with self._cond:
+            self._consumers -= 1
+            if self._consumers == 0 and not self.done:
+                self.cancelled = True
+
+
+class _StreamConsumer:
+    """
+    _SharedStream 소비자 하나. 끝까지 읽거나 close() 되거나, 한 번도 읽지 않고 버려져도(__del__)
+    소비자 수에서 정확히 한 번 빠진다. (제너레이터는 시작 전에 버려지면 finally 가 돌지 않아서 클래스로 둔다)
+    """
+
+    def __init__(self, shared: _SharedStream):
+        self._shared = shared
+        self._index = 0
+        self._closed = False
+
+    def __iter__(self) -> "_StreamConsumer":
+        return self
+
+    def __next__(self) -> Any:
+        if self._closed:
+            raise StopIteration
+        shared = self._shared
+        with shared._cond:
+            while self._index >= len(shared.chunks) and not shared.done:
+                shared._cond.wait()
+            if self._index < len(shared.chunks):
+                chunk = shared.chunks[self._index]
+                self._index += 1
+                return chunk
+            error = shared.error
+        self.close()
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._shared.release()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+# ------------------------------------------------
+# 4. 공유 클라이언트
+# ------------------------------------------------
+class SharedLLMClient:
+    """
+    OpenAI 객체 하나를 감싼 클라이언트. client.chat.completions.create(...) 형태를 그대로 지원한다.
+    재시도는 여기서 직접 하므로 OpenAI 자체 재시도(max_retries)는 끈다.
+    """
+
+    def __init__(self, api_key: str, limiter: RateLimiter):
+        self._client = OpenAI(api_key=api_key, timeout=LLM_TIMEOUT_S, max_retries=0)
+        self._limiter = limiter
+        self._inflight: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        """chat.completions.create 와 같은 인자. stream=True 면 청크 이터레이터 반환"""
+        key = request_key(kwargs)
+        if kwargs.get("stream"):
+            return self._create_stream(key, kwargs)
+        return self._create(key, kwargs)
+
+    # ---------- 실제 호출 (제한 + 재시도) ----------
+    def _call(self, kwargs: Dict[str, Any]):
+        attempt = 0
+        while True:
+            self._limiter.acquire()
+            try:
+                response = self._client.chat.completions.create(**kwargs)
+                record_llm_call("ok")
+                return response
+            except Exception as e:
+                if attempt >= LLM_MAX_RETRIES or not is_retryable(e):
+                    record_llm_call("error")
+                    raise
+                delay = backoff_delay(attempt, e)
+                attempt += 1
+                record_llm_call("retry")
+                print(f"🔁 LLM 호출 재시도 {attempt}/{LLM_MAX_RETRIES} ({delay:.2f}s 후): {e}")
+                time.sleep(delay)
+
+    # ---------- 동시에 들어온 같은 요청 합치기 ----------
+    def _create(self, key: str, kwargs: Dict[str, Any]):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            record_llm_call("coalesced")
+            return future.result()
+
+        try:
+            future.set_result(self._call(kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return future.result()
+
+    def _create_stream(self, key: str, kwargs: Dict[str, Any]) -> Iterator[Any]:
+        with self._lock:
+            shared = self._inflight.get(key)
+            consumer = shared.subscribe() if shared is not None else None
+            if consumer is not None:
+                record_llm_call("coalesced")
+                return consumer
+            shared = self._inflight[key] = _SharedStream()
+            consumer = shared.subscribe()
+
+        def drive() -> None:
+            try:
+                shared.feed(self._call(kwargs))
+            except Exception as e:
+                # 연결 자체가 실패 (재시도까지 소진)
+                shared.finish(e)
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is shared:
+                        del self._inflight[key]
+
+        # 스트림마다 전용 스레드 (오래 걸리는 리포트 스트림이 다른 스트림을 막지 않도록)
+        threading.Thread(target=drive, name="llm-stream", daemon=True).start()
+        return consumer
+
+
+_limiter = RateLimiter(LLM_RPS, LLM_BURST)
+_clients: Dict[str, SharedLLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def set_rate_limit(rate: float, burst: Optional[int] = None) -> None:
+    """프로세스 공용 LLM 호출 제한 변경 (batch.py 의 --llm-rps 등). rate=0 이면 제한 없음"""
+    _limiter.configure(rate, burst)
+
+
+def get_shared_client(api_key: str) -> SharedLLMClient:
+    """API 키별 공유 클라이언트 (속도 제한은 키와 상관없이 프로세스 전체에서 하나)"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = SharedLLMClient(api_key, _limiter)
+        return client
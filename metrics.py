@@ -0,0 +1,338 @@
+# metrics.py
+import atexit
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# POKELIFE_METRICS=1 일 때만 수집. 꺼져 있으면 timer/timed 는 아무 일도 하지 않는다.
+ENABLED = os.environ.get("POKELIFE_METRICS", "").lower() in ("1", "true", "on", "yes")
+
+# 관측값을 한 줄씩 JSON으로 남길 파일 (비우면 파일 기록 안 함)
+JSONL_PATH = os.environ.get("POKELIFE_METRICS_JSONL", "")
+
+# 값이 있으면 이 포트에서 Prometheus 텍스트(/metrics)를 제공
+PROMETHEUS_PORT = os.environ.get("POKELIFE_METRICS_PORT", "")
+# /metrics 를 열 주소 (기본은 로컬에서만 접근, 외부 수집기가 필요하면 0.0.0.0 등으로)
+PROMETHEUS_HOST = os.environ.get("POKELIFE_METRICS_HOST", "127.0.0.1")
+
+# 지연시간(초) 히스토그램 버킷 (Prometheus 기본값과 비슷하게)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 결과 행 수 히스토그램 버킷
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+# 백분위 계산용으로 최근 관측값을 이만큼 보관
+RECENT_SAMPLES = 1024
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+# ------------------------------------------------
+# 1. 히스토그램 / 레지스트리
+# ------------------------------------------------
+class Histogram:
+    """누적 버킷 카운트 + 합계 + 최근 관측값(백분위용)"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 마지막 칸은 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent: deque = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        idx = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+        return values[idx]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    body = ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """프로세스 전체의 카운터/히스토그램 저장소 (Streamlit 세션 간 공유)"""
+
+    def __init__(self, jsonl_path: str = ""):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self.jsonl_path = jsonl_path
+        # JSONL 은 레지스트리 락 밖에서 전용 스레드가 열어 둔 파일 하나에 쓴다
+        self._log_queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+        self._log("counter", name, amount, labels)
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+        self._log("histogram", name, value, labels)
+
+    def _log(self, kind: str, name: str, value: float, labels: Dict[str, Any]) -> None:
+        if not self.jsonl_path:
+            return
+        line = json.dumps(
+            {"ts": round(time.time(), 3), "kind": kind, "name": name, "value": value, "labels": labels},
+            ensure_ascii=False,
+        )
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_lines, name="metrics-jsonl", daemon=True)
+                    self._writer.start()
+                    atexit.register(self.close_log)
+        self._log_queue.put(line)
+
+    def _write_lines(self) -> None:
+        """큐에 쌓인 줄을 파일에 쓰고, 큐가 비면 flush (파일은 한 번만 연다)"""
+        try:
+            f = open(self.jsonl_path, "a", encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️ 메트릭 JSONL 기록 실패: {e}")
+            return
+        with f:
+            while True:
+                line = self._log_queue.get()
+                if line is None:
+                    return
+                f.write(line + "\n")
+                if self._log_queue.empty():
+                    f.flush()
+
+    def close_log(self, timeout: float = 2.0) -> None:
+        """남은 JSONL 줄을 모두 쓰고 파일을 닫는다 (프로세스 종료 시)"""
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._log_queue.put(None)
+            writer.join(timeout)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # ---------- 내보내기 ----------
+    def snapshot(self) -> Dict[str, Any]:
+        """관리자 패널 / 벤치마크용 요약 (히스토그램은 count, 평균, p50/p95/p99)"""
+        with self._lock:
+            counters = {
+                name: {_format_labels(k) or "-": v for k, v in series.items()}
+                for name, series in self._counters.items()
+            }
+            histograms = {}
+            for name, series in self._histograms.items():
+                histograms[name] = {
+                    _format_labels(k) or "-": {
+                        "count": h.count,
+                        "mean": h.sum / h.count if h.count else 0.0,
+                        "p50": h.percentile(50),
+                        "p95": h.percentile(95),
+                        "p99": h.percentile(99),
+                    }
+                    for k, h in series.items()
+                }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, c in zip(h.buckets, h.counts):
+                        cumulative += c
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': repr(float(bound))})} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(JSONL_PATH)
+registry.describe("pokelife_stage_seconds", "Latency of instrumented stages in seconds")
+registry.describe("pokelife_llm_tokens_total", "OpenAI token usage reported in the response usage field")
+registry.describe("pokelife_result_rows", "Rows returned by SQL queries")
+registry.describe("pokelife_cache_requests_total", "Cache lookups by cache and result (hit/miss)")
+registry.describe("pokelife_llm_requests_total", "OpenAI calls by result (ok/retry/error/coalesced)")
+
+
+# ------------------------------------------------
+# 2. 계측 도구 (꺼져 있으면 거의 비용 없음)
+# ------------------------------------------------
+_NULL = nullcontext()
+
+
+@contextmanager
+def _timer(stage: str, labels: Dict[str, Any]) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("pokelife_stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def timer(stage: str, **labels):
+    """with timer("sqlite"): ...  → pokelife_stage_seconds{stage="sqlite"} 에 기록"""
+    if not ENABLED:
+        return _NULL
+    return _timer(stage, labels)
+
+
+def timed(stage: str) -> Callable:
+    """함수 전체를 측정하는 데코레이터. 비활성이면 원래 함수를 그대로 돌려준다."""
+    def decorator(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _timer(stage, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_seconds(stage: str, seconds: float) -> None:
+    """이미 잰 시간을 기록 (pipeline.TurnTimings 처럼 따로 측정한 값)"""
+    if ENABLED:
+        registry.observe("pokelife_stage_seconds", seconds, stage=stage)
+
+
+def record_usage(call: str, usage: Any) -> None:
+    """OpenAI 응답의 usage(prompt_tokens, completion_tokens)를 누적"""
+    if not ENABLED or usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value is None and isinstance(usage, dict):
+            value = usage.get(kind)
+        if value:
+            registry.inc("pokelife_llm_tokens_total", value, call=call, kind=kind.replace("_tokens", ""))
+
+
+def record_rows(source: str, rows: int) -> None:
+    if ENABLED:
+        registry.observe("pokelife_result_rows", rows, buckets=ROW_BUCKETS, source=source)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    if ENABLED:
+        registry.inc("pokelife_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_call(result: str) -> None:
+    """llm_client 호출 결과 (ok / retry / error / coalesced)"""
+    if ENABLED:
+        registry.inc("pokelife_llm_requests_total", result=result)
+
+
+def cache_hit_rates() -> Dict[str, float]:
+    """{'nl_sql': 0.8, 'chart': 0.5, ...}"""
+    series = registry.snapshot()["counters"].get("pokelife_cache_requests_total", {})
+    totals: Dict[str, list] = {}
+    for labels, value in series.items():
+        cache = labels.split('cache="', 1)[1].split('"', 1)[0]
+        hit_miss = totals.setdefault(cache, [0, 0])
+        hit_miss[0 if 'result="hit"' in labels else 1] += value
+    return {c: (h / (h + m) if h + m else 0.0) for c, (h, m) in totals.items()}
+
+
+# ------------------------------------------------
+# 3. Prometheus 엔드포인트 (선택)
+# ------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_prometheus_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    /metrics 를 제공하는 HTTP 서버를 데몬 스레드로 한 번만 띄운다.
+    Streamlit은 임의 경로를 열 수 없어서 별도 포트를 쓴다. 포트 설정이 없으면 None.
+    """
+    global _server
+    if not ENABLED:
+        return None
+    if port is None:
+        if not PROMETHEUS_PORT:
+            return None
+        port = int(PROMETHEUS_PORT)
+
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((PROMETHEUS_HOST, port), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ 메트릭 서버를 열지 못했습니다 ({PROMETHEUS_HOST}:{port}): {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"📊 Prometheus 메트릭: http://{PROMETHEUS_HOST}:{_server.server_address[1]}/metrics")
+    return _server
@@ -0,0 +1,392 @@
+# pipeline.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from assets import sprite_grid_html, SPRITE_GRID_MAX_ITEMS
+from db import get_db, QueryBudgetExceeded, QueryCancelled, unique_columns
+from metrics import observe_seconds
+from pokedex import answer_intent
+from query_audit import audit_query
+from utils import (
+    CHART_FORMATS,
+    chart_data_for_native,
+    chart_from_payload,
+    chart_payload,
+    get_pokemon_image_html_from_dexnum,
+    nl_to_sql_stream,
+)
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# 질문에 이 단어가 있으면 차트를 만든다
+CHART_KEYWORDS = ["그래프", "막대그래프", "시각화", "그래프로", "그려줘"]
+
+# 최종 리포트용으로 세션에 남겨둘 결과 행 수 (리포트 프롬프트는 상위 5행만 사용)
+ANALYSIS_KEEP_ROWS = 50
+
+# SQL 실행 / 차트 / 이미지 / 표 변환을 병렬로 돌리는 공용 풀 (Streamlit 세션 간 공유)
+_stage_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="turn-stage")
+
+
+# ------------------------------------------------
+# 1. 단계별 소요 시간 기록
+# ------------------------------------------------
+class TurnTimings:
+    """한 번의 채팅 턴에서 단계(llm, sql, chart, images, table ...)별 소요 시간(초)을 기록"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        """다른 곳에서 잰 시간을 name 단계에 더한다"""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def timed(self, name: str, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs)를 name 단계로 측정하며 실행 (스레드 풀 submit 용)"""
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            out = {k: round(v, 4) for k, v in self.stages.items()}
+        out["total"] = round(time.perf_counter() - self._started, 4)
+        return out
+
+    def finish(self) -> Dict[str, float]:
+        """최종 기록을 반환하고 메트릭(pokelife_stage_seconds{stage="turn_*"})에도 남긴다"""
+        out = self.as_dict()
+        for name, seconds in out.items():
+            observe_seconds(f"turn_{name}", seconds)
+        return out
+
+    @staticmethod
+    def format(timings: Dict[str, float]) -> str:
+        """{'llm': 1.2, 'sql': 0.003, ...} → 'llm 1200ms | sql 3ms | ...'"""
+        return " | ".join(f"{k} {v * 1000:.0f}ms" for k, v in timings.items())
+
+
+# ------------------------------------------------
+# 2. 결과 후처리 단계 (SQL 결과가 나온 뒤 서로 독립적인 작업들)
+# ------------------------------------------------
+def pick_chart_columns(df: pd.DataFrame):
+    """범주형(문자) 1개 + 숫자 1개 컬럼 자동 선택"""
+    if df is None or df.empty:
+        return None, None
+
+    numeric_cols = df.select_dtypes(include="number").columns.tolist()
+    cat_cols = df.select_dtypes(exclude="number").columns.tolist()
+
+    if not numeric_cols or not cat_cols:
+        return None, None
+
+    # x축: 첫 번째 범주형 컬럼, y축: 첫 번째 숫자 컬럼
+    return cat_cols[0], numeric_cols[0]
+
+
+def wants_chart(question: str) -> bool:
+    return any(kw in question for kw in CHART_KEYWORDS)
+
+
+# 각 섹션은 "참조(ref)" 를 만들고, 화면용 HTML은 render_* 로 다시 그린다.
+# 세션에는 base64 이미지 대신 참조만 남겨두고, 표시할 때 캐시(차트 캐시 / sprite_html LRU)에서 다시 꺼낸다.
+def build_chart_section(df: pd.DataFrame, chart_mode: str) -> Dict[str, Any]:
+    """차트 참조와 (native 모드일 때) st.bar_chart 용 데이터. 이미지 모드는 여기서 한 번 그려 캐시를 채운다."""
+    ref = None
+    chart_data = None
+    df = unique_columns(df)
+
+    x_col, y_col = pick_chart_columns(df)
+    if x_col and y_col:
+        if chart_mode == "native":
+            # 이미지 대신 데이터만 넘기고 st.bar_chart 로 그린다
+            chart_data = chart_data_for_native(df.head(10), x_col, y_col)
+            if chart_data is not None:
+                ref = {"native": True}
+        else:
+            payload = chart_payload(
+                df.head(10),
+                x_col=x_col,
+                y_col=y_col,
+                title=" ",
+                fmt=chart_mode if chart_mode in CHART_FORMATS else "png",
+            )
+            if payload and chart_from_payload(payload):
+                ref = {"payload": payload}
+
+    return {"ref": ref, "chart_data": chart_data}
+
+
+def render_chart_section(ref: Optional[Dict[str, Any]]) -> str:
+    if not ref:
+        return ""
+    if ref.get("native"):
+        return "### 📈 시각화 결과\n"
+    img_tag = chart_from_payload(ref["payload"])
+    return "### 📈 시각화 결과\n" + img_tag + "\n\n" if img_tag else ""
+
+
+def build_image_section(df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """dexnum 컬럼으로 이미지 참조 생성 (한 마리면 큰 이미지, 여러 마리면 그리드). 렌더링해서 캐시도 채운다."""
+    df = unique_columns(df)
+    if df.empty or "dexnum" not in df.columns:
+        return None
+
+    # 중복 제거한 도감번호들
+    unique_dex = df["dexnum"].dropna().unique()
+
+    ref = None
+    if len(unique_dex) == 1:
+        ref = {"single": int(unique_dex[0])}
+    elif len(unique_dex) > 1:
+        rows = df.dropna(subset=["dexnum"]).head(SPRITE_GRID_MAX_ITEMS * 2)
+        names = rows["name"] if "name" in rows.columns else [None] * len(rows)
+        ref = {
+            "grid": [(int(d), None if n is None else str(n)) for d, n in zip(rows["dexnum"], names)],
+            "total": len(unique_dex),
+        }
+
+    return ref if render_image_section(ref) else None
+
+
+def render_image_section(ref: Optional[Dict[str, Any]]) -> str:
+    if not ref:
+        return ""
+    if "single" in ref:
+        html = get_pokemon_image_html_from_dexnum(ref["single"])
+    else:
+        html = sprite_grid_html(ref["grid"], total=ref.get("total"))
+    return "### 📷 포켓몬 이미지\n" + html + "\n\n" if html else ""
+
+
+def build_table_section(df: pd.DataFrame, total_rows: Optional[int] = None, truncated: bool = False) -> str:
+    if df.empty:
+        return "조회된 결과가 없습니다.\n"
+    table_md = df.head(10).to_markdown(index=False, tablefmt="pipe")
+    note = ""
+    if truncated:
+        count = f"{total_rows:,}행" if total_rows is not None else f"{len(df):,}행 이상"
+        note = f"_결과가 너무 많아 전체 {count} 중 앞부분 {len(df):,}행만 가져왔네._\n\n"
+    elif len(df) > 10:
+        note = f"_전체 {len(df):,}행 중 상위 10행만 보여주겠네._\n\n"
+    return (
+        "### 🧪 오박사의 연구 기록\n"
+        f"{table_md}\n\n"
+        + note
+    )
+
+
+def render_turn(parts: Dict[str, Any]) -> str:
+    """run_turn 이 만든 parts(설명, SQL, 차트/이미지 참조, 표)로 답변 마크다운 조립"""
+    if "text" in parts:
+        return parts["text"]
+    sql_section = (
+        "### 🔍 생성된 SQL (자동 타입 변환 적용)\n"
+        f"```sql\n{parts['sql']}\n```\n\n"
+    )
+    return (
+        f"호오~ 자네의 질문을 들으니 꽤 흥미롭구먼!\n\n"
+        f"### 🧓 오박사의 답변\n"
+        f"{parts['explanation']}\n\n"
+        + sql_section
+        + render_chart_section(parts.get("chart"))
+        + render_image_section(parts.get("images"))
+        + parts.get("table", "")
+    )
+
+
+def analysis_summary(question: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    analysis_results 에 쌓을 작은 요약 (전체 결과 대신 앞부분 행 + 실제 행 수).
+    잘린 결과에 리포트 필터를 걸 때 다시 실행할 수 있도록 SQL 도 남긴다.
+    """
+    df = result["df"]
+    return {
+        "question": question,
+        "sql": result.get("sql"),
+        "df": df.head(ANALYSIS_KEEP_ROWS).copy(),
+        "total_rows": result["total_rows"] if result["total_rows"] is not None else len(df),
+        "truncated": result["truncated"] or len(df) > ANALYSIS_KEEP_ROWS,
+    }
+
+
+def execute_query(
+    sql: str, intent: Optional[Dict[str, Any]] = None, cancel: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    """
+    규칙 기반 질문(intent 있음)은 메모리 Pokédex 로, 나머지는 SQLite(read_bounded)로 실행.
+    SQLite 로 실행한 SQL은 실행 계획/시간과 함께 query_audit 로그에 남긴다 (cancel 로 중단된 것은 제외).
+    """
+    answered = answer_intent(intent)
+    if answered is not None:
+        return answered
+
+    source = "rule" if intent else "llm"
+    started = time.perf_counter()
+    try:
+        bounded = get_db().read_bounded(sql, cancel=cancel)
+    except QueryCancelled:
+        raise
+    except Exception as e:
+        audit_query(sql, time.perf_counter() - started, None, source, error=str(e))
+        raise
+    audit_query(
+        sql, time.perf_counter() - started, bounded["total_rows"], source, truncated=bounded["truncated"]
+    )
+    return bounded
+
+
+# ------------------------------------------------
+# 3. 한 턴 전체 파이프라인
+# ------------------------------------------------
+def run_turn(
+    question: str,
+    chat_history: Optional[List[str]] = None,
+    chart_mode: str = "png",
+    on_explanation: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    질문 → SQL → 실행 → (차트 / 이미지 / 표) 를 처리해 답변 메시지를 만든다.
+    - LLM 스트리밍 중 SQL이 완성되면 바로 쿼리를 풀에 넘김
+    - SQL 결과가 나오면 차트, 이미지, 표 변환을 동시에 실행하고 모두 끝나면 조립
+    - SQL은 db.read_bounded 로 행 수 / 시간 한도 안에서만 실행 (규칙 기반 질문은 pokedex 메모리 스냅샷으로)
+    반환: {"content", "parts"(render_turn 으로 다시 그릴 수 있는 참조), "chart_data", "sql",
+           "df"(실패 시 None, 최대 MAX_RESULT_ROWS 행),
+           "total_rows"(실제 행 수, 모르면 None), "truncated", "timings"}
+    Streamlit에 의존하지 않으므로 벤치마크/배치에서도 그대로 쓸 수 있다.
+    """
+    timings = TurnTimings()
+    result: Dict[str, Any] = {
+        "content": "", "chart_data": None, "sql": None, "df": None, "total_rows": None, "truncated": False,
+    }
+
+    # 1. 자연어 → SQL (SQL이 먼저 완성되면 설명 생성과 동시에 쿼리 시작)
+    #    미리 시작한 쿼리는 결과를 실제로 쓸 때만 sql 시간으로 기록하고,
+    #    최종 SQL 과 다르거나 SQL 이 없으면 cancel 로 중단시켜 풀 작업자를 돌려준다
+    data: Dict[str, Any] = {}
+    query_future = None
+    early_sql = None
+    early_cancel = threading.Event()
+    early_seconds: Dict[str, float] = {}
+    intent = None
+    explanation_so_far = ""
+
+    def early_query(value: str, value_intent: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return execute_query(value, value_intent, cancel=early_cancel)
+        finally:
+            early_seconds["sql"] = time.perf_counter() - started
+
+    try:
+        with timings.stage("llm"):
+            for event, value in nl_to_sql_stream(question, chat_history=chat_history):
+                if event == "intent":
+                    intent = value
+                elif event == "sql" and query_future is None:
+                    early_sql = value
+                    query_future = _stage_pool.submit(early_query, value, intent)
+                elif event == "explanation" and on_explanation:
+                    explanation_so_far += value
+                    on_explanation(explanation_so_far)
+                elif event == "done":
+                    data = value
+    except BaseException:
+        early_cancel.set()
+        raise
+
+    sql = data.get("sql")
+    if query_future is not None and early_sql != sql:
+        query_future.cancel()
+        early_cancel.set()
+        query_future = None
+
+    explanation = data.get("explanation_ko", "설명을 생성하지 못했습니다.")
+    result["sql"] = sql
+
+    if not sql:
+        result["content"] = (
+            "⚠️ SQL을 생성하지 못했어요.\n\n"
+            f"**설명:** {explanation}"
+        )
+        result["parts"] = {"text": result["content"]}
+        result["timings"] = timings.finish()
+        return result
+
+    # 2. SQL 실행 (스트리밍 중에 이미 시작했으면 그 결과를 사용)
+    try:
+        if query_future is not None:
+            try:
+                with timings.stage("sql_wait"):
+                    bounded = query_future.result()
+            finally:
+                timings.add("sql", early_seconds.get("sql", 0.0))
+        else:
+            bounded = timings.timed("sql", execute_query, sql, data.get("intent"))
+    except QueryBudgetExceeded as e:
+        result["content"] = (
+            "⏱️ 쿼리가 너무 오래 걸려서 중간에 멈췄다네.\n\n"
+            f"**사유:** {e}\n\n"
+            "조건을 좁히거나 조인을 줄여서 다시 물어봐 주게나.\n\n"
+            f"```sql\n{sql}\n```"
+        )
+        result["parts"] = {"text": result["content"]}
+        result["timings"] = timings.finish()
+        return result
+    except Exception as e:
+        result["content"] = (
+            "❌ SQL 실행 중 오류가 발생했어요.\n\n"
+            f"**오류 메시지:** `{e}`\n\n"
+            "아래 SQL을 참고해서 다시 질문을 바꿔보면 좋아요.\n\n"
+            f"```sql\n{sql}\n```"
+        )
+        result["parts"] = {"text": result["content"]}
+        result["timings"] = timings.finish()
+        return result
+    df = bounded["df"]
+    result["df"] = df
+    result["total_rows"] = bounded["total_rows"]
+    result["truncated"] = bounded["truncated"]
+
+    # 3. 차트 / 이미지 / 표 변환은 서로 독립적이므로 동시에 실행
+    with timings.stage("render"):
+        chart_future = None
+        if wants_chart(question) and not df.empty:
+            chart_future = _stage_pool.submit(timings.timed, "chart", build_chart_section, df, chart_mode)
+        image_future = _stage_pool.submit(timings.timed, "images", build_image_section, df)
+        table_future = _stage_pool.submit(
+            timings.timed, "table", build_table_section, df, bounded["total_rows"], bounded["truncated"]
+        )
+
+        chart = chart_future.result() if chart_future else {"ref": None, "chart_data": None}
+        images = image_future.result()
+        result_table = table_future.result()
+
+    # 4. 섹션 최종 조합 (parts 는 세션에 저장했다가 다시 그릴 때 쓰는 가벼운 참조)
+    result["parts"] = {
+        "explanation": explanation,
+        "sql": sql,
+        "chart": chart["ref"],
+        "images": images,
+        "table": result_table,
+    }
+    result["content"] = render_turn(result["parts"])
+    result["chart_data"] = chart["chart_data"]
+    result["timings"] = timings.finish()
+    return result
@@ -0,0 +1,246 @@
+# pokedex.py
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from db import get_db
+from metrics import record_cache, timer
+from utils import matchup_by_index, type_indices
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# pokemon 테이블은 1,026행 정도라 통째로 메모리에 올려 두고 규칙 기반 질문은 SQLite 없이 답한다.
+TABLES = {
+    "pokemon": "SELECT * FROM pokemon ORDER BY dexnum",
+    "type_effectiveness": "SELECT attacking_type, defending_type, multiplier FROM type_effectiveness",
+    "users": "SELECT User_id, Username, Favorite_type FROM UserData ORDER BY User_id",
+    "user_pokemon": "SELECT user_pokemon_id, user_id, pokemon_id, pokemon_name, slot_no FROM UserPokemon ORDER BY user_id, slot_no",
+}
+
+# 값 종류가 적은 문자열 컬럼은 category 로 (비교/그룹핑이 정수 코드 연산이 됨)
+CATEGORY_COLUMNS = {
+    "pokemon": ["type1", "type2", "growth_rate", "egg_group1", "egg_group2", "special_group"],
+    "type_effectiveness": ["attacking_type", "defending_type"],
+    "users": ["Favorite_type"],
+}
+
+STAT_COLUMNS = ["hp", "attack", "defense", "sp_atk", "sp_def", "speed", "total"]
+
+
+# ------------------------------------------------
+# 1. 스냅샷 (한 번 만들면 바꾸지 않음)
+# ------------------------------------------------
+class PokedexSnapshot:
+    """
+    pokemon / type_effectiveness / UserData / UserPokemon 의 읽기 전용 메모리 사본.
+    DataFrame은 공유되므로 호출하는 쪽에서 수정하지 말 것 (결과는 항상 새 DataFrame으로 돌려준다).
+    DB에 쓰기가 일어나면 새 스냅샷으로 통째로 교체된다.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame], version: int):
+        self.version = version
+        self.loaded_at = time.time()
+        self.pokemon = frames["pokemon"]
+        self.type_effectiveness = frames["type_effectiveness"]
+        self.users = frames["users"]
+        self.user_pokemon = frames["user_pokemon"]
+
+        # 결과를 만들 때 쓰는 컬럼별 NumPy 배열 (SQLite 결과와 같은 값)
+        self.arrays = {col: _result_array(self.pokemon[col]) for col in self.pokemon.columns}
+        # NULL 때문에 float 로 읽힌 정수 컬럼 (결과에 NULL 이 없으면 SQLite 처럼 정수로 돌려준다)
+        self._nullable_int = {
+            col for col, arr in self.arrays.items()
+            if arr.dtype.kind == "f" and np.isnan(arr).any() and (np.nan_to_num(arr) % 1 == 0).all()
+        }
+        # 정렬/집계용 스탯 배열 (float, 없는 값은 NaN)
+        self.stats = {col: self.pokemon[col].to_numpy(dtype=float) for col in STAT_COLUMNS if col in self.pokemon.columns}
+        self._dexnum = self.pokemon["dexnum"].to_numpy()
+        self._generation = self.pokemon["generation"].to_numpy(dtype=float)
+        self._name_positions = pd.Index(self.pokemon["name"])
+        self._type1_codes = self.pokemon["type1"].cat.codes.to_numpy()
+        self._type2_codes = self.pokemon["type2"].cat.codes.to_numpy()
+        # utils 상성 행렬의 인덱스 (상성 계산용)
+        self._type1_matrix_idx = type_indices(self.arrays["type1"])
+        self._type2_matrix_idx = type_indices(self.arrays["type2"])
+
+    @classmethod
+    def load(cls, version: int = 0) -> "PokedexSnapshot":
+        conn = get_db().reader()
+        frames = {}
+        with timer("pokedex_load"):
+            for name, sql in TABLES.items():
+                df = pd.read_sql_query(sql, conn)
+                for col in CATEGORY_COLUMNS.get(name, []):
+                    if col in df.columns:
+                        df[col] = df[col].astype("category")
+                frames[name] = df
+        # type1/type2 는 같은 범주를 써야 코드끼리 비교할 수 있다
+        pokemon = frames["pokemon"]
+        type_categories = sorted(set(pokemon["type1"].dropna()) | set(pokemon["type2"].dropna()))
+        for col in ("type1", "type2"):
+            pokemon[col] = pokemon[col].cat.set_categories(type_categories)
+        return cls(frames, version)
+
+    # ---------- 기본 조회 ----------
+    def type_mask(self, ptype: str) -> np.ndarray:
+        """type1 또는 type2 가 ptype 인 행"""
+        categories = self.pokemon["type1"].cat.categories
+        if ptype not in categories:
+            return np.zeros(len(self.pokemon), dtype=bool)
+        code = categories.get_loc(ptype)
+        return (self._type1_codes == code) | (self._type2_codes == code)
+
+    def positions(self, name: str) -> np.ndarray:
+        """이름이 name 인 행 번호들"""
+        return np.flatnonzero(self._name_positions == name)
+
+    def select(
+        self,
+        columns: List[str],
+        ptype: Optional[str] = None,
+        generation: Optional[int] = None,
+        sort: Optional[str] = None,
+        ascending: bool = False,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        타입/세대로 거르고 정렬해서 필요한 컬럼만.
+        SQLite 처럼 NULL 은 ASC 앞, DESC 뒤에 오고, 같은 값은 dexnum 순.
+        """
+        mask = np.ones(len(self.pokemon), dtype=bool)
+        if ptype is not None:
+            mask &= self.type_mask(ptype)
+        if generation is not None:
+            mask &= self._generation == int(generation)
+        rows = np.flatnonzero(mask)
+        if sort is not None:
+            values = self.stats[sort][rows] if sort in self.stats else self.pokemon[sort].to_numpy(dtype=float)[rows]
+            key = np.where(np.isnan(values), -np.inf, values) if ascending else np.where(np.isnan(values), np.inf, -values)
+            rows = rows[np.lexsort((self._dexnum[rows], key))]
+        if limit is not None:
+            rows = rows[:limit]
+        return pd.DataFrame({col: self._column(col, rows) for col in columns})
+
+    def _column(self, col: str, rows: np.ndarray) -> np.ndarray:
+        values = self.arrays[col][rows]
+        if col in self._nullable_int and not np.isnan(values).any():
+            return values.astype(np.int64)
+        return values
+
+    def stat_summary(self, stat: str, by: str = "type1") -> pd.DataFrame:
+        """by 컬럼별 count / mean / min / max"""
+        grouped = self.pokemon.groupby(by, observed=True)[stat]
+        return grouped.agg(["count", "mean", "min", "max"]).reset_index()
+
+    def team(self, user_id: int) -> pd.DataFrame:
+        """유저의 포켓몬 (슬롯 순) + pokemon 정보"""
+        team = self.user_pokemon[self.user_pokemon["user_id"] == user_id]
+        return team.merge(self.pokemon, left_on="pokemon_id", right_on="dexnum", how="left").reset_index(drop=True)
+
+    # ---------- 규칙 기반 질문(rule_sql intent) 답변 ----------
+    def answer(self, intent: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """
+        rule_sql 이 만든 intent 를 메모리에서 바로 계산. 결과 컬럼은 rule_sql 의 SQL 결과와 같다.
+        처리할 수 없는 intent 면 None (→ SQLite 로 실행)
+        """
+        kind = intent.get("kind")
+        if kind == "top_n":
+            return self._answer_top_n(intent["type"], intent["stat"], intent["order"], intent["limit"])
+        if kind == "avg_stat":
+            return self._answer_avg_stat(intent["type"], intent["stat"])
+        if kind == "matchup":
+            return self._answer_matchup(intent["attacker"], intent["defender"])
+        return None
+
+    def _answer_top_n(self, ptype: str, stat: str, order: str, limit: int) -> pd.DataFrame:
+        return self.select(
+            ["dexnum", "name", "type1", "type2", stat],
+            ptype=ptype, sort=stat, ascending=(order == "ASC"), limit=limit,
+        )
+
+    def _answer_avg_stat(self, ptype: str, stat: str) -> pd.DataFrame:
+        values = self.stats[stat][self.type_mask(ptype)]
+        valid = values[~np.isnan(values)]
+        avg = round(float(valid.mean()), 2) if len(valid) else None
+        return pd.DataFrame({"type": [ptype], "pokemon_count": [len(values)], f"avg_{stat}": [avg]})
+
+    def _answer_matchup(self, attacker: str, defender: str) -> pd.DataFrame:
+        # SQL 의 JOIN 과 같이 공격자 × 방어자 모든 조합
+        atk, dfn = np.meshgrid(self.positions(attacker), self.positions(defender), indexing="ij")
+        atk, dfn = atk.ravel(), dfn.ravel()
+        type1, type2 = self.arrays["type1"], self.arrays["type2"]
+        return pd.DataFrame({
+            "attacker": self.arrays["name"][atk],
+            "attack_type": type1[atk],
+            "dexnum": self.arrays["dexnum"][dfn],
+            "defender": self.arrays["name"][dfn],
+            "defender_type1": type1[dfn],
+            "defender_type2": type2[dfn],
+            "total_multiplier": matchup_by_index(
+                self._type1_matrix_idx[atk], self._type1_matrix_idx[dfn], self._type2_matrix_idx[dfn]
+            ),
+        })
+
+
+def _result_array(series: pd.Series) -> np.ndarray:
+    """SQLite 결과와 같은 값의 배열 (category 는 object 로, 없는 값은 None)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        values = series.astype(object).to_numpy()
+        return np.where(pd.isna(values), None, values)
+    return series.to_numpy()
+
+
+# ------------------------------------------------
+# 2. 프로세스 공용 스냅샷 (쓰기가 일어나면 다음 사용 시 다시 읽음)
+# ------------------------------------------------
+_snapshot: Optional[PokedexSnapshot] = None
+_version = 0
+_lock = threading.Lock()
+_version_lock = threading.Lock()
+
+
+def invalidate_pokedex() -> None:
+    """DB 쓰기 후 호출됨 (db.ConnectionManager.writer 의 커밋 리스너). 스냅샷 로드 중이어도 기다리지 않음"""
+    global _version
+    with _version_lock:
+        _version += 1
+
+
+def get_pokedex() -> PokedexSnapshot:
+    """최신 스냅샷. 쓰기 이후 처음 부를 때만 다시 읽고, 그 사이에는 같은 객체를 계속 돌려준다"""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == _version:
+        record_cache("pokedex", True)
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != _version:
+            _snapshot = PokedexSnapshot.load(_version)
+            print(f"📚 Pokédex 스냅샷 로드 (v{_version}, pokemon {len(_snapshot.pokemon)}행)")
+        record_cache("pokedex", False)
+        return _snapshot
+
+
+def answer_intent(intent: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    rule_sql intent 를 메모리 스냅샷으로 답한다.
+    반환은 db.read_bounded 와 같은 {"df", "total_rows", "truncated"} 또는 None
+    """
+    if not intent:
+        return None
+    try:
+        with timer("pokedex_query"):
+            df = get_pokedex().answer(intent)
+    except Exception as e:
+        print(f"⚠️ Pokédex 메모리 조회 실패 (SQLite 로 실행): {e}")
+        return None
+    if df is None:
+        return None
+    return {"df": df, "total_rows": len(df), "truncated": False}
+
+
+get_db().add_write_listener(invalidate_pokedex)
@@ -0,0 +1,447 @@
+# query_audit.py
+"""
+LLM이 만든 SQL의 실행 계획 감사 로그 + 인덱스 추천기.
+
+- POKELIFE_QUERY_AUDIT 을 켜면 run_turn 이 SQLite 로 실행한 SQL마다 EXPLAIN QUERY PLAN, 실행 시간, 행 수를
+  JSONL 로 남긴다 (크기 상한을 넘으면 .1 로 돌려 쓰기).
+- 추천기는 로그에서 전체 스캔(SCAN pokemon)과 임시 B-tree 정렬(USE TEMP B-TREE)을 모아
+  WHERE / GROUP BY / ORDER BY / SELECT 컬럼으로 커버링 인덱스 후보를 만들고,
+  메모리 복사본 DB에 실제로 만들어 본 뒤 계획이 좋아지는 것만 추천한다.
+- POKELIFE_INDEX_ADVISOR_APPLY=1 (또는 --apply) 일 때만 MyPocket.sqlite 에 인덱스를 실제로 만든다.
+
+단독 실행:  python query_audit.py [--log query_audit.jsonl] [--apply]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import get_db
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 감사 로그 (metrics 처럼 켤 때만 기록). "1"/"on" 이면 기본 경로, 그 밖의 값은 파일 경로
+_AUDIT_ENV = os.environ.get("POKELIFE_QUERY_AUDIT", "")
+AUDIT_ENABLED = _AUDIT_ENV.lower() not in ("", "0", "false", "off", "no")
+AUDIT_PATH = _AUDIT_ENV if AUDIT_ENABLED and _AUDIT_ENV.lower() not in ("1", "true", "on", "yes") \
+    else os.path.join(BASE_DIR, "query_audit.jsonl")
+# 로그 파일이 이 크기를 넘으면 <경로>.1 로 옮기고 새로 시작 (이전 .1 은 버림)
+AUDIT_MAX_BYTES = int(float(os.environ.get("POKELIFE_QUERY_AUDIT_MAX_MB", 5)) * 1024 * 1024)
+# 추천기가 읽을 최근 기록 수
+ADVISOR_MAX_RECORDS = 20000
+
+# 추천기를 주기적으로 돌릴 간격(초). 0 이면 돌리지 않음 (CLI 로만 실행)
+ADVISOR_INTERVAL_S = float(os.environ.get("POKELIFE_INDEX_ADVISOR_INTERVAL", 0))
+# 추천한 인덱스를 실제로 만들지 (기본은 추천만)
+ADVISOR_APPLY = os.environ.get("POKELIFE_INDEX_ADVISOR_APPLY", "").lower() in ("1", "true", "on", "yes")
+
+# 추천 기준: 이 횟수 이상 문제가 된 패턴만, 인덱스 컬럼은 최대 이만큼
+MIN_OCCURRENCES = 2
+MAX_INDEX_COLUMNS = 5
+AUTO_INDEX_PREFIX = "idx_auto_"
+
+# 같은 SQL의 실행 계획은 한 번만 구한다
+PLAN_CACHE_SIZE = 256
+
+_plan_cache: "OrderedDict[str, List[str]]" = OrderedDict()
+_lock = threading.Lock()
+# 감사 기록은 답변을 늦추지 않도록 별도 스레드 하나에서 순서대로 처리
+_audit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-audit")
+
+
+# ------------------------------------------------
+# 1. 실행 계획 + 감사 로그
+# ------------------------------------------------
+def sql_hash(sql: str) -> str:
+    return hashlib.sha256(re.sub(r"\s+", " ", sql.strip()).encode("utf-8")).hexdigest()[:16]
+
+
+def explain(sql: str, conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """EXPLAIN QUERY PLAN 의 detail 목록 (들여쓰기로 트리 깊이 표시)"""
+    conn = conn or get_db().reader()
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql.strip().rstrip(";")).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def _cached_plan(sql: str) -> List[str]:
+    key = sql_hash(sql)
+    with _lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+    plan = explain(sql)
+    with _lock:
+        _plan_cache[key] = plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+
+_SCAN_RE = re.compile(r"^\s*SCAN (\w+)(?: AS \w+)?(?P<index> USING (?:COVERING )?INDEX \w+)?\s*$")
+_TEMP_RE = re.compile(r"USE TEMP B-TREE FOR (.+)$")
+
+
+def plan_issues(plan: List[str], sql: str = "") -> Dict[str, Any]:
+    """전체 스캔한 테이블 목록(별칭은 테이블 이름으로)과 임시 B-tree 사용 여부"""
+    aliases = _alias_map(sql)
+    scans, temp = [], []
+    for line in plan:
+        m = _SCAN_RE.match(line)
+        if m and not m.group("index"):
+            scans.append(aliases.get(m.group(1).lower(), m.group(1)))
+        t = _TEMP_RE.search(line)
+        if t:
+            temp.append(t.group(1).strip())
+    return {"full_scans": scans, "temp_btree": temp}
+
+
+def _write_audit(record: Dict[str, Any]) -> None:
+    try:
+        if record.get("sql") and not record.get("error"):
+            record["plan"] = _cached_plan(record["sql"])
+            record.update(plan_issues(record["plan"], record["sql"]))
+        with open(AUDIT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            size = f.tell()
+        if size > AUDIT_MAX_BYTES:
+            os.replace(AUDIT_PATH, AUDIT_PATH + ".1")
+    except Exception as e:
+        print(f"⚠️ 쿼리 감사 기록 실패: {e}")
+
+
+def audit_query(
+    sql: str,
+    seconds: Optional[float],
+    rows: Optional[int],
+    source: str = "llm",
+    truncated: bool = False,
+    error: Optional[str] = None,
+) -> None:
+    """실행한 SQL 한 건을 감사 로그에 남긴다 (EXPLAIN 과 파일 쓰기는 백그라운드에서)"""
+    if not AUDIT_ENABLED or not sql:
+        return
+    record = {
+        "ts": round(time.time(), 3),
+        "hash": sql_hash(sql),
+        "source": source,
+        "sql": sql,
+        "seconds": round(seconds, 6) if seconds is not None else None,
+        "rows": rows,
+        "truncated": truncated,
+        "error": error,
+    }
+    _audit_pool.submit(_write_audit, record)
+
+
+def read_audit_log(path: str = AUDIT_PATH, limit: int = ADVISOR_MAX_RECORDS) -> List[Dict[str, Any]]:
+    """돌려 쓴 이전 파일(.1)까지 포함해 최근 limit 건 (파일 전체를 메모리에 올리지 않음)"""
+    records: "deque[Dict[str, Any]]" = deque(maxlen=limit)
+    for p in (path + ".1", path):
+        if not os.path.exists(p):
+            continue
+        with open(p, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return list(records)
+
+
+# ------------------------------------------------
+# 2. SQL 에서 인덱스 후보 컬럼 뽑기 (간단한 규칙 기반 파서)
+# ------------------------------------------------
+_CLAUSE_RE = re.compile(
+    r"\b(SELECT|FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|UNION|EXCEPT|INTERSECT)\b", re.IGNORECASE
+)
+_IDENT = r"(?:(\w+)\.)?\"?(\w+)\"?"
+_EQ_RE = re.compile(_IDENT + r"\s*(?:=|\bIN\b|\bIS\b)", re.IGNORECASE)
+_RANGE_RE = re.compile(_IDENT + r"\s*(?:<=|>=|<|>|\bBETWEEN\b|\bLIKE\b)", re.IGNORECASE)
+_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_SQL_WORDS = {"on", "where", "join", "left", "inner", "cross", "group", "order", "limit", "natural", "using", "outer"}
+
+
+def _clauses(sql: str) -> Dict[str, str]:
+    """바깥/안쪽 구분 없이 절 이름별로 본문을 이어 붙인다 (서브쿼리도 후보를 내도록)"""
+    parts: Dict[str, str] = {}
+    matches = list(_CLAUSE_RE.finditer(sql))
+    for i, m in enumerate(matches):
+        name = re.sub(r"\s+", " ", m.group(1).upper())
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(sql)
+        parts[name] = parts.get(name, "") + " " + sql[m.end():end]
+    return parts
+
+
+def _alias_map(sql: str) -> Dict[str, str]:
+    """별칭(소문자) → 테이블 이름"""
+    mapping = {}
+    for m in _ALIAS_RE.finditer(sql):
+        mapping[m.group(1).lower()] = m.group(1)
+        if m.group(2) and m.group(2).lower() not in _SQL_WORDS:
+            mapping[m.group(2).lower()] = m.group(1)
+    return mapping
+
+
+def _table_aliases(sql: str, table: str) -> set:
+    aliases = {table.lower()}
+    for m in _ALIAS_RE.finditer(sql):
+        if m.group(1).lower() == table.lower() and m.group(2) and m.group(2).lower() not in _SQL_WORDS:
+            aliases.add(m.group(2).lower())
+    return aliases
+
+
+def _columns_in(text: str, pattern: re.Pattern, table_columns: set, aliases: set) -> List[str]:
+    found = []
+    for m in pattern.finditer(text):
+        prefix, col = m.group(1), m.group(2)
+        if prefix and prefix.lower() not in aliases:
+            continue
+        if col in table_columns and col not in found:
+            found.append(col)
+    return found
+
+
+def _ordered_columns(text: str, table_columns: set, aliases: set) -> List[str]:
+    cols = []
+    for item in text.split(","):
+        m = re.match(r"\s*" + _IDENT, item.strip())
+        if not m:
+            continue
+        prefix, col = m.group(1), m.group(2)
+        if prefix and prefix.lower() not in aliases:
+            continue
+        if col in table_columns and col not in cols:
+            cols.append(col)
+    return cols
+
+
+def candidate_index(sql: str, table: str, table_columns: List[str]) -> Optional[Tuple[str, ...]]:
+    """
+    (동등 조건 컬럼 → GROUP BY/ORDER BY 컬럼 → 범위 조건 컬럼 → SELECT 컬럼) 순으로 커버링 인덱스 후보.
+    걸 만한 조건/정렬이 없으면 None
+    """
+    columns = set(table_columns)
+    aliases = _table_aliases(sql, table)
+    parts = _clauses(sql)
+    where = parts.get("WHERE", "") + " " + " ".join(
+        m.group(1) for m in re.finditer(r"\bON\b(.+?)(?=\b(?:LEFT|JOIN|WHERE|GROUP|ORDER|LIMIT)\b|$)", sql, re.IGNORECASE | re.DOTALL)
+    )
+
+    eq = _columns_in(where, _EQ_RE, columns, aliases)
+    order = _ordered_columns(parts.get("GROUP BY", ""), columns, aliases) or \
+        _ordered_columns(parts.get("ORDER BY", ""), columns, aliases)
+    rng = [c for c in _columns_in(where, _RANGE_RE, columns, aliases) if c not in eq]
+    if not (eq or order or rng):
+        return None
+
+    key: List[str] = []
+    for col in eq + order + rng[:1]:
+        if col not in key:
+            key.append(col)
+    # 남는 자리는 SELECT 컬럼으로 채워 테이블을 안 읽어도 되게 (커버링)
+    select_cols = re.findall(r"(?:(\w+)\.)?\b(\w+)\b", parts.get("SELECT", ""))
+    for prefix, col in select_cols:
+        if len(key) >= MAX_INDEX_COLUMNS:
+            break
+        if prefix and prefix.lower() not in aliases:
+            continue
+        if col in columns and col not in key:
+            key.append(col)
+    return tuple(key[:MAX_INDEX_COLUMNS])
+
+
+# ------------------------------------------------
+# 3. 인덱스 추천기
+# ------------------------------------------------
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _existing_prefixes(conn: sqlite3.Connection, table: str) -> List[Tuple[str, ...]]:
+    prefixes = []
+    for row in conn.execute(f'PRAGMA index_list("{table}")'):
+        cols = tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{row[1]}")'))
+        prefixes.append(cols)
+    return prefixes
+
+
+def index_name(table: str, columns: Tuple[str, ...]) -> str:
+    return f"{AUTO_INDEX_PREFIX}{table.lower()}_" + "_".join(columns)
+
+
+def _plan_cost(plan: List[str]) -> int:
+    issues = plan_issues(plan)
+    return len(issues["full_scans"]) * 2 + len(issues["temp_btree"])
+
+
+def advise(records: Optional[List[Dict[str, Any]]] = None, min_occurrences: int = MIN_OCCURRENCES) -> Dict[str, Any]:
+    """
+    감사 로그를 모아 인덱스를 추천한다.
+    반환: {"queries", "problem_queries", "scans": {table: n}, "temp_btree": n,
+           "proposals": [{"table", "columns", "name", "sql", "queries", "seconds", "improved"}]}
+    """
+    records = read_audit_log() if records is None else records
+    records = [r for r in records if r.get("plan") is not None]
+
+    scans: Dict[str, int] = {}
+    temp_btree = 0
+    unique: Dict[str, Dict[str, Any]] = {}
+    for r in records:
+        for table in r.get("full_scans", []):
+            scans[table] = scans.get(table, 0) + 1
+        temp_btree += bool(r.get("temp_btree"))
+        if r.get("full_scans") or r.get("temp_btree"):
+            entry = unique.setdefault(r["hash"], {"sql": r["sql"], "count": 0, "seconds": 0.0, "record": r})
+            entry["count"] += 1
+            entry["seconds"] += r.get("seconds") or 0.0
+
+    # 후보를 실제로 만들어 볼 메모리 복사본
+    scratch = sqlite3.connect(":memory:")
+    get_db().reader().backup(scratch)
+
+    candidates: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+    for entry in unique.values():
+        record = entry["record"]
+        tables = set(record.get("full_scans", []))
+        if record.get("temp_btree") and not tables:
+            tables = {m.group(1) for m in _ALIAS_RE.finditer(entry["sql"])}
+        for table in tables:
+            table_columns = _table_columns(scratch, table)
+            if not table_columns:
+                continue
+            cols = candidate_index(entry["sql"], table, table_columns)
+            if not cols or any(p[:len(cols)] == cols for p in _existing_prefixes(scratch, table)):
+                continue
+            c = candidates.setdefault((table, cols), {"queries": 0, "seconds": 0.0, "sqls": []})
+            c["queries"] += entry["count"]
+            c["seconds"] += entry["seconds"]
+            c["sqls"].append(entry["sql"])
+
+    proposals = []
+    for (table, cols), c in candidates.items():
+        if c["queries"] < min_occurrences:
+            continue
+        name = index_name(table, cols)
+        col_sql = ", ".join(f'"{col}"' for col in cols)
+        create_sql = f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({col_sql})'
+        before = sum(_plan_cost(explain(sql, scratch)) for sql in c["sqls"])
+        scratch.execute(create_sql)
+        after = sum(_plan_cost(explain(sql, scratch)) for sql in c["sqls"])
+        scratch.execute(f"DROP INDEX {name}")
+        proposals.append({
+            "table": table,
+            "columns": list(cols),
+            "name": name,
+            "sql": create_sql,
+            "queries": c["queries"],
+            "seconds": round(c["seconds"], 6),
+            "improved": after < before,
+        })
+    scratch.close()
+
+    proposals = [p for p in proposals if p["improved"]]
+    proposals.sort(key=lambda p: (p["seconds"], p["queries"]), reverse=True)
+    return {
+        "queries": len(records),
+        "problem_queries": sum(e["count"] for e in unique.values()),
+        "scans": scans,
+        "temp_btree": temp_btree,
+        "proposals": proposals,
+    }
+
+
+def apply_proposals(proposals: List[Dict[str, Any]]) -> List[str]:
+    """추천 인덱스를 MyPocket.sqlite 에 만들고 ANALYZE (만든 인덱스 이름 목록 반환)"""
+    created = []
+    if not proposals:
+        return created
+    with get_db().writer() as conn:
+        for p in proposals:
+            conn.execute(p["sql"])
+            created.append(p["name"])
+        conn.execute("ANALYZE")
+    with _lock:
+        _plan_cache.clear()
+    return created
+
+
+def run_advisor(apply: bool = ADVISOR_APPLY) -> Dict[str, Any]:
+    report = advise()
+    for p in report["proposals"]:
+        print(f"🧭 인덱스 추천: {p['sql']}  (쿼리 {p['queries']}건, 누적 {p['seconds']:.3f}s)")
+    if apply and report["proposals"]:
+        report["created"] = apply_proposals(report["proposals"])
+        print(f"✅ 인덱스 {len(report['created'])}개 생성: {', '.join(report['created'])}")
+    return report
+
+
+_advisor_thread: Optional[threading.Thread] = None
+
+
+def start_index_advisor(interval_s: float = ADVISOR_INTERVAL_S) -> Optional[threading.Thread]:
+    """interval_s 초마다 추천기를 도는 데몬 스레드 (프로세스당 하나, 0 이면 시작 안 함)"""
+    global _advisor_thread
+    if interval_s <= 0 or not AUDIT_ENABLED:
+        return None
+    with _lock:
+        if _advisor_thread is not None:
+            return _advisor_thread
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                try:
+                    run_advisor()
+                except Exception as e:
+                    print(f"⚠️ 인덱스 추천기 실패: {e}")
+
+        _advisor_thread = threading.Thread(target=loop, name="index-advisor", daemon=True)
+        _advisor_thread.start()
+    return _advisor_thread
+
+
+# ------------------------------------------------
+# 4. CLI
+# ------------------------------------------------
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="쿼리 감사 로그로 인덱스 추천")
+    parser.add_argument("--log", default=AUDIT_PATH, help="감사 로그 JSONL 경로")
+    parser.add_argument("--apply", action="store_true", help="추천 인덱스를 실제로 생성")
+    parser.add_argument("--min", type=int, default=MIN_OCCURRENCES, help="추천에 필요한 최소 쿼리 수")
+    args = parser.parse_args(argv)
+
+    records = read_audit_log(args.log)
+    report = advise(records, min_occurrences=args.min)
+    print(f"📒 감사 로그 {report['queries']}건, 문제 쿼리 {report['problem_queries']}건")
+    for table, n in sorted(report["scans"].items(), key=lambda kv: -kv[1]):
+        print(f"   SCAN {table}: {n}건")
+    print(f"   TEMP B-TREE: {report['temp_btree']}건")
+    if not report["proposals"]:
+        print("✅ 추천할 인덱스가 없습니다.")
+        return 0
+    for p in report["proposals"]:
+        print(f"🧭 {p['sql']}  (쿼리 {p['queries']}건, 누적 {p['seconds']:.3f}s)")
+    if args.apply:
+        created = apply_proposals(report["proposals"])
+        print(f"✅ 인덱스 {len(created)}개 생성 완료")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
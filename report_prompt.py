@@ -0,0 +1,330 @@
+# report_prompt.py
+import hashlib
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from db import get_db, unique_columns
+from llm_cache import normalize_question
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# 최종 리포트 user 프롬프트에서 분석 결과 블록에 쓸 최대 토큰 수
+REPORT_TOKEN_BUDGET = int(os.environ.get("POKELIFE_REPORT_TOKENS", 6000))
+
+# 잘린 결과(세션에는 앞 50행만 남음)에 필터를 걸 때 SQL 을 다시 실행해서 가져올 최대 행 수
+REFILTER_MAX_ROWS = int(os.environ.get("POKELIFE_REPORT_FILTER_ROWS", 20000))
+
+PREVIEW_ROWS = 5
+DIGEST_STAT_COLUMNS = 3
+DIGEST_ROW_COLUMNS = 4
+
+# tiktoken 이 있으면 정확히, 없으면 글자 수로 근사
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _ENCODING = None
+
+
+# ------------------------------------------------
+# 1. 토큰 수 추정
+# ------------------------------------------------
+def estimate_tokens(text: str) -> int:
+    """
+    프롬프트 토큰 수 추정.
+    근사식: 영문/숫자/기호는 약 4글자당 1토큰, 한글 등은 약 1.5글자당 1토큰 (조금 넉넉하게 잡음)
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+
+# ------------------------------------------------
+# 2. 분석 결과 하나 → 본문 / 요약(digest)
+# ------------------------------------------------
+def summarize_frame(df: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """숫자 컬럼별 min / max / mean (리포트 프롬프트 / 관리자 패널용 요약 통계)"""
+    stats = {}
+    # 조인 결과처럼 같은 이름의 컬럼이 여러 개일 수 있어서 위치로 꺼내고, 이름이 겹치면 첫 번째만
+    for i, col in enumerate(df.columns):
+        if str(col) in stats or not pd.api.types.is_numeric_dtype(df.dtypes.iloc[i]):
+            continue
+        series = df.iloc[:, i].dropna()
+        if series.empty:
+            continue
+        stats[str(col)] = {
+            "min": float(series.min()),
+            "max": float(series.max()),
+            "mean": round(float(series.mean()), 3),
+        }
+    return stats
+
+
+def result_fingerprint(df: Optional[pd.DataFrame]) -> str:
+    """같은 결과인지 비교하기 위한 해시 (컬럼 + 값)"""
+    if df is None:
+        return ""
+    h = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()[:16]
+
+
+def _fmt(value: float) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+def analysis_body(item: Dict[str, Any]) -> str:
+    """전체 본문: 실제 행 수 + 상위 5행 미리보기"""
+    df = item.get("df")
+    filtered_from = item.get("filtered_from")
+    if df is None or df.empty:
+        if item.get("sample"):
+            return f"전체 {item.get('total_rows') or '?'}행 중 앞 {filtered_from}행에는 필터 조건에 맞는 결과가 없었습니다."
+        if filtered_from is not None:
+            return f"필터 조건에 맞는 결과가 없었습니다. (필터 전 {filtered_from}행)"
+        return "조회된 결과가 없었습니다."
+    body = ""
+    if item.get("sample"):
+        body += (
+            f"전체 {item.get('total_rows') or '?'}행 중 앞 {filtered_from}행만 필터를 적용한 표본 {len(df)}행 "
+            "(전체 결과에 적용한 행 수가 아님)\n"
+        )
+    elif filtered_from is not None:
+        body += f"필터 적용 후 {len(df)}행 (필터 전 {filtered_from}행)\n"
+    elif item.get("total_rows"):
+        body += f"전체 결과 {item['total_rows']}행\n"
+    body += "상위 5개 결과 미리보기:\n"
+    body += df.head(PREVIEW_ROWS).to_markdown(index=False)
+    return body
+
+
+def analysis_digest(item: Dict[str, Any]) -> str:
+    """짧은 요약: 행 수, 주요 숫자 컬럼 통계, 첫 행"""
+    df = item.get("df")
+    if df is None or df.empty:
+        if item.get("sample"):
+            return f"앞 {item['filtered_from']}행 중 필터 결과 없음 (전체 {item.get('total_rows') or '?'}행)"
+        return "결과 없음"
+
+    if item.get("sample"):
+        parts = [f"앞 {item['filtered_from']}행 중 필터 표본 {len(df)}행 (전체 {item.get('total_rows') or '?'}행)"]
+    else:
+        parts = [f"결과 {item.get('total_rows') or len(df)}행"]
+    stats = item.get("stats") or summarize_frame(df)
+    for col, s in list(stats.items())[:DIGEST_STAT_COLUMNS]:
+        parts.append(f"{col} 평균 {_fmt(s['mean'])} ({_fmt(s['min'])}~{_fmt(s['max'])})")
+    first = df.iloc[0]
+    cols = list(df.columns[:DIGEST_ROW_COLUMNS])
+    parts.append("첫 행: " + ", ".join(f"{c}={first.iloc[i]}" for i, c in enumerate(cols)))
+    return " / ".join(parts)
+
+
+def prepare_analysis(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    결과가 도착했을 때 한 번만 계산해 두는 값들 (본문, 요약, 토큰 수, 결과 해시).
+    session_store.AnalysisStore 가 저장 시점에 호출한다.
+    """
+    prepared = dict(item)
+    if "body" not in prepared:
+        df = item.get("df")
+        prepared["fingerprint"] = result_fingerprint(df)
+        prepared["body"] = analysis_body(item)
+        prepared["digest"] = analysis_digest(item)
+        prepared["body_tokens"] = estimate_tokens(prepared["body"])
+        prepared["digest_tokens"] = estimate_tokens(prepared["digest"])
+    return prepared
+
+
+# ------------------------------------------------
+# 3. 세대/타입 필터를 실제 데이터에 적용
+# ------------------------------------------------
+_FILTER_COLUMNS = ["generation", "type1", "type2"]
+
+
+def pokemon_attributes() -> pd.DataFrame:
+    """dexnum / name → generation, type1, type2 (pokedex 메모리 스냅샷에서)"""
+    from pokedex import get_pokedex
+    return get_pokedex().pokemon[["dexnum", "name"] + _FILTER_COLUMNS]
+
+
+def is_filterable(df: pd.DataFrame) -> bool:
+    """포켓몬 단위 결과인지 (필터 컬럼이 모두 있거나 dexnum / name 으로 pokemon 과 붙일 수 있음)"""
+    columns = set(unique_columns(df).columns)
+    return set(_FILTER_COLUMNS) <= columns or "dexnum" in columns or "name" in columns
+
+
+def filter_frame(df: pd.DataFrame, gen_filter=None, type_filter=None) -> Optional[pd.DataFrame]:
+    """
+    결과 DataFrame에서 필터(세대, type1/type2)에 맞는 행만 남긴다.
+    결과에 generation/type 컬럼이 없으면 dexnum(없으면 name)으로 pokemon 테이블과 붙여서 판단.
+    포켓몬 단위 결과가 아니라 필터를 걸 수 없으면 None.
+    """
+    if gen_filter is None and not type_filter:
+        return df
+
+    full, df = df, unique_columns(df)
+    missing = [c for c in _FILTER_COLUMNS if c not in df.columns]
+    if missing:
+        key = "dexnum" if "dexnum" in df.columns else ("name" if "name" in df.columns else None)
+        if key is None:
+            return None
+        attrs = pokemon_attributes()[[key] + missing].drop_duplicates(subset=[key])
+        try:
+            merged = df[[key] + [c for c in _FILTER_COLUMNS if c in df.columns]].merge(attrs, on=key, how="left")
+        except (ValueError, TypeError):
+            return None
+    else:
+        merged = df
+
+    mask = pd.Series(True, index=merged.index)
+    if gen_filter is not None:
+        mask &= pd.to_numeric(merged["generation"], errors="coerce") == int(gen_filter)
+    if type_filter:
+        mask &= merged["type1"].isin(type_filter) | merged["type2"].isin(type_filter)
+    return full[mask.to_numpy()].reset_index(drop=True)
+
+
+def filter_source(item: Dict[str, Any]) -> Tuple[pd.DataFrame, bool]:
+    """
+    필터를 걸 데이터와 그것이 결과 전체인지 여부.
+    세션에 남은 df 는 앞 50행뿐이라, 잘린 결과(truncated)는 저장해 둔 SQL 을 다시 실행해서 전체를 가져온다.
+    SQL 이 없거나 다시 실행해도 REFILTER_MAX_ROWS 를 넘으면 (앞부분 df, False)
+    """
+    df = item["df"]
+    if not item.get("truncated"):
+        return df, True
+    sql = item.get("sql")
+    if sql:
+        try:
+            bounded = get_db().read_bounded(sql, max_rows=REFILTER_MAX_ROWS)
+            if not bounded["truncated"]:
+                return bounded["df"], True
+        except Exception as e:
+            print(f"⚠️ 리포트 필터용 재조회 실패 (앞부분 행만 사용): {e}")
+    return df, False
+
+
+def apply_report_filters(items, gen_filter=None, type_filter=None) -> List[Dict[str, Any]]:
+    """
+    리포트 필터를 분석 결과 데이터에 직접 적용하고 prepare_analysis 까지 마친 목록.
+    필터를 걸 수 없는 결과(타입별 평균처럼 포켓몬 단위가 아닌 것)는 SQL 을 다시 실행하지 않고 그대로 둔다.
+    한 번 처리한 항목은 filter_applied=True 로 표시해서 다시 거르지 않는다 (필터를 걸 수 없었던 것 포함).
+    전체 결과를 구하지 못해 앞부분 행에만 필터를 건 경우는 sample=True 로 표시하고 실제 total_rows 를 유지한다.
+    """
+    has_filter = gen_filter is not None or bool(type_filter)
+    prepared = []
+    for item in items:
+        df = item.get("df")
+        filtered = None
+        if has_filter and df is not None and not item.get("filter_applied") and is_filterable(df):
+            source, complete = filter_source(item)
+            filtered = filter_frame(source, gen_filter, type_filter)
+        if filtered is None:
+            prepared_item = prepare_analysis(item)
+        else:
+            prepared_item = prepare_analysis({
+                "question": item.get("question", ""),
+                "df": filtered,
+                "total_rows": len(filtered) if complete else item.get("total_rows"),
+                "filtered_from": len(source),
+                "sample": not complete,
+                "stats": summarize_frame(filtered),
+            })
+        if has_filter:
+            prepared_item["filter_applied"] = True
+        prepared.append(prepared_item)
+    return prepared
+
+
+# ------------------------------------------------
+# 4. 예산 안에서 분석 블록 조립
+# ------------------------------------------------
+def dedupe_analyses(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """같은 질문 + 같은 결과가 반복되면 마지막 것 하나만 남김 (순서는 마지막 등장 기준)"""
+    last_index = {}
+    for i, item in enumerate(items):
+        last_index[(normalize_question(item.get("question", "")), item.get("fingerprint", ""))] = i
+    keep = sorted(last_index.values())
+    return [items[i] for i in keep]
+
+
+# 항목별 표현 단계: 생략 < 질문만 < 요약 < 전체 본문
+OMIT, TITLE, DIGEST, FULL = range(4)
+
+
+def _section(index: int, item: Dict[str, Any], level: int) -> str:
+    header = f"[분석 {index}] 질문: {item.get('question', '')}"
+    if level == FULL:
+        return f"{header}\n{item['body']}"
+    if level == DIGEST:
+        return f"{header}\n요약: {item['digest']}"
+    return header
+
+
+def _cost(item: Dict[str, Any], level: int) -> int:
+    title = estimate_tokens(item.get("question", "")) + 8
+    if level == FULL:
+        return title + item["body_tokens"]
+    if level == DIGEST:
+        return title + item["digest_tokens"] + 2
+    if level == TITLE:
+        return title
+    return 0
+
+
+def build_analyses_block(items, budget: int = REPORT_TOKEN_BUDGET) -> Tuple[str, Dict[str, Any]]:
+    """
+    분석 결과들을 토큰 예산 안에 맞춰 하나의 텍스트로.
+    1) 중복 제거
+    2) 모두 요약(digest)으로 시작 → 예산 초과면 오래된 것부터 질문만 → 그래도 넘치면 생략
+    3) 남는 예산으로 최신 분석부터 전체 본문(상위 5행 표)으로 승격
+    반환: (블록 텍스트, {"analyses", "full", "digest", "title", "omitted", "tokens"})
+    """
+    prepared = dedupe_analyses([prepare_analysis(item) for item in items])
+    levels = [DIGEST] * len(prepared)
+    total = sum(_cost(item, DIGEST) for item in prepared)
+
+    # 오래된 것부터 한 단계씩 낮추기
+    for target in (DIGEST, TITLE):
+        for i, item in enumerate(prepared):
+            if total <= budget:
+                break
+            if levels[i] == target:
+                total -= _cost(item, target) - _cost(item, target - 1)
+                levels[i] = target - 1
+
+    # 최신 분석부터 전체 본문으로 올리기
+    for i in range(len(prepared) - 1, -1, -1):
+        if levels[i] != DIGEST:
+            continue
+        extra = _cost(prepared[i], FULL) - _cost(prepared[i], DIGEST)
+        if total + extra <= budget:
+            total += extra
+            levels[i] = FULL
+
+    sections = []
+    omitted = levels.count(OMIT)
+    if omitted:
+        sections.append(f"(분량 제한으로 더 이전 분석 {omitted}건은 생략)")
+    for i, (item, level) in enumerate(zip(prepared, levels), 1):
+        if level != OMIT:
+            sections.append(_section(i, item, level))
+
+    info = {
+        "analyses": len(items),
+        "unique": len(prepared),
+        "full": levels.count(FULL),
+        "digest": levels.count(DIGEST),
+        "title": levels.count(TITLE),
+        "omitted": omitted,
+        "tokens": total,
+    }
+    return "\n\n---\n\n".join(sections), info
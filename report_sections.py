@@ -0,0 +1,166 @@
+# report_sections.py
+import hashlib
+import html
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from llm_cache import normalize_question
+from metrics import record_cache, record_usage, timer
+from report_prompt import apply_report_filters, prepare_analysis
+
+# ------------------------------------------------
+# 0. 기본 설정
+# ------------------------------------------------
+# 결과가 들어오자마자 질문별 섹션을 미리 생성할지 (끄면 리포트 버튼을 눌렀을 때 생성)
+PREFETCH_SECTIONS = os.environ.get("POKELIFE_REPORT_PREFETCH", "1").lower() not in ("0", "false", "off", "no")
+SECTION_CACHE_SIZE = 512
+
+# 요약/결론 LLM 출력에서 질문별 섹션이 들어갈 자리
+SECTIONS_MARKER = "<!--QUESTION_SECTIONS-->"
+
+SECTION_SYSTEM_PROMPT = """
+당신은 포켓몬 연구소의 책임 연구원인 **오박사**입니다.
+말투는 항상 친절하고 유쾌하며 약간 할아버지 느낌으로 유지합니다. (예: "~하네", "~일세", "호오?")
+
+질문 하나와 그 분석 결과가 주어집니다.
+최종 연구 리포트의 '질문별 분석 정리'에 들어갈 한 꼭지를 HTML 조각으로만 작성하세요.
+
+형식 (이 두 태그만 사용, 다른 설명 금지):
+<h3>질문을 짧게 요약한 제목</h3>
+<p>분석 결과를 오박사 말투로 2~4문장 설명. 중요한 수치나 포켓몬 이름은 <strong>...</strong>로 강조.</p>
+""".strip()
+
+SECTION_PROMPT_VERSION = hashlib.sha256(SECTION_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:8]
+
+_section_cache: "OrderedDict[str, str]" = OrderedDict()
+_inflight: Dict[str, Future] = {}
+_lock = threading.Lock()
+_section_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="report-section")
+
+
+# ------------------------------------------------
+# 1. 캐시 키
+# ------------------------------------------------
+def _filter_key(gen_filter, type_filter) -> Dict[str, Any]:
+    return {"gen": gen_filter, "types": sorted(type_filter or [])}
+
+
+def section_key(item: Dict[str, Any], gen_filter=None, type_filter=None) -> str:
+    """질문 + 결과 해시 + 필터 + 모델/프롬프트 버전으로 만든 섹션 캐시 키"""
+    from utils import LLM_MODEL
+
+    payload = json.dumps(
+        {
+            "q": normalize_question(item.get("question", "")),
+            "result": item.get("fingerprint", ""),
+            "filter": _filter_key(gen_filter, type_filter),
+            "model": LLM_MODEL,
+            "prompt": SECTION_PROMPT_VERSION,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------------------
+# 2. 질문별 섹션 생성
+# ------------------------------------------------
+def fallback_section(item: Dict[str, Any]) -> str:
+    """LLM을 쓸 수 없을 때 요약(digest)으로 만든 기본 섹션 (캐시하지 않음)"""
+    return (
+        f"<h3>{html.escape(item.get('question', ''))}</h3>\n"
+        f"<p>{html.escape(item.get('digest', ''))}</p>"
+    )
+
+
+def _generate_section(item: Dict[str, Any], gen_filter, type_filter) -> Optional[str]:
+    from utils import LLM_MODEL, get_openai_client
+
+    client = get_openai_client()
+    if not client:
+        return None
+
+    filter_desc = []
+    if gen_filter is not None:
+        filter_desc.append(f"{gen_filter}세대 중심으로 해석")
+    if type_filter:
+        filter_desc.append(f"{', '.join(type_filter)} 타입 위주로 언급")
+    filter_line = f"[필터] {' / '.join(filter_desc)}\n" if filter_desc else ""
+
+    try:
+        with timer("llm_report_section"):
+            res = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=[
+                    {"role": "system", "content": SECTION_SYSTEM_PROMPT},
+                    {"role": "user", "content": f"{filter_line}[질문]\n{item.get('question', '')}\n\n[분석 결과]\n{item['body']}"},
+                ],
+                temperature=0.3,
+            )
+        record_usage("report_section", getattr(res, "usage", None))
+        return (res.choices[0].message.content or "").strip() or None
+    except Exception as e:
+        print(f"⚠️ 리포트 섹션 생성 실패: {e}")
+        return None
+
+
+def _run_section(key: str, item: Dict[str, Any], gen_filter, type_filter) -> str:
+    try:
+        section = _generate_section(item, gen_filter, type_filter)
+        if section:
+            with _lock:
+                _section_cache[key] = section
+                while len(_section_cache) > SECTION_CACHE_SIZE:
+                    _section_cache.popitem(last=False)
+            return section
+        return fallback_section(item)
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def section_future(item: Dict[str, Any], gen_filter=None, type_filter=None) -> Future:
+    """
+    섹션 HTML Future. 캐시에 있으면 바로 완료된 Future,
+    같은 키를 이미 만들고 있으면 그 Future를 같이 기다린다 (중복 생성 없음).
+    """
+    item = prepare_analysis(item)
+    key = section_key(item, gen_filter, type_filter)
+    with _lock:
+        cached = _section_cache.get(key)
+        if cached is not None:
+            _section_cache.move_to_end(key)
+            done: Future = Future()
+            done.set_result(cached)
+        else:
+            done = _inflight.get(key)
+    record_cache("report_section", cached is not None)
+    if done is not None:
+        return done
+
+    with _lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _section_pool.submit(_run_section, key, item, gen_filter, type_filter)
+            _inflight[key] = future
+    return future
+
+
+def prefetch_section(item: Dict[str, Any], gen_filter=None, type_filter=None) -> None:
+    """결과가 도착했을 때 현재 필터 기준 섹션을 백그라운드로 미리 생성 (필터는 데이터에 직접 적용)"""
+    if PREFETCH_SECTIONS and item:
+        section_future(apply_report_filters([item], gen_filter, type_filter)[0], gen_filter, type_filter)
+
+
+def collect_sections(items: List[Dict[str, Any]], gen_filter=None, type_filter=None) -> List[Future]:
+    """질문별 섹션 Future 목록 (캐시에 없는 것만 병렬로 생성)"""
+    return [section_future(item, gen_filter, type_filter) for item in items]
+
+
+def sections_html(futures: List[Future]) -> str:
+    return "\n".join(f.result() for f in futures)
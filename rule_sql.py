@@ -0,0 +1,379 @@
+# rule_sql.py
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from db import get_db
+from utils import TYPE_MAP_KO_TO_EN, TYPES, schema_description
+
+# ------------------------------------------------
+# 0. 규칙 기반 SQL 변환 (LLM 호출 없이 바로 SQL 생성)
+# ------------------------------------------------
+# 자주 들어오는 정형화된 질문 모양만 처리하고, 나머지는 None을 돌려서 LLM으로 넘긴다.
+#   1) "X 타입 포켓몬 중 speed가 가장 빠른 N마리"   → top_n
+#   2) "X 타입 포켓몬의 평균 공격력"                 → avg_stat
+#   3) "A가 B를 공격하면?"                          → matchup
+
+
+# ------------------------------------------------
+# 1. 어휘 사전
+# ------------------------------------------------
+# 스탯 컬럼 별칭 (schema_description 에 실제로 있는 컬럼만 사용)
+_STAT_ALIASES = {
+    "hp": ["hp", "체력", "에이치피"],
+    "attack": ["attack", "공격력", "공격"],
+    "defense": ["defense", "방어력", "방어"],
+    "sp_atk": ["sp_atk", "특수공격", "특수공격력", "특공"],
+    "sp_def": ["sp_def", "특수방어", "특수방어력", "특방"],
+    "speed": ["speed", "스피드", "속도"],
+    "total": ["total", "총합", "종족값", "총능력치", "능력치합"],
+}
+
+STAT_KO_LABEL = {
+    "hp": "체력(hp)",
+    "attack": "공격력(attack)",
+    "defense": "방어력(defense)",
+    "sp_atk": "특수공격(sp_atk)",
+    "sp_def": "특수방어(sp_def)",
+    "speed": "스피드(speed)",
+    "total": "종족값 총합(total)",
+}
+
+TYPE_EN_TO_KO = {en: ko for ko, en in TYPE_MAP_KO_TO_EN.items()}
+
+# 가장 ~한 : 정렬 방향 (+ 스탯이 생략됐을 때 암시하는 스탯)
+_DIRECTION_WORDS = {
+    "높은": ("DESC", None), "큰": ("DESC", None), "강한": ("DESC", None),
+    "많은": ("DESC", None), "센": ("DESC", None), "좋은": ("DESC", None),
+    "빠른": ("DESC", "speed"),
+    "낮은": ("ASC", None), "작은": ("ASC", None), "약한": ("ASC", None),
+    "적은": ("ASC", None), "나쁜": ("ASC", None),
+    "느린": ("ASC", "speed"),
+}
+
+_KO_NUMERALS = {
+    "한": 1, "두": 2, "세": 3, "네": 4, "다섯": 5,
+    "여섯": 6, "일곱": 7, "여덟": 8, "아홉": 9, "열": 10,
+}
+
+# 의미 없이 붙는 말 (동사/어미/차트 요청 등) — 이외의 단어가 있으면 규칙 매칭을 포기한다
+_FILLER_WORDS = {
+    "알려줘", "알려", "줘", "보여줘", "보여", "알려주세요", "보여주세요", "주세요",
+    "뭐야", "누구야", "얼마야", "어때", "구해줘", "찾아줘", "뭐지", "뭔가요", "인가요",
+    "좀", "값", "수치", "능력치", "스탯", "결과", "순위", "순서", "순서로", "순으로",
+    "목록", "리스트", "있어", "궁금해", "는", "은", "를", "을", "가", "이",
+    "그래프", "그래프로", "막대그래프", "막대그래프로", "시각화", "시각화해줘", "그려줘",
+    "그려", "으로", "로", "해줘", "같이", "함께", "중", "중에", "중에서", "에서",
+}
+
+# 이전 대화를 참조하는 질문은 규칙으로 처리하지 않는다
+_CONTEXT_WORDS = ("그중", "그 중", "이중", "이 중", "위에서", "방금", "아까", "이전", "앞에서", "거기")
+
+_PARTICLES = (
+    "중에서", "에서", "들의", "들을", "들은", "들이", "들", "의",
+    "은", "는", "이", "가", "을", "를", "중",
+)
+
+
+@lru_cache(maxsize=1)
+def _schema_columns() -> frozenset:
+    """schema_description 의 pokemon 섹션에 나열된 컬럼명"""
+    section = schema_description.split("2) UserData")[0]
+    return frozenset(re.findall(r"^- (\w+)", section, flags=re.MULTILINE))
+
+
+@lru_cache(maxsize=1)
+def _stat_lookup() -> Dict[str, str]:
+    columns = _schema_columns()
+    lookup = {}
+    for col, aliases in _STAT_ALIASES.items():
+        if col not in columns:
+            continue
+        for alias in aliases:
+            lookup[alias] = col
+    return lookup
+
+
+@lru_cache(maxsize=1)
+def _type_lookup() -> Dict[str, str]:
+    lookup = {ko: en for ko, en in TYPE_MAP_KO_TO_EN.items()}
+    lookup.update({en.lower(): en for en in TYPES})
+    return lookup
+
+
+_names_lock = threading.Lock()
+_pokemon_names: Optional[frozenset] = None
+
+
+def get_pokemon_names() -> frozenset:
+    """pokemon 테이블의 이름 목록 (프로세스당 한 번만 로드)"""
+    global _pokemon_names
+    with _names_lock:
+        if _pokemon_names is None:
+            try:
+                rows = get_db().reader().execute(
+                    "SELECT name FROM pokemon WHERE name IS NOT NULL"
+                ).fetchall()
+                _pokemon_names = frozenset(r[0] for r in rows)
+            except Exception as e:
+                print(f"⚠️ 포켓몬 이름 목록 로드 실패: {e}")
+                return frozenset()
+    return _pokemon_names
+
+
+# ------------------------------------------------
+# 2. 토큰 해석
+# ------------------------------------------------
+def _normalize(question: str) -> str:
+    q = unicodedata.normalize("NFKC", question).strip().lower()
+    q = re.sub(r"[?？!！.。~…,]+", " ", q)
+    return re.sub(r"\s+", " ", q).strip()
+
+
+def _strip_particle(token: str) -> str:
+    for p in _PARTICLES:
+        if token.endswith(p) and len(token) > len(p):
+            return token[: -len(p)]
+    return token
+
+
+def _candidates(token: str) -> List[str]:
+    """토큰 자체와 조사를 한 번/두 번 뗀 형태"""
+    out = [token]
+    once = _strip_particle(token)
+    if once != token:
+        out.append(once)
+        twice = _strip_particle(once)
+        if twice != once:
+            out.append(twice)
+    return out
+
+
+def _parse_count(token: str) -> Optional[int]:
+    m = re.fullmatch(r"(?:top|상위)?(\d+)(?:마리|개|위|종)?(?:를|을|만)?", token)
+    if m:
+        return int(m.group(1))
+    m = re.fullmatch(r"(한|두|세|네|다섯|여섯|일곱|여덟|아홉|열)(?:마리|개|종)(?:를|을|만)?", token)
+    if m:
+        return _KO_NUMERALS[m.group(1)]
+    return None
+
+
+def _scan_tokens(text: str) -> Optional[Dict[str, Any]]:
+    """
+    질문을 토큰 단위로 해석한다.
+    사전에 없는 단어가 하나라도 있으면 None (→ LLM이 처리)
+    """
+    stats = _stat_lookup()
+    types = _type_lookup()
+    found: Dict[str, Any] = {"types": [], "stats": [], "plural": False}
+
+    tokens = text.split(" ")
+    # '전기타입' 처럼 붙여 쓴 경우 분리
+    expanded = []
+    for tok in tokens:
+        m = re.fullmatch(r"(.+?)(타입|속성)(.*)", tok)
+        if m and m.group(1):
+            expanded.extend([m.group(1), m.group(2) + m.group(3)])
+        else:
+            expanded.append(tok)
+
+    for tok in expanded:
+        if not tok:
+            continue
+        count = _parse_count(tok)
+        if count is not None:
+            found["count"] = count
+            continue
+
+        matched = False
+        for cand in _candidates(tok):
+            if cand in ("타입", "속성"):
+                found["has_type_word"] = True
+            elif cand == "포켓몬":
+                found["has_pokemon_word"] = True
+                found["plural"] = found["plural"] or tok.startswith("포켓몬들")
+            elif cand == "가장":
+                found["superlative"] = True
+            elif cand == "평균":
+                found["average"] = True
+            elif cand in ("상위", "top"):
+                found["superlative"] = True
+            elif cand in types:
+                found["types"].append(types[cand])
+            elif cand in stats:
+                found["stats"].append(stats[cand])
+            elif cand in _DIRECTION_WORDS:
+                found["direction"] = _DIRECTION_WORDS[cand]
+            elif cand in _FILLER_WORDS:
+                pass
+            else:
+                continue
+            matched = True
+            break
+
+        if not matched:
+            return None
+
+    return found
+
+
+# ------------------------------------------------
+# 3. 질문 모양별 SQL 생성
+# ------------------------------------------------
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _build_top_n(ptype: str, stat: str, order: str, limit: int) -> Dict[str, Any]:
+    sql = (
+        f"SELECT dexnum, name, type1, type2, {stat}\n"
+        f"FROM pokemon\n"
+        f"WHERE type1 = {_sql_literal(ptype)} OR type2 = {_sql_literal(ptype)}\n"
+        f"ORDER BY {stat} {order}, dexnum\n"
+        f"LIMIT {limit}"
+    )
+    which = "높은" if order == "DESC" else "낮은"
+    explanation = (
+        f"호오~ {TYPE_EN_TO_KO.get(ptype, ptype)} 타입 포켓몬들 가운데 "
+        f"{STAT_KO_LABEL[stat]}이 가장 {which} 순서로 {limit}마리를 골라보았네! "
+        f"type1이나 type2 중 하나라도 {ptype} 이면 후보에 넣었지."
+    )
+    return {
+        "sql": sql,
+        "explanation_ko": explanation,
+        "intent": {"kind": "top_n", "type": ptype, "stat": stat, "order": order, "limit": limit},
+    }
+
+
+def _build_avg_stat(ptype: str, stat: str) -> Dict[str, Any]:
+    # 미리 계산된 요약 테이블에서 한 행만 읽는다 (aggregates.type_stat_summary)
+    sql = (
+        f"SELECT type, pokemon_count, ROUND(mean, 2) AS avg_{stat}\n"
+        f"FROM type_stat_summary\n"
+        f"WHERE type = {_sql_literal(ptype)} AND stat = {_sql_literal(stat)}"
+    )
+    explanation = (
+        f"{TYPE_EN_TO_KO.get(ptype, ptype)} 타입 포켓몬들의 {STAT_KO_LABEL[stat]} 평균을 "
+        f"계산해 보았네. 몇 마리가 집계됐는지도 함께 보여주지, 흥미로운 결과라네!"
+    )
+    return {
+        "sql": sql,
+        "explanation_ko": explanation,
+        "intent": {"kind": "avg_stat", "type": ptype, "stat": stat},
+    }
+
+
+def _build_matchup(attacker: str, defender: str) -> Dict[str, Any]:
+    sql = (
+        "SELECT atk.name AS attacker, atk.type1 AS attack_type,\n"
+        "       def.dexnum, def.name AS defender, def.type1 AS defender_type1, def.type2 AS defender_type2,\n"
+        "       COALESCE(d.multiplier, 1.0) AS total_multiplier\n"
+        "FROM pokemon AS atk\n"
+        f"JOIN pokemon AS def ON def.name = {_sql_literal(defender)}\n"
+        "LEFT JOIN dual_type_effectiveness AS d\n"
+        "       ON d.attacking_type = atk.type1 AND d.type1 = def.type1 AND d.type2 = COALESCE(def.type2, '')\n"
+        f"WHERE atk.name = {_sql_literal(attacker)}"
+    )
+    explanation = (
+        f"호오? {attacker}가 {defender}를 공격하면 어떻게 될지 궁금한 게로군! "
+        f"{attacker}의 첫 번째 타입으로 공격한다고 보고, {defender}의 type1과 type2에 대한 "
+        f"상성 배율을 각각 구해 곱한 최종 배율(total_multiplier)을 계산했네."
+    )
+    return {
+        "sql": sql,
+        "explanation_ko": explanation,
+        "intent": {"kind": "matchup", "attacker": attacker, "defender": defender},
+    }
+
+
+_MATCHUP_RE = re.compile(r"^(?P<a>\S+?)\s+(?P<b>\S+?)\s*공격\s*(?P<rest>.*)$")
+_MATCHUP_TAIL = re.compile(r"^(하면|할 때|할때|했을 때|했을때)?\s*(어떻게 돼|어떻게 되나|어때|데미지는|배율은|효과는)?\s*$")
+
+
+def _resolve_name(token: str, particles: Tuple[str, ...]) -> Optional[str]:
+    names = get_pokemon_names()
+    for p in particles:
+        if token.endswith(p) and token[: -len(p)] in names:
+            return token[: -len(p)]
+    return None
+
+
+def _match_matchup(text: str) -> Optional[Dict[str, Any]]:
+    m = _MATCHUP_RE.match(text)
+    if not m or not _MATCHUP_TAIL.match(m.group("rest")):
+        return None
+    attacker = _resolve_name(m.group("a"), ("가", "이"))
+    defender = _resolve_name(m.group("b"), ("를", "을"))
+    if not attacker or not defender:
+        return None
+    return _build_matchup(attacker, defender)
+
+
+def _match_stat_question(found: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if len(found["types"]) != 1 or not found.get("has_type_word"):
+        return None
+    ptype = found["types"][0]
+    stats = list(dict.fromkeys(found["stats"]))
+
+    direction = found.get("direction")
+    if direction and not stats and direction[1]:
+        stats = [direction[1]]
+    if len(stats) != 1:
+        return None
+    stat = stats[0]
+
+    if found.get("average") and not found.get("superlative"):
+        return _build_avg_stat(ptype, stat)
+
+    if found.get("superlative") and not found.get("average"):
+        order = direction[0] if direction else "DESC"
+        limit = found.get("count") or (10 if found["plural"] else 1)
+        return _build_top_n(ptype, stat, order, min(limit, 100))
+
+    return None
+
+
+# ------------------------------------------------
+# 4. 진입점 + 커버리지 통계
+# ------------------------------------------------
+_stats_lock = threading.Lock()
+_coverage = {"hits": 0, "misses": 0}
+
+
+def rule_based_sql(question: str) -> Optional[Dict[str, Any]]:
+    """
+    정형화된 질문이면 {"sql", "explanation_ko", "intent"} 를 바로 반환,
+    아니면 None (LLM 경로로 넘어감)
+    """
+    result = None
+    text = _normalize(question or "")
+
+    if text and not any(w in text for w in _CONTEXT_WORDS):
+        if "공격" in text:
+            result = _match_matchup(text)
+        if result is None:
+            found = _scan_tokens(text)
+            if found is not None:
+                result = _match_stat_question(found)
+
+    with _stats_lock:
+        _coverage["hits" if result else "misses"] += 1
+
+    if result:
+        result["source"] = "rule"
+    return result
+
+
+def coverage_stats() -> Dict[str, Any]:
+    """규칙 기반 경로가 처리한 질문 비율"""
+    with _stats_lock:
+        hits, misses = _coverage["hits"], _coverage["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "coverage": (hits / total) if total else 0.0,
+    }
@@ -0,0 +1,128 @@
+# session_store.py
+import io
+import pickle
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from pipeline import render_turn
+from report_prompt import prepare_analysis, summarize_frame
+
+# 큰 결과는 Parquet(zstd, pyarrow 가 있을 때), 작은 결과는 zlib 으로 압축한 pickle 로 보관.
+# Parquet은 스키마/메타데이터 고정 비용이 있어서 수십 행짜리 미리보기는 zlib-pickle 쪽이 몇 배 작다.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+PARQUET_MIN_ROWS = 500
+PARQUET_COMPRESSION = "zstd"
+ZLIB_LEVEL = 6
+
+
+# ------------------------------------------------
+# 1. DataFrame ↔ 압축 바이트
+# ------------------------------------------------
+def pack_frame(df: pd.DataFrame) -> Tuple[str, bytes]:
+    """(포맷, 바이트). Parquet으로 못 쓰는 컬럼(섞인 타입 등)이 있으면 zlib-pickle 로 대체"""
+    if HAS_ARROW and len(df) >= PARQUET_MIN_ROWS:
+        try:
+            # pandas 메타데이터(수 KB)는 빼고 컬럼 데이터만 저장
+            table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+            buf = io.BytesIO()
+            pq.write_table(table, buf, compression=PARQUET_COMPRESSION)
+            return "parquet", buf.getvalue()
+        except Exception:
+            pass
+    return "zpickle", zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL), ZLIB_LEVEL)
+
+
+def unpack_frame(fmt: str, data: bytes) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pq.read_table(io.BytesIO(data)).to_pandas()
+    return pickle.loads(zlib.decompress(data))
+
+
+# ------------------------------------------------
+# 2. 세션별 분석 결과 저장소
+# ------------------------------------------------
+class AnalysisStore:
+    """
+    st.session_state.analysis_results 자리에 들어가는 압축 저장소.
+    pipeline.analysis_summary 결과를 받아 DataFrame은 압축 바이트로, 나머지는 작은 dict로 보관한다.
+    리포트 프롬프트용 본문/요약/토큰 수도 결과가 들어올 때 한 번만 계산해 둔다.
+    순회하면 기존과 같은 {"question", "df", "total_rows", ...} dict를 돌려줘서
+    generate_final_report 등은 그대로 쓸 수 있다.
+    """
+
+    def __init__(self):
+        self._entries: List[Dict[str, Any]] = []
+
+    def append(self, item: Dict[str, Any]) -> None:
+        df = item["df"]
+        fmt, data = pack_frame(df)
+        prepared = prepare_analysis({**item, "stats": summarize_frame(df)})
+        entry = {k: v for k, v in prepared.items() if k != "df"}
+        entry.update({
+            "format": fmt,
+            "data": data,
+            "rows": len(df),
+            "columns": [str(c) for c in df.columns],
+        })
+        self._entries.append(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for entry in self._entries:
+            item = {k: v for k, v in entry.items() if k not in ("format", "data")}
+            item["df"] = unpack_frame(entry["format"], entry["data"])
+            yield item
+
+    def digests(self) -> List[Dict[str, Any]]:
+        """DataFrame을 풀지 않은 항목들 (미리 계산한 본문/요약만으로 리포트 프롬프트를 만들 때)"""
+        return [{k: v for k, v in e.items() if k not in ("format", "data")} for e in self._entries]
+
+    def last(self) -> Optional[Dict[str, Any]]:
+        """가장 최근 항목 (리포트 필터를 걸 수 있도록 DataFrame 포함)"""
+        if not self._entries:
+            return None
+        entry = self._entries[-1]
+        item = {k: v for k, v in entry.items() if k not in ("format", "data")}
+        item["df"] = unpack_frame(entry["format"], entry["data"])
+        return item
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def nbytes(self) -> int:
+        """압축된 결과 바이트 합계"""
+        return sum(len(e["data"]) for e in self._entries)
+
+
+# ------------------------------------------------
+# 3. 채팅 메시지 (렌더링된 HTML 대신 참조만 저장)
+# ------------------------------------------------
+def assistant_message(result: Dict[str, Any], prefix: str = "", suffix: str = "") -> Dict[str, Any]:
+    """
+    run_turn 결과를 세션에 남길 메시지로.
+    base64 차트/이미지가 들어간 content 대신 parts(차트 payload, dexnum 목록 등)만 저장한다.
+    """
+    return {
+        "role": "assistant",
+        "parts": result["parts"],
+        "prefix": prefix,
+        "suffix": suffix,
+        "chart_data": result.get("chart_data"),
+    }
+
+
+def render_message(message: Dict[str, Any]) -> str:
+    """세션 메시지를 화면용 마크다운으로 (assistant 메시지는 parts 로 다시 그림)"""
+    if "parts" not in message:
+        return message["content"]
+    return message.get("prefix", "") + render_turn(message["parts"]) + message.get("suffix", "")
@@ -0,0 +1,74 @@
+# test_llm_client.py
+"""
+공유 스트림: 한 번도 읽지 않고 버린 소비자도 소비자 수에서 빠져서
+원본 스트림이 닫히고, 같은 요청이 버려진 스트림에 붙지 않는지 확인.
+
+실행:  python -m pytest -q
+"""
+import gc
+import threading
+import time
+from types import SimpleNamespace
+
+from llm_client import RateLimiter, SharedLLMClient
+
+REQUEST = {"model": "test", "messages": [{"role": "user", "content": "hi"}], "stream": True}
+
+
+class SlowStream:
+    """청크를 천천히 내보내는 가짜 OpenAI 스트림 (close 되면 멈춤)"""
+
+    def __init__(self, chunks=50, delay=0.02):
+        self.remaining = chunks
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed.is_set() or self.remaining == 0:
+            raise StopIteration
+        time.sleep(self.delay)
+        self.remaining -= 1
+        return self.remaining
+
+    def close(self):
+        self.closed.set()
+
+
+def make_client():
+    client = SharedLLMClient("test-key", RateLimiter(0))
+    streams = []
+
+    def create(**kwargs):
+        streams.append(SlowStream())
+        return streams[-1]
+
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client, streams
+
+
+def test_unread_consumer_cancels_upstream():
+    client, streams = make_client()
+    consumer = client.chat.completions.create(**REQUEST)
+    del consumer
+    gc.collect()
+
+    deadline = time.perf_counter() + 2
+    while not streams and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert streams and streams[0].closed.wait(2)
+
+    # 같은 요청은 취소된 스트림에 붙지 않고 새로 호출한다
+    again = client.chat.completions.create(**REQUEST)
+    assert len(list(again)) == 50
+    assert len(streams) == 2
+
+
+def test_concurrent_consumers_share_one_call():
+    client, streams = make_client()
+    first = client.chat.completions.create(**REQUEST)
+    second = client.chat.completions.create(**REQUEST)
+    assert list(first) == list(second) == list(range(49, -1, -1))
+    assert len(streams) == 1
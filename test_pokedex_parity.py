@@ -0,0 +1,46 @@
+# test_pokedex_parity.py
+"""
+rule_sql 이 만든 SQL 을 SQLite 로 실행한 결과와
+메모리 Pokédex(get_pokedex().answer)가 같은 intent 로 계산한 결과가 같은지 확인.
+
+실행:  pip install -r requirements-dev.txt && python -m pytest -q
+"""
+import pandas as pd
+import pytest
+
+from db import get_db
+from pokedex import get_pokedex
+from rule_sql import rule_based_sql
+
+QUESTIONS = [
+    # top_n
+    ("전기 타입 포켓몬 중 speed가 가장 빠른 5마리", "top_n"),
+    ("노말 타입 포켓몬 중 체력이 가장 낮은 3마리", "top_n"),
+    ("강철 타입 포켓몬 중 방어력이 가장 높은 포켓몬", "top_n"),
+    ("물 타입 포켓몬 중 특수공격이 가장 높은 20마리", "top_n"),
+    # avg_stat
+    ("불꽃 타입 포켓몬의 평균 공격력은?", "avg_stat"),
+    ("물 타입 포켓몬의 평균 스피드", "avg_stat"),
+    ("드래곤 타입 포켓몬의 평균 특방", "avg_stat"),
+    # matchup
+    ("피카츄가 갸라도스를 공격하면?", "matchup"),
+    ("리자몽이 이상해씨를 공격하면 효과는?", "matchup"),
+]
+
+
+@pytest.mark.parametrize("question,kind", QUESTIONS)
+def test_pokedex_matches_sqlite(question, kind):
+    rule = rule_based_sql(question)
+    assert rule is not None, f"규칙 기반으로 처리되지 않음: {question}"
+    assert rule["intent"]["kind"] == kind
+
+    expected = get_db().read_df(rule["sql"])
+    actual = get_pokedex().answer(rule["intent"])
+
+    assert actual is not None
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True),
+        expected.reset_index(drop=True),
+        check_dtype=False,
+    )
@@ -0,0 +1,32 @@
+# test_read_bounded.py
+"""
+db.read_bounded 가 LLM 이 흔히 만드는 SQL 모양(앞뒤 주석, 끝의 ;)을 그대로 실행하는지,
+SQL 문이 여러 개면 실행하지 않는지 확인.
+
+실행:  python -m pytest -q
+"""
+import pytest
+
+from db import get_db
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM pokemon LIMIT 2;  -- top",
+    "SELECT name FROM pokemon LIMIT 2 -- top\n;",
+    "-- 상위 2마리\nSELECT name FROM pokemon LIMIT 2; /* 끝 */ ;\n",
+    "SELECT name FROM pokemon WHERE name <> 'a;b' LIMIT 2;",
+])
+def test_trailing_semicolon_and_comments(sql):
+    bounded = get_db().read_bounded(sql, max_rows=1)
+    assert list(bounded["df"].columns) == ["name"]
+    assert len(bounded["df"]) == 1
+    assert bounded["truncated"] and bounded["total_rows"] == 2
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT name FROM pokemon LIMIT 2; SELECT 1",
+    "SELECT 1; -- 주석\nDELETE FROM pokemon",
+])
+def test_multiple_statements_rejected(sql):
+    with pytest.raises(ValueError):
+        get_db().read_bounded(sql)
@@ -0,0 +1,71 @@
+# test_report_filters.py
+"""
+최종 리포트 필터가 잘린 결과의 SQL 을 필요한 만큼만 다시 실행하는지 확인.
+(리포트 한 번에 포켓몬 단위 결과는 한 번, 타입별 평균처럼 필터를 걸 수 없는 결과는 0번)
+
+실행:  python -m pytest -q
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import report_prompt
+import utils
+from db import get_db
+
+
+class CountingDB:
+    """read_bounded 호출 수를 세는 get_db() 대역 (실제 조회는 진짜 DB 로)"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def read_bounded(self, sql, **kwargs):
+        self.calls += 1
+        return get_db().read_bounded(sql, **kwargs)
+
+
+def fake_client(text):
+    chunk = SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+    create = lambda **kwargs: iter([chunk])
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def truncated_item(question, sql):
+    df = get_db().read_df(sql)
+    return {"question": question, "sql": sql, "df": df.head(50), "total_rows": len(df), "truncated": True}
+
+
+@pytest.fixture
+def counting_db(monkeypatch):
+    db = CountingDB()
+    monkeypatch.setattr(report_prompt, "get_db", lambda: db)
+    monkeypatch.setattr(utils, "get_openai_client", lambda: fake_client(f"<h2>요약</h2>{utils.SECTIONS_MARKER}"))
+    monkeypatch.setattr(utils, "collect_sections", lambda items, gen_filter=None, type_filter=None: [])
+    return db
+
+
+def test_unfilterable_result_is_not_requeried(counting_db):
+    item = truncated_item(
+        "타입 조합별 평균 공격력",
+        "SELECT type1, type2, AVG(attack) AS avg_attack FROM pokemon GROUP BY type1, type2",
+    )
+    assert len(item["df"]) < item["total_rows"]
+    assert "dexnum" not in item["df"].columns and "name" not in item["df"].columns
+
+    utils.generate_final_report([item], gen_filter=1, type_filter=["Fire"])
+    assert counting_db.calls == 0
+
+
+def test_filterable_result_is_requeried_once(counting_db):
+    item = truncated_item("모든 포켓몬", "SELECT dexnum, name, attack FROM pokemon")
+
+    utils.generate_final_report([item], gen_filter=1, type_filter=None)
+    assert counting_db.calls == 1
+
+    items = utils.report_items([item], gen_filter=1)
+    assert counting_db.calls == 2
+    assert items[0]["filter_applied"] and not items[0]["sample"]
+    # 이미 거른 항목은 다시 걸러도 SQL 을 실행하지 않음
+    report_prompt.apply_report_filters(items, gen_filter=1)
+    assert counting_db.calls == 2
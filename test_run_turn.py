@@ -0,0 +1,99 @@
+# test_run_turn.py
+"""
+run_turn 이 LLM 스트리밍 중에 미리 시작한 쿼리를
+최종 SQL 과 다를 때 / SQL 이 없을 때 중단시키고, 실제로 쓴 경우에만 sql 시간으로 기록하는지 확인.
+
+실행:  python -m pytest -q
+"""
+import time
+
+import pytest
+
+import pipeline
+from db import QueryCancelled
+
+# 시간 예산(QUERY_TIME_BUDGET_S)까지 끝나지 않는 쿼리
+ENDLESS_SQL = "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) SELECT x FROM c WHERE x < 0"
+FINAL_SQL = "SELECT dexnum, name FROM pokemon ORDER BY dexnum LIMIT 3"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """execute_query 호출별 (sql, 결과 또는 예외, 끝난 시각) 기록"""
+    records = []
+    real = pipeline.execute_query
+
+    def recording(sql, intent=None, cancel=None):
+        try:
+            out = real(sql, intent, cancel=cancel)
+            records.append((sql, "ok", time.perf_counter()))
+            return out
+        except Exception as e:
+            records.append((sql, e, time.perf_counter()))
+            raise
+
+    monkeypatch.setattr(pipeline, "execute_query", recording)
+    return records
+
+
+def fake_stream(*events):
+    """nl_to_sql_stream 대역. 미리 시작한 쿼리가 실제로 실행 중이 되도록 이벤트 사이에 잠깐 쉰다"""
+    def stream(question, chat_history=None):
+        for event in events:
+            yield event
+            time.sleep(0.2)
+    return stream
+
+
+def wait_for(records, sql, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        for record in records:
+            if record[0] == sql:
+                return record
+        time.sleep(0.01)
+    return None
+
+
+def test_mismatched_early_query_is_cancelled(monkeypatch, calls):
+    monkeypatch.setattr(pipeline, "nl_to_sql_stream", fake_stream(
+        ("sql", ENDLESS_SQL),
+        ("done", {"sql": FINAL_SQL, "explanation_ko": "설명"}),
+    ))
+    started = time.perf_counter()
+    result = pipeline.run_turn("질문")
+
+    assert result["sql"] == FINAL_SQL
+    assert len(result["df"]) == 3
+    early = wait_for(calls, ENDLESS_SQL)
+    assert early is not None and isinstance(early[1], QueryCancelled)
+    assert early[2] - started < 1.0
+    # 버린 쿼리의 시간은 기록하지 않음
+    assert result["timings"]["sql"] < 1.0
+
+
+def test_early_query_cancelled_when_stream_has_no_sql(monkeypatch, calls):
+    monkeypatch.setattr(pipeline, "nl_to_sql_stream", fake_stream(
+        ("sql", ENDLESS_SQL),
+        ("done", {"sql": None, "explanation_ko": "LLM 오류"}),
+    ))
+    started = time.perf_counter()
+    result = pipeline.run_turn("질문")
+
+    assert result["df"] is None
+    assert "sql" not in result["timings"]
+    early = wait_for(calls, ENDLESS_SQL)
+    assert early is not None and isinstance(early[1], QueryCancelled)
+    assert early[2] - started < 1.0
+
+
+def test_matching_early_query_is_used(monkeypatch, calls):
+    monkeypatch.setattr(pipeline, "nl_to_sql_stream", fake_stream(
+        ("sql", FINAL_SQL),
+        ("done", {"sql": FINAL_SQL, "explanation_ko": "설명"}),
+    ))
+    result = pipeline.run_turn("질문")
+
+    assert [sql for sql, *_ in calls] == [FINAL_SQL]
+    assert len(result["df"]) == 3
+    assert "sql" in result["timings"]
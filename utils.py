@@ -5,13 +5,27 @@ import textwrap
 import os
 import io
 import base64
-import matplotlib.pyplot as plt
+import hashlib
+import threading
+import time
 import matplotlib as mpl
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from pathlib import Path
 import base64
 from matplotlib import font_manager as fm
-from openai import OpenAI
-from typing import Dict, Any, List, Optional, Tuple # Tuple 타입 추가
+from llm_client import SharedLLMClient, get_shared_client
+import re
+from typing import Dict, Any, Iterator, List, Optional, Tuple # Tuple 타입 추가
+from llm_cache import get_nl_sql_cache, make_cache_key, prompt_fingerprint
+from report_prompt import apply_report_filters, build_analyses_block, dedupe_analyses
+from report_sections import SECTIONS_MARKER, collect_sections, sections_html
+from assets import sprite_html
+from aggregates import refresh_user_team_summary
+from metrics import timer, timed, observe_seconds, record_cache, record_usage
 
 # app.py / utils.py 가 있는 폴더 기준
 BASE_DIR = Path(__file__).resolve().parent
@@ -23,7 +37,8 @@ POKEMON_IMG_DIR = BASE_DIR / "data" / "pokemon_jpg"
 # ------------------------------------------------
 # __file__이 항상 존재한다고 가정하고 경로 설정
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "MyPocket.sqlite")
+# DB 경로와 커넥션은 db.py 의 공용 커넥션 관리자가 담당
+from db import DB_PATH, get_db
 
 # ------------------------------------------------
 # 1. Matplotlib 한글 폰트 설정
@@ -44,6 +59,8 @@ else:
     print(f"⚠️ 폰트 파일 없음: {FONT_PATH}")
 
 mpl.rcParams["axes.unicode_minus"] = False
+# SVG 차트는 글자를 path로 바꾸지 않고 텍스트로 넣어서 크기를 줄인다
+mpl.rcParams["svg.fonttype"] = "none"
 
 
 # ------------------------------------------------
@@ -101,6 +118,23 @@ schema_description = textwrap.dedent("""
 
 4) type_effectiveness (자동 생성)
 - attacking_type, defending_type, multiplier (공격 타입이 방어 타입에게 주는 피해 배율)
+
+5) dual_type_effectiveness (자동 생성)
+- attacking_type, type1, type2, multiplier (공격 타입이 type1/type2 조합 포켓몬에게 주는 최종 배율)
+- 단일 타입은 type2 = '' (pokemon.type2 가 NULL 이면 COALESCE(type2, '') 로 비교)
+
+6) type_stat_summary (미리 계산된 타입별 스탯 요약, 타입 × 스탯마다 한 행)
+- type (type1 또는 type2 가 이 타입인 포켓몬 전체 기준), stat ('hp', 'attack', 'defense', 'sp_atk', 'sp_def', 'speed', 'total')
+- pokemon_count, mean, min, max, p25, median, p75, p90
+- max_dexnum, max_name (그 스탯이 가장 높은 포켓몬), min_dexnum, min_name (가장 낮은 포켓몬)
+
+7) generation_stat_summary (미리 계산된 세대별 스탯 요약, 세대 × 스탯마다 한 행)
+- generation, stat, 나머지 컬럼은 type_stat_summary 와 같음
+
+8) user_team_summary (미리 계산된 트레이너별 팀 요약, 유저마다 한 행)
+- user_id, username, team_size
+- avg_hp, avg_attack, avg_defense, avg_sp_atk, avg_sp_def, avg_speed, avg_total (팀 평균)
+- max_total, strongest_dexnum, strongest_name (팀에서 total 이 가장 높은 포켓몬)
 """) # type_effectiveness 스키마 추가
 
 # ------------------------------------------------
@@ -127,32 +161,31 @@ def normalize_type_literals(sql: str) -> str:
 # ------------------------------------------------
 # 4. LLM → SQL 변환 (OpenAI 클라이언트 및 API 키 관리 통합)
 # ------------------------------------------------
-def get_openai_client() -> Optional[OpenAI]:
-    """OpenAI 클라이언트를 생성하고 API 키 부재 시 None 반환"""
+LLM_MODEL = "gpt-4.1-mini"
+
+def get_openai_client() -> Optional[SharedLLMClient]:
+    """
+    프로세스 공용 OpenAI 클라이언트 (llm_client: 연결 재사용, 속도 제한, 재시도, 동일 요청 합치기).
+    API 키 부재 시 None 반환
+    (st.secrets 에 키가 없으면 OPENAI_API_KEY 환경변수 사용, OPENAI_BASE_URL 은 openai 라이브러리가 그대로 반영)
+    """
     try:
         import streamlit as st
         api_key = st.secrets.get("openai_key")
     except Exception:
-        api_key = os.environ.get("OPENAI_API_KEY")
+        api_key = None
+    api_key = api_key or os.environ.get("OPENAI_API_KEY")
 
     if not api_key:
         print("❌ OPENAI API 키가 설정되지 않았습니다.")
         return None
-    
-    return OpenAI(api_key=api_key)
 
+    return get_shared_client(api_key)
 
-def nl_to_sql(question: str, chat_history: Optional[List[str]] = None) -> Dict[str, Any]:
-    """자연어를 SQL 쿼리로 변환하고 설명 추가"""
-    client = get_openai_client()
-    if not client:
-        return {"sql": None, "explanation_ko": "❌ OPENAI API 키가 설정되지 않아 분석을 할 수 없네."}
 
-    history_block = ""
-    if chat_history:
-        history_block = "\n".join([f"- {q}" for q in chat_history])
-
-    system_prompt = f"""
+def build_nl_to_sql_system_prompt() -> str:
+    """nl_to_sql에서 사용하는 시스템 프롬프트 (스키마 설명 포함)"""
+    return f"""
 당신은 포켓몬 연구소의 데이터 분석을 담당하는 '포켓몬 박사 오박사'입니다.
 말투는 항상 오박사처럼 **친절하고 유쾌하며 약간 할아버지 느낌**으로 유지합니다.
 예) "~하네", "~이지", "~일세", "호오?", "흥미로운 결과라네!", "자네도 한번 확인해보겠나?"
@@ -175,7 +208,11 @@ def nl_to_sql(question: str, chat_history: Optional[List[str]] = None) -> Dict[s
      WHERE 조건에서도 반드시 그 **한국어 이름 그대로** 사용해야 합니다.
    - 'Pikachu', 'Raichu'처럼 영어 이름으로 바꾸지 마세요.
 6. 포켓몬을 조회하는 SELECT 문에서는 가능하면 항상 dexnum도 함께 SELECT에 포함하세요. 
-7. **JSON 문자열만 출력**하며, 반드시 아래 형식만 반환합니다.
+7. 타입별/세대별 평균·최소·최대·중앙값이나 "타입별 가장 빠른 포켓몬", 트레이너별 팀 평균 같은 집계 질문은
+   pokemon 을 GROUP BY 하지 말고 type_stat_summary / generation_stat_summary / user_team_summary 를 조회하세요.
+   (예: SELECT type, mean AS avg_attack FROM type_stat_summary WHERE stat = 'attack' ORDER BY mean DESC)
+   단, type1 만 기준으로 묻거나 다른 조건이 붙은 집계는 pokemon 테이블에서 직접 계산합니다.
+8. **JSON 문자열만 출력**하며, 반드시 아래 형식만 반환합니다.
 
 [JSON Output Format]
 {{
@@ -202,21 +239,15 @@ pokemon 테이블의 type1, type2는 각각 포켓몬의 첫 번째 타입과 
 type2가 NULL이면 단일 타입 포켓몬입니다.
 
 [이중속성 계산 규칙 — 아주 중요]
-- 포켓몬이 이중속성(type1, type2)을 가질 경우:
-  - attacking_type → type1 에 대한 multiplier
-  - attacking_type → type2 에 대한 multiplier
-  이 두 값을 곱해서 최종 데미지 배율을 계산합니다.
-- type2가 NULL이거나 상성 정보가 없으면 multiplier는 1.0으로 간주합니다.
-- 최종 배율 공식:
-  COALESCE(type1_multiplier, 1.0) * COALESCE(type2_multiplier, 1.0)
+- 포켓몬이 이중속성(type1, type2)을 가질 경우 type1, type2 배율을 곱한 값이 최종 데미지 배율입니다.
+- dual_type_effectiveness 테이블에 (attacking_type, type1, type2) 조합별 최종 배율이 이미 계산되어 있습니다.
+- 단일 타입은 type2 = '' 로 저장되어 있으므로 pokemon.type2 는 COALESCE(p.type2, '') 로 비교합니다.
 
 [SQL 작성 규칙 — 상성 관련 질문일 때]
-- 반드시 type_effectiveness 테이블을 JOIN 해서 multiplier를 계산해야 합니다.
-- 이중속성일 경우:
-  - type1용 JOIN 1개
-  - type2용 JOIN 1개
-  총 2개의 LEFT JOIN을 사용하세요.
-- 최종 데미지 배율은 total_multiplier 같은 별칭(alias)로 계산해서 SELECT에 포함하세요.
+- type_effectiveness 를 두 번 JOIN 하지 말고, dual_type_effectiveness 를 한 번만 LEFT JOIN 하세요:
+  LEFT JOIN dual_type_effectiveness AS d
+         ON d.attacking_type = '공격타입' AND d.type1 = p.type1 AND d.type2 = COALESCE(p.type2, '')
+- 최종 데미지 배율은 COALESCE(d.multiplier, 1.0) AS total_multiplier 로 SELECT에 포함하세요.
 
 [포켓몬 vs 포켓몬 직접 전투 질의 처리 규칙]
 
@@ -230,11 +261,9 @@ type2가 NULL이면 단일 타입 포켓몬입니다.
 2. 공격 타입은 atk.type1을 기본으로 사용합니다.
    (별도로 기술 타입이 주어지지 않았다면, 공격자는 자신의 첫 번째 타입으로 공격한다고 가정합니다.)
 
-3. type_effectiveness 테이블을 사용하여
-   - atk.type1 → def.type1 에 대한 multiplier (e1)
-   - atk.type1 → def.type2 에 대한 multiplier (e2)
-   를 LEFT JOIN으로 얻고,
-   최종 배율은 COALESCE(e1.multiplier, 1.0) * COALESCE(e2.multiplier, 1.0) 으로 계산합니다.
+3. dual_type_effectiveness 테이블을 한 번 LEFT JOIN 하여
+   (d.attacking_type = atk.type1 AND d.type1 = def.type1 AND d.type2 = COALESCE(def.type2, ''))
+   최종 배율 COALESCE(d.multiplier, 1.0) 을 얻습니다.
 
 4. SELECT 절에는
    - 공격자 이름, 타입
@@ -244,51 +273,222 @@ type2가 NULL이면 단일 타입 포켓몬입니다.
 
 """
 
-    user_prompt = f"{history_block}\n[현재 질문]\n{question}"
+
+def _prepare_nl_to_sql(question: str, chat_history: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    LLM 호출 전 단계 (규칙 기반 경로 → 캐시 조회 → 프롬프트 준비).
+    {"result": 바로 쓸 결과 또는 None, ...LLM 호출에 필요한 값들} 반환
+    """
+    # 0. 규칙 기반 빠른 경로 (rule_sql 이 utils 를 import 하므로 여기서 import)
+    from rule_sql import rule_based_sql
+    rule_result = rule_based_sql(question)
+    record_cache("rule_sql", bool(rule_result))
+    if rule_result:
+        return {"result": rule_result}
+
+    system_prompt = build_nl_to_sql_system_prompt()
+
+    # 1. 캐시 조회 (프롬프트/스키마/모델이 바뀌면 지문이 달라져 자동 무효화)
+    fingerprint = prompt_fingerprint(LLM_MODEL, system_prompt)
+    cache = get_nl_sql_cache(fingerprint)
+    cache_key = make_cache_key(question, chat_history, fingerprint)
+    if cache:
+        cached = cache.get(cache_key)
+        record_cache("nl_sql", bool(cached))
+        if cached:
+            return {"result": cached}
+
+    history_block = ""
+    if chat_history:
+        history_block = "\n".join([f"- {q}" for q in chat_history])
+
+    return {
+        "result": None,
+        "cache": cache,
+        "cache_key": cache_key,
+        "fingerprint": fingerprint,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"{history_block}\n[현재 질문]\n{question}"},
+        ],
+    }
+
+
+def _finish_nl_to_sql(question: str, prep: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    if data.get("sql"):
+        # LLM이 한글 타입을 사용했을 경우를 대비하여 변환 로직 적용
+        data["sql"] = normalize_type_literals(data["sql"])
+        if prep["cache"]:
+            prep["cache"].put(prep["cache_key"], prep["fingerprint"], question, data)
+    return data
+
+
+def nl_to_sql(question: str, chat_history: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    자연어를 SQL 쿼리로 변환하고 설명 추가
+    - 정형화된 질문은 규칙 기반으로 바로 SQL 생성 (LLM 호출 없음)
+    - 동일/유사 질문은 캐시에서 바로 반환
+    """
+    prep = _prepare_nl_to_sql(question, chat_history)
+    if prep["result"]:
+        return prep["result"]
+
+    client = get_openai_client()
+    if not client:
+        return {"sql": None, "explanation_ko": "❌ OPENAI API 키가 설정되지 않아 분석을 할 수 없네."}
 
     try:
-        res = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.1,
-            response_format={"type": "json_object"} # JSON 형식 강제
-        )
+        with timer("llm_nl_to_sql"):
+            res = client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=prep["messages"],
+                temperature=0.1,
+                response_format={"type": "json_object"} # JSON 형식 강제
+            )
+        record_usage("nl_to_sql", getattr(res, "usage", None))
 
         raw = res.choices[0].message.content
         data = json.loads(raw)
+        return _finish_nl_to_sql(question, prep, data)
+
+    except Exception as e:
+        return {"sql": None, "explanation_ko": f"LLM 오류: {e}"}
+
 
+def _partial_json_string(buffer: str, field: str) -> Tuple[Optional[str], bool]:
+    """
+    아직 다 오지 않은 JSON 텍스트에서 문자열 필드 값을 읽는다.
+    (지금까지 디코딩 가능한 값, 닫는 따옴표까지 왔는지) 반환. 필드가 아직 없으면 (None, False)
+    """
+    m = re.search(r'"%s"\s*:\s*"' % re.escape(field), buffer)
+    if not m:
+        return None, False
+
+    i = m.end()
+    n = len(buffer)
+    complete = False
+    end = i
+    while end < n:
+        ch = buffer[end]
+        if ch == "\\":
+            # 이스케이프가 중간에 잘렸으면 거기까지만 디코딩
+            step = 6 if end + 1 < n and buffer[end + 1] == "u" else 2
+            if end + step > n:
+                break
+            end += step
+            continue
+        if ch == '"':
+            complete = True
+            break
+        end += 1
+
+    try:
+        value = json.loads('"' + buffer[i:end] + '"')
+    except json.JSONDecodeError:
+        return None, False
+    # 서로게이트 쌍(이모지 등)의 앞쪽 절반만 온 경우는 다음 조각을 기다린다
+    if not complete and value and "\ud800" <= value[-1] <= "\udbff":
+        value = value[:-1]
+    return value, complete
+
+
+def nl_to_sql_stream(question: str, chat_history: Optional[List[str]] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    nl_to_sql 의 스트리밍 버전. 아래 이벤트를 순서대로 yield 한다.
+      ("intent", intent)      : 규칙 기반 경로로 답한 경우만 (pokedex 메모리 스냅샷으로 바로 계산 가능)
+      ("sql", sql)            : JSON의 sql 필드가 완성되는 즉시 (설명 생성 전에 쿼리 실행 시작 가능)
+      ("explanation", 조각)   : explanation_ko 가 생성되는 대로
+      ("done", data)          : 최종 결과 (nl_to_sql 반환값과 동일한 형태)
+    """
+    prep = _prepare_nl_to_sql(question, chat_history)
+    if prep["result"]:
+        data = prep["result"]
+        if data.get("intent"):
+            yield "intent", data["intent"]
         if data.get("sql"):
-            # LLM이 한글 타입을 사용했을 경우를 대비하여 변환 로직 적용
-            data["sql"] = normalize_type_literals(data["sql"])
+            yield "sql", data["sql"]
+        yield "explanation", data.get("explanation_ko") or ""
+        yield "done", data
+        return
 
-        return data
+    client = get_openai_client()
+    if not client:
+        yield "done", {"sql": None, "explanation_ko": "❌ OPENAI API 키가 설정되지 않아 분석을 할 수 없네."}
+        return
+
+    try:
+        started = time.perf_counter()
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=prep["messages"],
+            temperature=0.1,
+            response_format={"type": "json_object"}, # JSON 형식 강제
+            stream=True,
+            stream_options={"include_usage": True}, # 마지막 청크에 usage 포함
+        )
+
+        buffer = ""
+        sql_sent = False
+        explanation_sent = 0
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_usage("nl_to_sql", chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            buffer += delta
+
+            if not sql_sent:
+                sql, done = _partial_json_string(buffer, "sql")
+                if done and sql:
+                    sql_sent = True
+                    observe_seconds("llm_nl_to_sql_first_sql", time.perf_counter() - started)
+                    yield "sql", normalize_type_literals(sql)
+
+            explanation, _ = _partial_json_string(buffer, "explanation_ko")
+            if explanation and len(explanation) > explanation_sent:
+                yield "explanation", explanation[explanation_sent:]
+                explanation_sent = len(explanation)
+
+        observe_seconds("llm_nl_to_sql", time.perf_counter() - started)
+        data = _finish_nl_to_sql(question, prep, json.loads(buffer))
+        if data.get("sql") and not sql_sent:
+            yield "sql", data["sql"]
+        yield "done", data
 
     except Exception as e:
-        return {"sql": None, "explanation_ko": f"LLM 오류: {e}"}
+        yield "done", {"sql": None, "explanation_ko": f"LLM 오류: {e}"}
 
 # ------------------------------------------------
 # 5. 자동 차트 생성 (스탯 컬럼 우선 선택 버전)
 # ------------------------------------------------
-def create_chart_base64(
+# pyplot 전역 상태 대신 Figure + Agg 캔버스를 직접 써서 세션(스레드)끼리 안전하게 동시 렌더링.
+# 같은 데이터/제목/형식의 차트는 캐시된 결과를 재사용한다.
+CHART_FORMATS = ("png", "svg")
+CHART_CACHE_SIZE = 128
+
+_chart_cache: "OrderedDict[str, str]" = OrderedDict()
+_chart_cache_lock = threading.Lock()
+_chart_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chart")
+
+
+def resolve_chart_columns(
     df: pd.DataFrame,
     x_col: str | None,
     y_col: str | None,
-    title: str
-) -> str:
-    """Pandas DataFrame을 기반으로 차트를 생성하고 Base64 이미지 태그 반환"""
-
+) -> Tuple[Optional[str], Optional[str]]:
+    """차트에 쓸 (x축, y축) 컬럼 결정. 그릴 수 없으면 (None, None)"""
     if df is None or df.empty:
-        return ""
+        return None, None
 
     # 🔹 1) 컬럼 타입별로 분리
     numeric_cols = df.select_dtypes(include="number").columns.tolist()
     cat_cols = df.select_dtypes(exclude="number").columns.tolist()
 
     if not numeric_cols or not cat_cols:
-        return ""
+        return None, None
 
     # 🔹 2) x축 보정: 없거나 이상하면 첫 번째 범주형 컬럼으로
     if (not x_col) or (x_col not in df.columns):
@@ -316,57 +516,126 @@ def create_chart_base64(
 
     # 그래도 y축이 이상하면 포기
     if y_col is None or not pd.api.types.is_numeric_dtype(df[y_col]):
-        return ""
+        return None, None
+
+    return x_col, y_col
 
-    # 🔹 4) 폰트 설정 (기존 유지)
-    try:
-        from matplotlib import rcParams
-        rcParams["font.family"] = mpl.rcParams.get("font.family")
-    except Exception:
-        pass
 
-    # 🔹 5) 실제 그래프 그리기
-    plt.figure(figsize=(10, 5))
+def chart_cache_key(xs: List[str], ys: List[float], x_col: str, y_col: str, title: str, fmt: str) -> str:
+    """차트 입력(x, y, 제목, 데이터, 형식)의 해시"""
+    payload = json.dumps([x_col, y_col, title, fmt, xs, ys], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    if len(df) > 50:
-        plt.plot(df[x_col], df[y_col], marker='o')
-        plt.xticks(rotation=45, ha='right', fontsize=8)
+
+@timed("chart_render")
+def _render_chart(xs: List[str], ys: List[float], x_col: str, y_col: str, title: str, fmt: str) -> str:
+    """Figure/Agg 캔버스로 차트를 그려 <img> 태그 반환 (전역 pyplot 상태를 쓰지 않음)"""
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    if len(xs) > 50:
+        ax.plot(xs, ys, marker='o')
+        ax.tick_params(axis='x', labelsize=8)
     else:
-        plt.bar(df[x_col], df[y_col])
-        plt.xticks(rotation=45, ha='right')
+        ax.bar(xs, ys)
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
 
-    plt.title(title, fontsize=14, pad=20)
-    plt.xlabel(x_col, fontsize=12)
-    plt.ylabel(y_col, fontsize=12)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    plt.tight_layout()
+    ax.set_title(title, fontsize=14, pad=20)
+    ax.set_xlabel(x_col, fontsize=12)
+    ax.set_ylabel(y_col, fontsize=12)
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    fig.tight_layout()
 
     buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    plt.close()
+    fig.savefig(buf, format=fmt)
+
+    mime = "image/svg+xml" if fmt == "svg" else "image/png"
+    encoded = base64.b64encode(buf.getvalue()).decode("utf-8")
+    return f"<img src='data:{mime};base64,{encoded}'>"
+
+
+def chart_payload(df, x_col, y_col, title, fmt="png") -> Optional[Tuple[List[str], List[float], str, str, str, str]]:
+    """차트를 그리는 데 필요한 값만 뽑은 작은 튜플 (세션에 보관했다가 다시 그릴 때도 사용)"""
+    x_col, y_col = resolve_chart_columns(df, x_col, y_col)
+    if x_col is None:
+        return None
+    if fmt not in CHART_FORMATS:
+        fmt = "png"
+    xs = df[x_col].astype(str).tolist()
+    ys = pd.to_numeric(df[y_col], errors="coerce").fillna(0).tolist()
+    return xs, ys, x_col, y_col, title, fmt
+
+
+def chart_from_payload(payload) -> str:
+    """chart_payload 결과로 <img> 태그 생성 (같은 payload는 캐시에서 바로 반환)"""
+    if not payload:
+        return ""
+    payload = tuple(payload)
+
+    key = chart_cache_key(*payload)
+    with _chart_cache_lock:
+        cached = _chart_cache.get(key)
+        record_cache("chart", cached is not None)
+        if cached is not None:
+            _chart_cache.move_to_end(key)
+            return cached
+
+    img_tag = _render_chart(*payload)
+
+    with _chart_cache_lock:
+        _chart_cache[key] = img_tag
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return img_tag
+
+
+def create_chart_base64(
+    df: pd.DataFrame,
+    x_col: str | None,
+    y_col: str | None,
+    title: str,
+    fmt: str = "png",
+) -> str:
+    """Pandas DataFrame을 기반으로 차트를 생성하고 Base64 이미지 태그 반환 (png 또는 svg, 결과 캐시)"""
+    return chart_from_payload(chart_payload(df, x_col, y_col, title, fmt))
+
+
+def create_chart_async(
+    df: pd.DataFrame,
+    x_col: str | None,
+    y_col: str | None,
+    title: str,
+    fmt: str = "png",
+) -> "Future[str]":
+    """create_chart_base64 를 차트 전용 워커 풀에서 실행 (Future 반환)"""
+    return _chart_pool.submit(create_chart_base64, df.copy(), x_col, y_col, title, fmt)
+
+
+def chart_data_for_native(
+    df: pd.DataFrame,
+    x_col: str | None,
+    y_col: str | None,
+) -> Optional[pd.DataFrame]:
+    """st.bar_chart 로 바로 그릴 수 있는 (x 인덱스, y 컬럼) DataFrame. 이미지 인코딩이 필요 없다."""
+    x_col, y_col = resolve_chart_columns(df, x_col, y_col)
+    if x_col is None:
+        return None
+    data = df[[x_col, y_col]].copy()
+    data[x_col] = data[x_col].astype(str)
+    return data.set_index(x_col)
 
-    png_base64 = base64.b64encode(buf.getvalue()).decode("utf-8")
-    return f"<img src='data:image/png;base64,{png_base64}'>"
 
 def get_pokemon_image_html_from_dexnum(dexnum: int, width: int = 200) -> str | None:
     """
     도감번호(dexnum)에 해당하는 포켓몬 이미지를 찾아
     <img> 태그(베이스64 인코딩)를 리턴한다.
     이미지가 없으면 None 리턴.
+    (build_db가 만든 썸네일 + POKEMON_IMAGES 인덱스 + HTML LRU 캐시는 assets.sprite_html 참고)
     """
-    # 확장자 여러 개 시도 (jpg / jpeg / png)
-    for ext in [".jpg", ".jpeg", ".png"]:
-        img_path = POKEMON_IMG_DIR / f"{dexnum}{ext}"   # 예: data/pokemon_jpg/25.jpg
-        if img_path.exists():
-            with open(img_path, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode("utf-8")
-
-            mime = "image/jpeg" if ext in [".jpg", ".jpeg"] else "image/png"
-            html = f"<img src='data:{mime};base64,{b64}' alt='포켓몬 이미지' width='{width}'>"
-            return html
-
-    # 파일이 하나도 없으면
-    return None
+    return sprite_html(int(dexnum), width)
 
 
 # ------------------------------------------------
@@ -439,9 +708,115 @@ NO_EFFECT = {
 }
 
 
+# ------------------------------------------------
+# 6-1. NumPy 상성 행렬 (18×18 단일 타입, 18×171 타입 조합)
+# ------------------------------------------------
+TYPE_INDEX = {t: i for i, t in enumerate(TYPES)}
+# 타입이 없거나(type2 NULL) 모르는 타입일 때 쓰는 자리: 배율 1.0 (SQL의 COALESCE(..., 1.0)과 같음)
+NO_TYPE = len(TYPES)
+
+
+def _effect_matrix() -> np.ndarray:
+    """[공격 타입, 방어 타입] → 배율. 마지막 행/열(NO_TYPE)은 모두 1.0"""
+    matrix = np.ones((len(TYPES) + 1, len(TYPES) + 1))
+    for table, mult in ((SUPER_EFFECTIVE, 2.0), (NOT_VERY_EFFECTIVE, 0.5), (NO_EFFECT, 0.0)):
+        for atk, defenders in table.items():
+            matrix[TYPE_INDEX[atk], [TYPE_INDEX[d] for d in defenders]] = mult
+    return matrix
+
+
+_EFFECT_MATRIX = _effect_matrix()
+# 공개용 18×18 (읽기 전용)
+TYPE_MATRIX = _EFFECT_MATRIX[:-1, :-1]
+TYPE_MATRIX.flags.writeable = False
+
+# 방어 타입 조합 171개 = 단일 타입 18 + 서로 다른 두 타입 153 (순서 무관)
+DUAL_TYPES: List[Tuple[str, Optional[str]]] = [(t, None) for t in TYPES] + [
+    (TYPES[i], TYPES[j]) for i in range(len(TYPES)) for j in range(i + 1, len(TYPES))
+]
+_DUAL_T1 = np.array([TYPE_INDEX[t1] for t1, _ in DUAL_TYPES])
+_DUAL_T2 = np.array([NO_TYPE if t2 is None else TYPE_INDEX[t2] for _, t2 in DUAL_TYPES])
+# [공격 타입, 타입 조합] → 두 방어 타입 배율의 곱
+DUAL_TYPE_MATRIX = _EFFECT_MATRIX[:-1, _DUAL_T1] * _EFFECT_MATRIX[:-1, _DUAL_T2]
+DUAL_TYPE_MATRIX.flags.writeable = False
+
+
+def type_indices(types) -> np.ndarray:
+    """타입 이름 배열 → 행렬 인덱스 (None/NaN/모르는 타입은 NO_TYPE)"""
+    codes = pd.Categorical(np.asarray(types, dtype=object), categories=TYPES).codes.astype(np.intp)
+    codes[codes < 0] = NO_TYPE
+    return codes
+
+
+def matchup_multipliers(attacking_types, type1s, type2s) -> np.ndarray:
+    """
+    공격 타입 × 방어 포켓몬(type1, type2) 배율을 한 번에 계산.
+    attacking_types 가 문자열 하나면 모든 방어 포켓몬에 같은 공격 타입을 적용한다.
+    """
+    t1 = type_indices(type1s)
+    t2 = type_indices(type2s)
+    if isinstance(attacking_types, str):
+        atk = np.full(len(t1), TYPE_INDEX.get(attacking_types, NO_TYPE), dtype=np.intp)
+    else:
+        atk = type_indices(attacking_types)
+    return matchup_by_index(atk, t1, t2)
+
+
+def matchup_by_index(atk: np.ndarray, t1: np.ndarray, t2: np.ndarray) -> np.ndarray:
+    """type_indices 로 미리 바꿔 둔 인덱스 배열끼리 배율 계산 (메모리 Pokédex 용)"""
+    return _EFFECT_MATRIX[atk, t1] * _EFFECT_MATRIX[atk, t2]
+
+
+def type_multiplier(attacking_type: str, type1: str, type2: Optional[str] = None) -> float:
+    return float(matchup_multipliers(attacking_type, [type1], [type2])[0])
+
+
+def pokemon_matchups(attacking_type: str) -> pd.DataFrame:
+    """전체 포켓몬이 attacking_type 공격을 받을 때의 배율 (dexnum, name, type1, type2, multiplier)"""
+    from report_prompt import pokemon_attributes
+
+    attrs = pokemon_attributes()
+    out = attrs[["dexnum", "name", "type1", "type2"]].copy()
+    out["multiplier"] = matchup_multipliers(attacking_type, attrs["type1"].to_numpy(), attrs["type2"].to_numpy())
+    return out
+
+
 def init_type_effectiveness():
-    """type_effectiveness 테이블을 초기화하고 상성 데이터를 삽입"""
-    conn = sqlite3.connect(DB_PATH)
+    """type_effectiveness / dual_type_effectiveness 테이블을 초기화하고 상성 데이터를 삽입"""
+    with get_db().writer() as conn:
+        _write_type_effectiveness(conn)
+        _write_dual_type_effectiveness(conn)
+    print("✅ type_effectiveness / dual_type_effectiveness 테이블 자동 생성 및 전체 상성 데이터 삽입 완료")
+
+
+_type_tables_ready = False
+
+
+def ensure_type_effectiveness():
+    """상성 테이블이 없거나 행 수가 다르면 다시 만든다 (프로세스당 한 번만 확인)"""
+    global _type_tables_ready
+    if _type_tables_ready:
+        return
+    expected = {
+        "type_effectiveness": len(TYPES) ** 2,
+        "dual_type_effectiveness": len(TYPES) * len(TYPES) ** 2,
+    }
+    conn = get_db().reader()
+    existing = {
+        name for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (?, ?)", tuple(expected)
+        )
+    }
+    if existing == set(expected) and all(
+        conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == n for table, n in expected.items()
+    ):
+        _type_tables_ready = True
+        return
+    init_type_effectiveness()
+    _type_tables_ready = True
+
+
+def _write_type_effectiveness(conn: sqlite3.Connection):
     cur = conn.cursor()
 
     # 테이블 생성 쿼리 (기존 로직 유지)
@@ -456,60 +831,76 @@ def init_type_effectiveness():
 
     cur.execute("DELETE FROM type_effectiveness") # 기존 데이터 삭제
 
-    rows: List[Tuple[str, str, float]] = []
-
-    for atk in TYPES:
-        for df in TYPES:
-            mult = 1.0
-            
-            # 상성 계산 로직 (기존 로직 확장 및 정리)
-            if df in SUPER_EFFECTIVE.get(atk, []):
-                mult = 2.0
-            elif df in NOT_VERY_EFFECTIVE.get(atk, []):
-                mult = 0.5
-            elif df in NO_EFFECT.get(atk, []):
-                mult = 0.0
-            # 1.0은 기본값으로 유지
-
-            rows.append((atk, df, mult))
+    rows: List[Tuple[str, str, float]] = [
+        (atk, df, float(TYPE_MATRIX[i, j]))
+        for i, atk in enumerate(TYPES)
+        for j, df in enumerate(TYPES)
+    ]
 
     cur.executemany(
         "INSERT INTO type_effectiveness VALUES (?, ?, ?)", rows
     )
 
-    conn.commit()
-    conn.close()
-    print("✅ type_effectiveness 테이블 자동 생성 및 전체 상성 데이터 삽입 완료")
+
+def _write_dual_type_effectiveness(conn: sqlite3.Connection):
+    """
+    (공격 타입, type1, type2) → 최종 배율. 상성 질의를 JOIN 2개 대신 기본키 조회 한 번으로.
+    pokemon 의 type1/type2 를 그대로 붙일 수 있도록 두 순서를 모두 넣고, 단일 타입은 type2 = ''.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dual_type_effectiveness (
+            attacking_type TEXT NOT NULL,
+            type1 TEXT NOT NULL,
+            type2 TEXT NOT NULL,
+            multiplier REAL NOT NULL,
+            PRIMARY KEY (attacking_type, type1, type2)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("DELETE FROM dual_type_effectiveness")
+
+    rows: List[Tuple[str, str, str, float]] = []
+    for i, atk in enumerate(TYPES):
+        for k, (t1, t2) in enumerate(DUAL_TYPES):
+            mult = float(DUAL_TYPE_MATRIX[i, k])
+            rows.append((atk, t1, t2 or "", mult))
+            if t2 is not None:
+                rows.append((atk, t2, t1, mult))
+
+    cur.executemany(
+        "INSERT INTO dual_type_effectiveness VALUES (?, ?, ?, ?)", rows
+    )
 
 # ------------------------------------------------
 # 7. ✅ 최종 리포트 생성 (세대/타입 필터 추가 버전)
 # ------------------------------------------------
-def generate_final_report(all_results: list, gen_filter=None, type_filter=None) -> str:
-    """누적된 분석 결과들을 기반으로 최종 리포트를 HTML로 생성"""
-    if not all_results:
-        return "아직 분석된 결과가 없어서 최종 리포트를 만들 수 없네."
-
-    client = get_openai_client()
-    if not client:
-        return "⚠️ OPENAI API 키가 없어 리포트를 생성할 수 없네."
-
-    # 1) 질문 + 데이터프레임 요약을 보기 좋게 정리 (LLM에게 넘길 용도)
-    sections = []
-    for i, item in enumerate(all_results, 1):
-        q = item.get("question", "")
-        df = item.get("df")
+def report_items(all_results, gen_filter=None, type_filter=None) -> List[Dict[str, Any]]:
+    """
+    리포트에 쓸 분석 목록: 필터를 데이터에 직접 적용 → 본문/요약 준비 → 중복 제거.
+    필터가 없으면 세션 저장소(AnalysisStore)가 미리 만들어 둔 본문/요약을 DataFrame을 풀지 않고 그대로 쓴다.
+    """
+    if gen_filter is None and not type_filter and hasattr(all_results, "digests"):
+        items = all_results.digests()
+    else:
+        items = list(all_results)
+    return dedupe_analyses(apply_report_filters(items, gen_filter, type_filter))
 
-        section = f"[분석 {i}] 질문: {q}\n"
 
-        if df is not None and not df.empty:
-            section += "상위 5개 결과 미리보기:\n"
-            section += df.head(5).to_markdown(index=False)
-        else:
-            section += "조회된 결과가 없었습니다."
+def build_final_report_prompts(all_results: list, gen_filter=None, type_filter=None) -> Tuple[str, str]:
+    """최종 리포트용 (system_prompt, user_prompt) 생성"""
+    # 필터가 있으면 결과 데이터 자체를 먼저 걸러서 관련 행만 넘긴다
+    return report_prompts(report_items(all_results, gen_filter, type_filter), gen_filter, type_filter)
 
-        sections.append(section)
 
-    analyses_block = "\n\n---\n\n".join(sections)
+def report_prompts(items: List[Dict[str, Any]], gen_filter=None, type_filter=None) -> Tuple[str, str]:
+    """report_items 로 이미 필터/준비를 마친 분석 목록으로 (system_prompt, user_prompt) 생성 (다시 거르지 않음)"""
+    # 1) 질문 + 데이터프레임 요약을 토큰 예산 안에서 정리 (LLM에게 넘길 용도)
+    analyses_block, budget_info = build_analyses_block(items)
+    print(
+        f"🧾 리포트 프롬프트: 분석 {budget_info['analyses']}건 (중복 제외 {budget_info['unique']}건) → "
+        f"본문 {budget_info['full']} / 요약 {budget_info['digest']} / 질문만 {budget_info['title']} / "
+        f"생략 {budget_info['omitted']}, 약 {budget_info['tokens']} 토큰"
+    )
 
     # 2) 🔥 필터 설명 텍스트 만들기
     filter_desc = []
@@ -518,6 +909,11 @@ def generate_final_report(all_results: list, gen_filter=None, type_filter=None)
     if type_filter:
         filter_desc.append(f"- 타입: {', '.join(type_filter)} 타입 위주로 인사이트 정리")
 
+    if any("filtered_from" in item for item in items):
+        filter_desc.append("- 포켓몬 단위 분석 결과는 위 조건으로 이미 걸러낸 데이터만 담겨 있다.")
+    if any(item.get("sample") for item in items):
+        filter_desc.append("- '표본'이라고 적힌 결과는 앞부분 행만 걸러낸 것이므로 행 수를 전체 수치처럼 말하지 않는다.")
+
     filter_block = "\n".join(filter_desc) if filter_desc else "별도의 필터는 적용하지 않는다."
 
     # 3) 🧓 오박사 말투 + HTML 리포트 프롬프트
@@ -558,19 +954,8 @@ def generate_final_report(all_results: list, gen_filter=None, type_filter=None)
   <li>필터(세대/타입)가 있다면, 해당 조건을 중심으로 특징을 설명합니다.</li>
 </ul>
 
-<h2>3. 질문별 분석 정리</h2>
-<p>
-자네가 던졌던 각 질문을 오박사가 다시 되짚어보듯 정리해 주게. <br>
-예: "자네가 첫 번째로 던졌던 질문에서는 이런 흥미로운 점이 드러났네."
-</p>
-
-<h3>질문 A 제목 또는 요약</h3>
-<p>해당 질문에 대한 분석 내용을 오박사 말투로 설명합니다.</p>
-
-<h3>질문 B 제목 또는 요약</h3>
-<p>해당 질문에 대한 분석 내용을 오박사 말투로 설명합니다.</p>
-
-(필요한 만큼 질문별 섹션을 추가합니다.)
+{SECTIONS_MARKER}
+(3번 '질문별 분석 정리' 섹션은 이미 따로 작성되어 있습니다. 그 자리에는 위 표시 한 줄만 그대로 출력하세요.)
 
 <h2>4. 결론 및 오박사의 제안</h2>
 <ul>
@@ -590,22 +975,95 @@ def generate_final_report(all_results: list, gen_filter=None, type_filter=None)
 """
 
     user_prompt = f"[질문 및 분석 결과]\n\n{analyses_block}"
+    return system_prompt, user_prompt
+
+
+def generate_final_report_stream(all_results: list, gen_filter=None, type_filter=None) -> Iterator[str]:
+    """
+    최종 리포트 HTML을 생성되는 대로 조각(chunk) 단위로 yield.
+    app.py에서 받은 만큼 바로 화면에 그려서 첫 글자가 뜨는 시간을 줄인다.
+    - 질문별 분석 정리(3번)는 report_sections 캐시에서 가져오고 없는 것만 병렬 생성
+      (질문 + 결과 해시 + 필터가 같으면 다시 만들지 않음)
+    - LLM은 매번 요약/주요 발견/결론만 새로 쓰고, SECTIONS_MARKER 자리에 질문별 섹션을 끼워 넣는다
+    """
+    if not all_results:
+        yield "아직 분석된 결과가 없어서 최종 리포트를 만들 수 없네."
+        return
+
+    client = get_openai_client()
+    if not client:
+        yield "⚠️ OPENAI API 키가 없어 리포트를 생성할 수 없네."
+        return
+
+    items = report_items(all_results, gen_filter, type_filter)
+    section_futures = collect_sections(items, gen_filter, type_filter)
+    system_prompt, user_prompt = report_prompts(items, gen_filter, type_filter)
+
+    def sections_block() -> str:
+        return (
+            "<h2>3. 질문별 분석 정리</h2>\n"
+            "<p>자네가 던졌던 각 질문을 오박사가 하나씩 되짚어 보겠네.</p>\n"
+            + sections_html(section_futures) + "\n"
+        )
 
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
+        started = time.perf_counter()
+        first_chunk = True
+        pending = ""
+        inserted = False
+        stream = client.chat.completions.create(
+            model=LLM_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.3,
+            stream=True,
+            stream_options={"include_usage": True}, # 마지막 청크에 usage 포함
         )
-
-        # 👉 이 값은 그대로 HTML로 사용할 예정
-        return resp.choices[0].message.content.strip()
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                record_usage("final_report", chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_chunk:
+                first_chunk = False
+                observe_seconds("llm_final_report_first_chunk", time.perf_counter() - started)
+            if inserted:
+                yield delta
+                continue
+
+            # 표시 문자열이 청크 경계에서 잘릴 수 있어서 끝부분은 잠시 들고 있는다
+            pending += delta
+            idx = pending.find(SECTIONS_MARKER)
+            if idx >= 0:
+                yield pending[:idx]
+                yield sections_block()
+                yield pending[idx + len(SECTIONS_MARKER):]
+                pending = ""
+                inserted = True
+            elif len(pending) >= len(SECTIONS_MARKER):
+                safe = len(pending) - len(SECTIONS_MARKER) + 1
+                yield pending[:safe]
+                pending = pending[safe:]
+
+        if not inserted:
+            # 표시가 빠진 응답이면 질문별 섹션을 끝에 붙인다
+            yield pending
+            yield sections_block()
+        observe_seconds("llm_final_report", time.perf_counter() - started)
 
     except Exception as e:
-        return f"❌ 최종 리포트 생성 실패: {e}"
+        yield f"❌ 최종 리포트 생성 실패: {e}"
+
+
+def generate_final_report(all_results: list, gen_filter=None, type_filter=None) -> str:
+    """누적된 분석 결과들을 기반으로 최종 리포트를 HTML로 생성"""
+    # 👉 이 값은 그대로 HTML로 사용할 예정
+    return "".join(generate_final_report_stream(all_results, gen_filter, type_filter)).strip()
 
 
 
@@ -621,7 +1079,7 @@ if __name__ == "__main__":
 
 
 def add_pokemon_to_user(user_id: int, pokemon_name: str):
-    with sqlite3.connect(DB_PATH) as conn:
+    with get_db().writer() as conn:
         cur = conn.cursor()
         # 다음 슬롯 번호 계산
         cur.execute(
@@ -649,6 +1107,7 @@ def add_pokemon_to_user(user_id: int, pokemon_name: str):
             """,
             (user_id, dexnum, name, next_slot)
         )
-        conn.commit()
+        # 팀 요약 테이블은 이 유저 한 줄만 다시 계산
+        refresh_user_team_summary(conn, user_id)
     return True, f"{pokemon_name} 를(을) 새로운 포켓몬으로 등록했네!"
 